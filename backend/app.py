@@ -16,6 +16,19 @@ from werkzeug.middleware.proxy_fix import ProxyFix
 from blueprints.auth_blueprint import auth_blueprint
 from blueprints.session_blueprint import session_blueprint
 from blueprints.student_blueprint import student_blueprint
+from blueprints.status_blueprint import status_blueprint
+from blueprints.billing_blueprint import billing_blueprint
+from services.outbox import outbox
+from services.upload_spool import upload_spool
+from commands.storage_commands import storage_cli
+from commands.benchmark_commands import benchmark_cli
+from commands.import_commands import import_cli
+from commands.billing_commands import billing_cli
+from commands.fastbill_commands import fastbill_cli
+from commands.invoice_commands import invoice_cli
+from commands.outbox_commands import outbox_cli
+from utils.db_pool import engine_options, init_pool
+from utils.env import env_flag
 
 app = Flask(__name__)
 app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
@@ -35,16 +48,11 @@ if not database_uri:
     raise RuntimeError("DATABASE_URL or SQLALCHEMY_DATABASE_URI must be set")
 
 app.config["SQLALCHEMY_DATABASE_URI"] = database_uri
+# Pool size, overflow, timeout, pre-ping and recycle from DB_POOL_* (see utils/db_pool.py)
+app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(database_uri)
 app.config.setdefault("SQLALCHEMY_TRACK_MODIFICATIONS", False)
 
 
-def env_flag(name: str, default: str = "true") -> bool:
-    raw = os.getenv(name)
-    if raw is None:
-        raw = default
-    return raw.strip().lower() in {"1", "true", "yes", "on"}
-
-
 USE_SECURE_COOKIES = env_flag("USE_SECURE_COOKIES", "true")
 FORCE_HTTPS = env_flag("FORCE_HTTPS", "true")
 COOKIE_SAMESITE = "None" if USE_SECURE_COOKIES else "Lax"
@@ -62,7 +70,8 @@ app.config.update(
     REMEMBER_COOKIE_SECURE=USE_SECURE_COOKIES,
     REMEMBER_COOKIE_HTTPONLY=True,
     REMEMBER_COOKIE_SAMESITE=COOKIE_SAMESITE,
-    MAX_CONTENT_LENGTH=1 * 1024 * 1024,  # 1MB request size cap
+    # Request size cap; uploads are streamed to storage, so this can be raised for scanned forms
+    MAX_CONTENT_LENGTH=int(os.getenv("MAX_UPLOAD_MB", "10")) * 1024 * 1024,
 )
 
 # Security headers (HSTS, CSP, etc.)
@@ -89,8 +98,11 @@ limiter = Limiter(get_remote_address, app=app, storage_uri=os.getenv("REDIS_URL"
 Session(app)
 
 database.init_app(app)
+init_pool(app, database)
 migrate.init_app(app, database)
 bcrypt.init_app(app)
+outbox.init_app(app)
+upload_spool.init_app(app)
 
 login_manager = LoginManager(app)
 login_manager.login_view = "auth.login"
@@ -120,9 +132,19 @@ if not os.path.exists("./data/signatures"):
 app.register_blueprint(auth_blueprint.blueprint, url_prefix="/api/auth")
 app.register_blueprint(session_blueprint.blueprint, url_prefix="/api")
 app.register_blueprint(student_blueprint.blueprint, url_prefix="/api")
+app.register_blueprint(status_blueprint.blueprint, url_prefix="/api")
+app.register_blueprint(billing_blueprint.blueprint, url_prefix="/api")
 
 limiter.limit("5/minute")(app.view_functions["auth.login"])
 
+app.cli.add_command(storage_cli)
+app.cli.add_command(benchmark_cli)
+app.cli.add_command(import_cli)
+app.cli.add_command(billing_cli)
+app.cli.add_command(fastbill_cli)
+app.cli.add_command(invoice_cli)
+app.cli.add_command(outbox_cli)
+
 @app.route("/")
 def home():
     return redirect(url_for("auth.login"))
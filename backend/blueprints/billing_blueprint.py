@@ -0,0 +1,55 @@
+from datetime import datetime
+from flask import Blueprint, request, jsonify
+from flask_login import login_required
+from services.billing_service import billing_service
+from utils.logger import logger
+
+
+class BillingBlueprint:
+    def __init__(self):
+        self.blueprint = Blueprint("billing", __name__)
+        self.__setup_routes()
+
+    def __setup_routes(self):
+        self.blueprint.add_url_rule(
+            "/billing/summary", view_func=self.get_summary, methods=["GET"]
+        )
+
+    @staticmethod
+    def _parse_month(value):
+        return datetime.strptime(value, "%Y-%m").date() if value else None
+
+    @login_required
+    def get_summary(self):
+        """
+        Sessions and hours per month, per student (default) or per customer
+
+        Query parameters: month or from/to (YYYY-MM), customer_id, student_id,
+        group_by=student|customer
+        """
+        group_by = request.args.get("group_by", "student")
+        if group_by not in ("student", "customer"):
+            return jsonify({"error": "group_by must be student or customer"}), 400
+
+        try:
+            month = self._parse_month(request.args.get("month"))
+            month_from = month or self._parse_month(request.args.get("from"))
+            month_to = month or self._parse_month(request.args.get("to"))
+        except ValueError:
+            return jsonify({"error": "month, from and to must be in YYYY-MM format"}), 400
+
+        try:
+            summary = billing_service.get_summary(
+                month_from=month_from,
+                month_to=month_to,
+                customer_id=request.args.get("customer_id", type=int),
+                student_id=request.args.get("student_id", type=int),
+                group_by=group_by,
+            )
+            return jsonify({"summary": summary}), 200
+        except Exception as e:
+            logger.error(f"❌ Error in get_summary endpoint: {e}")
+            return jsonify({"error": "Error fetching billing summary"}), 500
+
+
+billing_blueprint = BillingBlueprint()
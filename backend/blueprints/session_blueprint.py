@@ -1,9 +1,21 @@
-from flask import Blueprint, request, jsonify
+import json
+import os
+import re
+from datetime import date
+from flask import Blueprint, Response, request, jsonify, send_from_directory, stream_with_context
 from flask_login import login_required, current_user
 from services.session_service import SessionService
 from services.database_service import DatabaseService
+from services.outbox import outbox
+from services.upload_spool import upload_spool
+from services.export_service import export_service
+from models.study_session import StudySession
+from utils.http_cache import is_not_modified, not_modified, with_etag
 from utils.logger import logger
 
+# Sessions accepted by one batch request
+MAX_BATCH_SESSIONS = 50
+
 
 class SessionBlueprint:
     def __init__(self):
@@ -16,10 +28,23 @@ class SessionBlueprint:
         self.blueprint.add_url_rule(
             "/session", view_func=self.log_session, methods=["POST"]
         )
+        self.blueprint.add_url_rule(
+            "/sessions", view_func=self.list_sessions, methods=["GET"]
+        )
+        self.blueprint.add_url_rule(
+            "/sessions/batch", view_func=self.log_sessions, methods=["POST"]
+        )
         # Fetch Students for Dropdown
         self.blueprint.add_url_rule(
             "/students", view_func=self.get_students, methods=["GET"]
         )
+        self.blueprint.add_url_rule(
+            "/forms/export", view_func=self.export_forms, methods=["GET"]
+        )
+        # PDFs kept in local storage (pdf_url of sessions stored without R2)
+        self.blueprint.add_url_rule(
+            "/files/<path:filename>", view_func=self.get_file, methods=["GET"]
+        )
 
     @login_required
     def log_session(self):
@@ -41,25 +66,162 @@ class SessionBlueprint:
         logger.info("📥 Received JSON data: %s", data)
         logger.debug("🆔 User ID: %s", current_user.id)
 
+        new_session = None
         try:
             new_session = self.session_service.create_study_session(data, files)
             self.database_service.add_to_session(new_session)
+            # The R2 upload is committed as an outbox event together with the row
+            if new_session.storage_state == StudySession.STORAGE_PENDING:
+                upload_spool.queue_upload(new_session.pdf_key)
             self.database_service.commit_session()
             logger.info("✅ Session committed successfully!")
+            outbox.notify()
             return jsonify({"message": "Session logged successfully"}), 200
+        except ValueError as e:
+            self._discard([new_session])
+            logger.warning("⚠️ Invalid session data: %s", e)
+            return jsonify({"error": "Validation error"}), 400
         except Exception as e:
+            self._discard([new_session])
             logger.error("❌ Error committing session to database: %s", e)
             return jsonify({"error": "Error committing session to database"}), 500
 
+    @login_required
+    def log_sessions(self):
+        """
+        Log several sessions in one request and one transaction
+
+        Multipart form with a "sessions" field holding a JSON array of session
+        objects (same fields as POST /session) and one PDF per session in the
+        file field named by the object's "pdf" key (default pdf_<index>).
+        """
+        try:
+            items = json.loads(request.form.get("sessions", ""))
+        except ValueError:
+            return jsonify({"error": "sessions must be a JSON array"}), 400
+        if not isinstance(items, list) or not items:
+            return jsonify({"error": "sessions must be a non-empty JSON array"}), 400
+        if len(items) > MAX_BATCH_SESSIONS:
+            return jsonify({"error": f"At most {MAX_BATCH_SESSIONS} sessions per request"}), 400
+
+        created = []
+        try:
+            created, errors = self.session_service.create_study_sessions(items, request.files)
+            for _, study_session in created:
+                if study_session.storage_state == StudySession.STORAGE_PENDING:
+                    upload_spool.queue_upload(study_session.pdf_key)
+            response = []
+            if created:
+                # IDs exist after the flush; reading them after the commit would reload every row
+                self.database_service.session.flush()
+                response = [{"index": index, "id": study_session.id} for index, study_session in created]
+                self.database_service.commit_session()
+                logger.info("✅ Batch of %d sessions committed successfully!", len(created))
+        except Exception as e:
+            self._discard([study_session for _, study_session in created])
+            logger.error("❌ Error committing session batch to database: %s", e)
+            return jsonify({"error": "Error committing sessions to database"}), 500
+
+        if created:
+            outbox.notify()
+
+        status = 200 if created else 400
+        return jsonify({"created": response, "errors": errors}), status
+
+    def _discard(self, study_sessions):
+        """Roll back and remove the PDFs spooled for sessions that were not committed"""
+        spooled = [
+            study_session.pdf_key for study_session in study_sessions
+            if study_session is not None and study_session.storage_state == StudySession.STORAGE_PENDING
+        ]
+        self.database_service.rollback_session()
+        upload_spool.discard(spooled)
+
+    @login_required
+    def list_sessions(self):
+        """List sessions newest first; pass the returned next_cursor to get the following page"""
+        try:
+            date_from = request.args.get("date_from")
+            date_to = request.args.get("date_to")
+            date_from = date.fromisoformat(date_from) if date_from else None
+            date_to = date.fromisoformat(date_to) if date_to else None
+        except ValueError:
+            return jsonify({"error": "date_from and date_to must be in YYYY-MM-DD format"}), 400
+
+        try:
+            sessions, next_cursor = self.session_service.list_sessions(
+                student_id=request.args.get("student_id", type=int),
+                customer_id=request.args.get("customer_id", type=int),
+                date_from=date_from,
+                date_to=date_to,
+                cursor=request.args.get("cursor"),
+                limit=request.args.get("limit", 50, type=int),
+            )
+            return jsonify({"sessions": sessions, "next_cursor": next_cursor}), 200
+        except ValueError as e:
+            logger.warning(f"⚠️ Validation error: {e}")
+            return jsonify({"error": "Validation error"}), 400
+        except Exception as e:
+            logger.error(f"❌ Error in list_sessions endpoint: {e}")
+            return jsonify({"error": "Error fetching sessions"}), 500
+
     @login_required
     def get_students(self):
         """Get all students for the dropdown in Session.tsx"""
         try:
-            students_data = self.database_service.get_students_for_dropdown()
-            return jsonify({"students": students_data}), 200
+            # Unchanged list: answer from the shared cache version without touching the database
+            version = self.database_service.dropdown_version('students')
+            if version is not None and is_not_modified(f"students-{version}"):
+                return not_modified(f"students-{version}")
+
+            version, students_data = self.database_service.get_students_for_dropdown()
+            etag = f"students-{version}"
+            if is_not_modified(etag):
+                return not_modified(etag)
+            return with_etag(jsonify({"students": students_data}), etag), 200
         except Exception as e:
             logger.error(f"❌ Error in get_students endpoint: {e}")
             return jsonify({"error": "Error fetching students"}), 500
 
 
-session_blueprint = SessionBlueprint()
\ No newline at end of file
+    @login_required
+    def get_file(self, filename):
+        """Serve a completed form from local storage"""
+        if not filename.endswith(".pdf"):
+            return jsonify({"error": "File not found"}), 404
+        # Files are named after their content hash, so they never change
+        response = send_from_directory(
+            os.path.abspath(self.session_service.pdf_dir), filename,
+            mimetype="application/pdf", max_age=86400,
+        )
+        response.cache_control.public = False
+        response.cache_control.private = True
+        return response
+
+    @login_required
+    def export_forms(self):
+        """Stream a ZIP of completed forms, filtered by customer_id and/or month (YYYY-MM)"""
+        customer_id = request.args.get("customer_id", type=int)
+        month = request.args.get("month")
+        if month and not re.fullmatch(r"\d{4}-\d{2}", month):
+            return jsonify({"error": "month must be in YYYY-MM format"}), 400
+        if customer_id is None and not month:
+            return jsonify({"error": "customer_id or month is required"}), 400
+
+        try:
+            rows = export_service.get_export_rows(customer_id=customer_id, month=month)
+        except Exception as e:
+            logger.error(f"❌ Error in export_forms endpoint: {e}")
+            return jsonify({"error": "Error exporting forms"}), 500
+
+        logger.info("📦 Exporting %d forms (customer=%s, month=%s)", len(rows), customer_id, month)
+        parts = ["forms", str(customer_id) if customer_id else None, month]
+        filename = "_".join(part for part in parts if part) + ".zip"
+        return Response(
+            stream_with_context(export_service.iter_zip(rows)),
+            mimetype="application/zip",
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        )
+
+
+session_blueprint = SessionBlueprint()
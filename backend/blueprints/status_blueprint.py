@@ -0,0 +1,59 @@
+from flask import Blueprint, current_app, jsonify
+from flask_login import login_required
+from services.fastbill_client import fastbill_status
+from services.outbox import outbox
+from services.r2_storage import r2_storage
+from services.upload_spool import upload_spool
+from utils.db_pool import pool_status
+from utils.logger import logger
+
+
+class StatusBlueprint:
+    def __init__(self):
+        self.blueprint = Blueprint("status", __name__)
+        self.__setup_routes()
+
+    def __setup_routes(self):
+        self.blueprint.add_url_rule(
+            "/status/storage", view_func=self.get_storage_status, methods=["GET"]
+        )
+        self.blueprint.add_url_rule(
+            "/status/database", view_func=self.get_database_status, methods=["GET"]
+        )
+        self.blueprint.add_url_rule(
+            "/status/fastbill", view_func=self.get_fastbill_status, methods=["GET"]
+        )
+
+    @login_required
+    def get_storage_status(self):
+        """Upload spool depth and lag, outbox backlog, R2 circuit state and per-call latency/retries"""
+        try:
+            return jsonify({
+                "spool": upload_spool.status(),
+                "outbox": outbox.status(),
+                "r2": r2_storage.status(),
+            }), 200
+        except Exception as e:
+            logger.error(f"❌ Error in get_storage_status endpoint: {e}")
+            return jsonify({"error": "Error fetching storage status"}), 500
+
+    @login_required
+    def get_database_status(self):
+        """Connection pool usage, saturation and checkout wait times per engine"""
+        try:
+            return jsonify({"pools": pool_status(current_app)}), 200
+        except Exception as e:
+            logger.error(f"❌ Error in get_database_status endpoint: {e}")
+            return jsonify({"error": "Error fetching database status"}), 500
+
+    @login_required
+    def get_fastbill_status(self):
+        """FastBill rate limiter state and per-service latency, retry, throttle and cache counters"""
+        try:
+            return jsonify(fastbill_status()), 200
+        except Exception as e:
+            logger.error(f"❌ Error in get_fastbill_status endpoint: {e}")
+            return jsonify({"error": "Error fetching FastBill status"}), 500
+
+
+status_blueprint = StatusBlueprint()
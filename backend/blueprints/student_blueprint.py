@@ -1,6 +1,9 @@
+import os
 from flask import Blueprint, request, jsonify
 from flask_login import login_required
 from services.database_service import DatabaseService
+from services.import_service import IMPORT_FORMATS, import_service
+from utils.http_cache import is_not_modified, not_modified, with_etag
 from utils.logger import logger
 
 
@@ -20,13 +23,27 @@ class StudentBlueprint:
         self.blueprint.add_url_rule(
             "/students", view_func=self.create_student, methods=["POST"]
         )
+        self.blueprint.add_url_rule(
+            "/customers/import", view_func=self.import_customers, methods=["POST"]
+        )
+        self.blueprint.add_url_rule(
+            "/students/import", view_func=self.import_students, methods=["POST"]
+        )
 
     @login_required
     def get_customers(self):
         """Get all customers for dropdown selection in AddStudentCustomer"""
         try:
-            customers_data = self.database_service.get_customers_for_dropdown()
-            return jsonify(customers_data), 200
+            # Unchanged list: answer from the shared cache version without touching the database
+            version = self.database_service.dropdown_version('customers')
+            if version is not None and is_not_modified(f"customers-{version}"):
+                return not_modified(f"customers-{version}")
+
+            version, customers_data = self.database_service.get_customers_for_dropdown()
+            etag = f"customers-{version}"
+            if is_not_modified(etag):
+                return not_modified(etag)
+            return with_etag(jsonify(customers_data), etag), 200
         except Exception as e:
             logger.error(f"❌ Error in get_customers endpoint: {str(e)}")
             return jsonify({'error': 'Failed to fetch customers'}), 500
@@ -100,5 +117,35 @@ class StudentBlueprint:
             logger.error(f"❌ Error in create_student endpoint: {str(e)}")
             return jsonify({'error': 'Failed to create student'}), 500
 
+    @login_required
+    def import_customers(self):
+        """Bulk import customers from an uploaded CSV or JSON file"""
+        return self._import(import_service.import_customers, "customers")
+
+    @login_required
+    def import_students(self):
+        """Bulk import students from an uploaded CSV or JSON file"""
+        return self._import(import_service.import_students, "students")
+
+    def _import(self, importer, kind):
+        upload = request.files.get("file")
+        if not upload:
+            return jsonify({'error': 'A file is required'}), 400
+
+        # Format from ?format=, else from the file extension (.csv, .json, .jsonl)
+        file_format = request.args.get("format") or os.path.splitext(upload.filename or "")[1].lstrip(".").lower()
+        if file_format in ("jsonl", "ndjson"):
+            file_format = "json"
+        if file_format not in IMPORT_FORMATS:
+            return jsonify({'error': 'format must be csv or json'}), 400
+
+        try:
+            report = importer(import_service.iter_records(upload.stream, file_format))
+            logger.info(f"📥 Imported {report.inserted} {kind}, {report.failed} rows failed")
+            return jsonify(report.as_dict()), 200
+        except Exception as e:
+            logger.error(f"❌ Error importing {kind}: {str(e)}")
+            return jsonify({'error': f'Failed to import {kind}'}), 500
+
 
 student_blueprint = StudentBlueprint()
\ No newline at end of file
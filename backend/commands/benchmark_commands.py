@@ -0,0 +1,168 @@
+import json
+import os
+import statistics
+from datetime import date
+import click
+from flask.cli import AppGroup
+from sqlalchemy import select, text
+from models.customer import Customer
+from models.database import database
+from models.invoice import Invoice
+from models.student import Student
+from models.study_session import StudySession
+
+benchmark_cli = AppGroup("benchmark", help="Measure database query performance.")
+
+# Secondary indexes and constraints dropped by --compare-unindexed
+SECONDARY_INDEXES = (
+    "ALTER TABLE customers DROP CONSTRAINT uq_customers_email",
+    "ALTER TABLE customers DROP CONSTRAINT uq_customers_fastbill_customer_id",
+    "ALTER TABLE students DROP CONSTRAINT uq_students_customer_id_name",
+    "DROP INDEX ix_study_sessions_student_id_date",
+)
+
+
+def _query_patterns(customers, students):
+    """The lookups DatabaseService and its callers run, with parameters from the middle of the data"""
+    customer_id = customers // 2
+    student_id = students // 2
+    return {
+        "get_all_customers": select(Customer),
+        "get_customer_by_id": select(Customer).where(Customer.id == customer_id).limit(1),
+        "create_customer duplicate email check": (
+            select(Customer).where(Customer.email == f"customer{customer_id}@example.com").limit(1)
+        ),
+        "sync_fastbill_customers lookup": (
+            select(Customer).where(Customer.fastbill_customer_id == f"FB{customer_id}").limit(1)
+        ),
+        "get_all_students": select(Student),
+        "get_student_by_id": select(Student).where(Student.id == student_id).limit(1),
+        "create_student duplicate check": select(Student).where(
+            Student.first_name == f"Student{student_id}",
+            Student.last_name == f"Family{student_id % customers + 1}",
+            Student.customer_id == student_id % customers + 1,
+        ).limit(1),
+        "students of a customer": select(Student).where(Student.customer_id == customer_id),
+        "sessions of a student": (
+            select(StudySession).where(StudySession.student_id == student_id).order_by(StudySession.date)
+        ),
+        "export rows of a customer month": (
+            select(StudySession.id, StudySession.date, StudySession.pdf_key, Student.first_name, Student.last_name)
+            .join(Student, Student.id == StudySession.student_id)
+            .where(
+                Student.customer_id == customer_id,
+                StudySession.date >= date(2024, 3, 1),
+                StudySession.date < date(2024, 4, 1),
+            )
+            .order_by(StudySession.date, StudySession.id)
+        ),
+    }
+
+
+def _seed(connection, customers, students_per_customer, sessions_per_student):
+    students = customers * students_per_customer
+    connection.execute(text(
+        "INSERT INTO customers (first_name, last_name, email, fastbill_customer_id) "
+        "SELECT 'Customer' || g, 'Family' || g, 'customer' || g || '@example.com', 'FB' || g "
+        "FROM generate_series(1, :customers) AS g"
+    ), {"customers": customers})
+    connection.execute(text(
+        "INSERT INTO students (first_name, last_name, customer_id) "
+        "SELECT 'Student' || g, 'Family' || (g % :customers + 1), g % :customers + 1 "
+        "FROM generate_series(1, :students) AS g"
+    ), {"customers": customers, "students": students})
+    connection.execute(text(
+        "INSERT INTO study_sessions (student_id, date, start_time, end_time, session_topic, "
+        "signature_present, pdf_key, storage_state) "
+        "SELECT g % :students + 1, DATE '2022-01-01' + (g % 1095), TIME '14:00', TIME '15:30', 'Topic', true, "
+        "'completed_forms/' || md5(g::text) || '.pdf', 'stored' "
+        "FROM generate_series(1, :sessions) AS g"
+    ), {"students": students, "sessions": students * sessions_per_student})
+    connection.execute(text("ANALYZE customers, students, study_sessions"))
+    return students
+
+
+def _index_names(plan):
+    names = set()
+    if "Index Name" in plan:
+        names.add(plan["Index Name"])
+    for child in plan.get("Plans", []):
+        names |= _index_names(child)
+    return names
+
+
+def _explain(connection, statement, runs):
+    """Run EXPLAIN ANALYZE runs times and summarise the timings and the chosen plan"""
+    sql = str(statement.compile(dialect=connection.dialect, compile_kwargs={"literal_binds": True}))
+    planning, execution = [], []
+    for _ in range(runs):
+        result = connection.execute(text(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}")).scalar()
+        explained = result[0] if isinstance(result, list) else json.loads(result)[0]
+        planning.append(explained["Planning Time"])
+        execution.append(explained["Execution Time"])
+    plan = explained["Plan"]
+    return {
+        "node": plan["Node Type"],
+        "indexes": sorted(_index_names(plan)),
+        "rows": plan["Actual Rows"],
+        "planning_ms": round(statistics.median(planning), 3),
+        "execution_ms": round(statistics.median(execution), 3),
+    }
+
+
+@benchmark_cli.command("queries")
+@click.option("--customers", default=5000, show_default=True, help="Synthetic customers to seed.")
+@click.option("--students-per-customer", default=3, show_default=True)
+@click.option("--sessions-per-student", default=50, show_default=True)
+@click.option("--runs", default=5, show_default=True, help="EXPLAIN ANALYZE runs per query (median is reported).")
+@click.option("--compare-unindexed", is_flag=True,
+              help="Also time every query after dropping the secondary indexes and unique constraints.")
+@click.option("--output", type=click.Path(dir_okay=False, writable=True), help="Write the JSON report to a file.")
+def queries(customers, students_per_customer, sessions_per_student, runs, compare_unindexed, output):
+    """Seed a synthetic dataset and record EXPLAIN ANALYZE timings per query pattern.
+
+    Requires PostgreSQL. The data lives in a throwaway schema that is dropped
+    afterwards, so existing tables are never touched.
+    """
+    if database.engine.dialect.name != "postgresql":
+        raise click.ClickException("The query benchmark needs PostgreSQL (EXPLAIN ANALYZE)")
+
+    schema = f"query_benchmark_{os.getpid()}"
+    tables = [Customer.__table__, Student.__table__, Invoice.__table__, StudySession.__table__]
+    report = {"customers": customers, "students_per_customer": students_per_customer,
+              "sessions_per_student": sessions_per_student, "runs": runs}
+
+    with database.engine.connect() as connection:
+        try:
+            connection.execute(text(f'CREATE SCHEMA "{schema}"'))
+            connection.execute(text(f'SET search_path TO "{schema}"'))
+            database.metadata.create_all(connection, tables=tables)
+            click.echo(f"Seeding {customers * students_per_customer * sessions_per_student} sessions...", err=True)
+            students = _seed(connection, customers, students_per_customer, sessions_per_student)
+            connection.commit()
+
+            patterns = _query_patterns(customers, students)
+            report["indexed"] = {name: _explain(connection, statement, runs) for name, statement in patterns.items()}
+
+            if compare_unindexed:
+                for statement in SECONDARY_INDEXES:
+                    connection.execute(text(statement))
+                connection.execute(text("ANALYZE customers, students, study_sessions"))
+                connection.commit()
+                report["unindexed"] = {
+                    name: _explain(connection, statement, runs) for name, statement in patterns.items()
+                }
+        finally:
+            connection.rollback()
+            connection.execute(text(f'DROP SCHEMA IF EXISTS "{schema}" CASCADE'))
+            # The connection goes back to the pool; don't leave it pointing at the dropped schema
+            connection.execute(text("RESET search_path"))
+            connection.commit()
+
+    rendered = json.dumps(report, indent=2)
+    if output:
+        with open(output, "w") as report_file:
+            report_file.write(rendered + "\n")
+        click.echo(f"Report written to {output}", err=True)
+    else:
+        click.echo(rendered)
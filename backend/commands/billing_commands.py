@@ -0,0 +1,15 @@
+import click
+from flask.cli import AppGroup
+from services.billing_service import billing_service
+
+billing_cli = AppGroup("billing", help="Maintain billing data.")
+
+
+@billing_cli.command("rebuild-summary")
+def rebuild_summary():
+    """Recompute the monthly billing aggregates from all study sessions.
+
+    Only needed after sessions were changed with plain SQL, bypassing the ORM.
+    """
+    rows = billing_service.rebuild()
+    click.echo(f"Rebuilt {rows} monthly billing rows")
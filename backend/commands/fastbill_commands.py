@@ -0,0 +1,22 @@
+import json
+import click
+from flask.cli import AppGroup
+from services.fastbill_service import FastbillService
+
+fastbill_cli = AppGroup("fastbill", help="Synchronize with FastBill.")
+
+
+@fastbill_cli.command("sync")
+@click.option("--full", is_flag=True, help="Ignore the stored cursor and walk all customers.")
+def sync(full):
+    """Pull new and changed FastBill customers into the customers table."""
+    try:
+        service = FastbillService()
+    except ValueError as e:
+        raise click.ClickException(str(e))
+
+    report = service.sync_fastbill_customers(full=full)
+    if report is None:
+        raise click.ClickException("FastBill sync failed, see the log for details")
+    click.echo(json.dumps(report, indent=2))
+
@@ -0,0 +1,43 @@
+import json
+import os
+import click
+from flask.cli import AppGroup
+from services.import_service import IMPORT_FORMATS, import_service
+
+import_cli = AppGroup("import", help="Bulk import customers and students.")
+
+
+def _run_import(importer, path, file_format):
+    if file_format is None:
+        extension = os.path.splitext(path)[1].lstrip(".").lower()
+        file_format = "json" if extension in ("json", "jsonl", "ndjson") else extension
+    if file_format not in IMPORT_FORMATS:
+        raise click.ClickException("Cannot tell the format from the file name; pass --format")
+
+    with open(path, "rb") as import_file:
+        report = importer(import_service.iter_records(import_file, file_format))
+    click.echo(json.dumps(report.as_dict(), indent=2))
+    if report.failed:
+        raise SystemExit(1)
+
+
+@import_cli.command("customers")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--format", "file_format", type=click.Choice(IMPORT_FORMATS), help="Defaults to the file extension.")
+def import_customers(path, file_format):
+    """Import customers from a CSV (with header) or JSON / JSON Lines file.
+
+    Columns: first_name, last_name, email, phone, address, fastbill_customer_id.
+    """
+    _run_import(import_service.import_customers, path, file_format)
+
+
+@import_cli.command("students")
+@click.argument("path", type=click.Path(exists=True, dir_okay=False))
+@click.option("--format", "file_format", type=click.Choice(IMPORT_FORMATS), help="Defaults to the file extension.")
+def import_students(path, file_format):
+    """Import students from a CSV (with header) or JSON / JSON Lines file.
+
+    Columns: first_name, last_name and either customer_id or customer_email.
+    """
+    _run_import(import_service.import_students, path, file_format)
@@ -0,0 +1,50 @@
+import json
+from datetime import date, datetime, timedelta
+import click
+from flask.cli import AppGroup
+from services.invoice_service import invoice_service, month_start
+
+invoice_cli = AppGroup("invoices", help="Create FastBill invoices from study sessions.")
+
+
+def _previous_month():
+    return month_start(month_start(date.today()) - timedelta(days=1))
+
+
+@invoice_cli.command("create")
+@click.option("--period", help="Month to invoice as YYYY-MM. Defaults to the previous month.")
+@click.option("--dry-run", is_flag=True, help="Only show what would be invoiced.")
+@click.option("--workers", type=click.IntRange(min=1), help="Concurrent FastBill requests.")
+def create_invoices(period, dry_run, workers):
+    """Invoice every customer's uninvoiced sessions of a month.
+
+    Creates one FastBill invoice per customer and links the sessions to it.
+    Safe to re-run: invoiced sessions are skipped and failed invoices retried.
+    """
+    if period:
+        try:
+            period = datetime.strptime(period, "%Y-%m").date()
+        except ValueError:
+            raise click.BadParameter("expected YYYY-MM", param_hint="--period")
+    else:
+        period = _previous_month()
+
+    try:
+        report = invoice_service.run(period, dry_run=dry_run, workers=workers)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(json.dumps(report.as_dict(), indent=2))
+    if report.failed or report.unknown:
+        raise SystemExit(1)
+
+
+@invoice_cli.command("resolve")
+@click.argument("invoice_id", type=int)
+@click.option("--fastbill-id", help="ID of the invoice FastBill did create. Omit to resend on the next run.")
+def resolve_invoice(invoice_id, fastbill_id):
+    """Settle an invoice whose FastBill outcome is unknown."""
+    try:
+        invoice_service.resolve(invoice_id, fastbill_invoice_id=fastbill_id)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    click.echo(f"Invoice {invoice_id} {'submitted as ' + fastbill_id if fastbill_id else 'will be resent'}")
@@ -0,0 +1,37 @@
+import json
+import click
+from flask.cli import AppGroup
+from services.outbox import outbox
+
+outbox_cli = AppGroup("outbox", help="Inspect and deliver queued side effects.")
+
+
+@outbox_cli.command("status")
+def status():
+    """Show event counts per status and the oldest pending event."""
+    click.echo(json.dumps(outbox.status(), indent=2))
+
+
+@outbox_cli.command("dispatch")
+def dispatch():
+    """Deliver all due events now (the app also does this in the background)."""
+    processed = outbox.drain()
+    click.echo(f"Processed {processed} outbox events")
+    click.echo(json.dumps(outbox.status(), indent=2))
+
+
+@outbox_cli.command("requeue-dead")
+@click.option("--topic", help="Only events of this topic, e.g. storage.upload.")
+def requeue_dead(topic):
+    """Retry dead-lettered events from scratch."""
+    requeued = outbox.requeue_dead(topic)
+    click.echo(f"Requeued {requeued} dead-lettered events")
+
+
+@outbox_cli.command("purge")
+@click.option("--days", default=30, show_default=True, type=click.IntRange(min=0),
+              help="Keep delivered events newer than this.")
+def purge(days):
+    """Delete delivered events older than --days."""
+    deleted = outbox.purge(days)
+    click.echo(f"Deleted {deleted} delivered outbox events")
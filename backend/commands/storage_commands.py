@@ -0,0 +1,39 @@
+import json
+import click
+from flask.cli import AppGroup
+from services.r2_storage import r2_storage
+from services.storage_audit import storage_audit_service
+from services.outbox import outbox
+from services.upload_spool import upload_spool
+
+storage_cli = AppGroup("storage", help="Manage stored PDF forms.")
+
+
+@storage_cli.command("reconcile-local")
+def reconcile_local():
+    """Upload PDFs kept in local storage (e.g. during an R2 outage) to R2."""
+    if not r2_storage.is_healthy():
+        raise click.ClickException("R2 storage is not configured or currently unavailable")
+
+    queued = upload_spool.reconcile_local()
+    # Deliver the queued uploads now instead of leaving them to the app's dispatcher
+    outbox.drain()
+    click.echo(f"Reconciled {queued} locally stored PDFs")
+
+
+@storage_cli.command("audit")
+@click.option("--location", type=click.Choice(["r2", "local"]), default="r2", show_default=True,
+              help="Storage to reconcile against the study_sessions table.")
+@click.option("--verify-checksums", is_flag=True, help="Download and hash every matched object.")
+@click.option("--repair", is_flag=True, help="Delete orphans, repoint rows and backfill sizes/checksums.")
+def audit(location, verify_checksums, repair):
+    """Report (or repair) orphaned objects and rows whose PDF is missing.
+
+    Point R2_ENDPOINT_URL at a local S3 stand-in (e.g. moto or MinIO) to try
+    this without touching the production bucket.
+    """
+    if location == "r2" and not r2_storage.is_healthy():
+        raise click.ClickException("R2 storage is not configured or currently unavailable")
+
+    report = storage_audit_service.audit(location=location, verify_checksums=verify_checksums, repair=repair)
+    click.echo(json.dumps(report.as_dict(), indent=2))
@@ -0,0 +1,132 @@
+"""native date and time columns on study sessions
+
+Revision ID: 619ca3a3247e
+Revises: f0bcfa73a6c6
+Create Date: 2026-10-18 12:36:43.404066
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from datetime import date, datetime, time
+
+
+# revision identifiers, used by Alembic.
+revision = '619ca3a3247e'
+down_revision = 'f0bcfa73a6c6'
+branch_labels = None
+depends_on = None
+
+# Rows converted per UPDATE batch, keeps transactions and memory small on large tables
+BATCH_SIZE = 1000
+
+# Typed view of the table so dates and times are bound correctly on every dialect
+study_sessions = sa.table(
+    'study_sessions',
+    sa.column('id', sa.Integer),
+    sa.column('date', sa.String),
+    sa.column('start_time', sa.String),
+    sa.column('end_time', sa.String),
+    sa.column('date_native', sa.Date),
+    sa.column('start_time_native', sa.Time),
+    sa.column('end_time_native', sa.Time),
+)
+
+
+def _parse_date(value, row_id):
+    try:
+        return date.fromisoformat(value.strip())
+    except ValueError:
+        pass
+    try:
+        return datetime.strptime(value.strip(), '%d.%m.%Y').date()
+    except ValueError:
+        raise RuntimeError(f"study_sessions.id={row_id}: cannot parse date {value!r}")
+
+
+def _parse_time(value, row_id):
+    try:
+        return time.fromisoformat(value.strip())
+    except ValueError:
+        raise RuntimeError(f"study_sessions.id={row_id}: cannot parse time {value!r}")
+
+
+def _backfill(select_columns, convert, target_columns):
+    """Convert rows in id-ordered batches from the old to the new columns"""
+    connection = op.get_bind()
+    update = study_sessions.update().where(study_sessions.c.id == sa.bindparam('b_id')).values(
+        {column: sa.bindparam(f'b_{column}') for column in target_columns}
+    )
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.select(study_sessions.c.id, *[study_sessions.c[column] for column in select_columns])
+            .where(study_sessions.c.id > last_id)
+            .order_by(study_sessions.c.id)
+            .limit(BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+        connection.execute(update, [
+            {'b_id': row.id, **{f'b_{column}': value for column, value in zip(target_columns, convert(row))}}
+            for row in rows
+        ])
+        last_id = rows[-1].id
+
+
+def upgrade():
+    with op.batch_alter_table('study_sessions', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('date_native', sa.Date(), nullable=True))
+        batch_op.add_column(sa.Column('start_time_native', sa.Time(), nullable=True))
+        batch_op.add_column(sa.Column('end_time_native', sa.Time(), nullable=True))
+
+    _backfill(
+        ('date', 'start_time', 'end_time'),
+        lambda row: (
+            _parse_date(row.date, row.id),
+            _parse_time(row.start_time, row.id),
+            _parse_time(row.end_time, row.id),
+        ),
+        ('date_native', 'start_time_native', 'end_time_native'),
+    )
+
+    with op.batch_alter_table('study_sessions', schema=None) as batch_op:
+        batch_op.drop_column('date')
+        batch_op.drop_column('start_time')
+        batch_op.drop_column('end_time')
+        batch_op.alter_column('date_native', new_column_name='date', existing_type=sa.Date(), nullable=False)
+        batch_op.alter_column('start_time_native', new_column_name='start_time', existing_type=sa.Time(), nullable=False)
+        batch_op.alter_column('end_time_native', new_column_name='end_time', existing_type=sa.Time(), nullable=False)
+
+    with op.batch_alter_table('study_sessions', schema=None) as batch_op:
+        batch_op.create_index('ix_study_sessions_student_id_date', ['student_id', 'date'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('study_sessions', schema=None) as batch_op:
+        batch_op.drop_index('ix_study_sessions_student_id_date')
+        batch_op.alter_column('date', new_column_name='date_native', existing_type=sa.Date(), existing_nullable=False)
+        batch_op.alter_column('start_time', new_column_name='start_time_native', existing_type=sa.Time(), existing_nullable=False)
+        batch_op.alter_column('end_time', new_column_name='end_time_native', existing_type=sa.Time(), existing_nullable=False)
+
+    with op.batch_alter_table('study_sessions', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('date', sa.String(length=10), nullable=True))
+        batch_op.add_column(sa.Column('start_time', sa.String(length=5), nullable=True))
+        batch_op.add_column(sa.Column('end_time', sa.String(length=5), nullable=True))
+
+    _backfill(
+        ('date_native', 'start_time_native', 'end_time_native'),
+        lambda row: (
+            row.date_native.isoformat(),
+            row.start_time_native.strftime('%H:%M'),
+            row.end_time_native.strftime('%H:%M'),
+        ),
+        ('date', 'start_time', 'end_time'),
+    )
+
+    with op.batch_alter_table('study_sessions', schema=None) as batch_op:
+        batch_op.drop_column('date_native')
+        batch_op.drop_column('start_time_native')
+        batch_op.drop_column('end_time_native')
+        batch_op.alter_column('date', existing_type=sa.String(length=10), nullable=False)
+        batch_op.alter_column('start_time', existing_type=sa.String(length=5), nullable=False)
+        batch_op.alter_column('end_time', existing_type=sa.String(length=5), nullable=False)
@@ -5,6 +5,11 @@ from .user import StaticUser
 from .customer import Customer
 from .student import Student
 from .study_session import StudySession
+from .stored_form import StoredForm
+from .billing_summary import BillingSummary
+from .sync_cursor import SyncCursor
+from .invoice import Invoice
+from .outbox_event import OutboxEvent
 
 # Make sure all models are available when the package is imported
-__all__ = ['database', 'migrate', 'StaticUser', 'Customer', 'Student', 'StudySession']
\ No newline at end of file
+__all__ = ['database', 'migrate', 'StaticUser', 'Customer', 'Student', 'StudySession', 'StoredForm', 'BillingSummary', 'SyncCursor', 'Invoice', 'OutboxEvent']
\ No newline at end of file
@@ -0,0 +1,14 @@
+from models.database import database
+
+
+class BillingSummary(database.Model):
+    """Sessions and minutes per student and month, maintained incrementally from study_sessions"""
+    __tablename__ = 'billing_monthly_summaries'
+
+    student_id = database.Column(database.Integer, database.ForeignKey('students.id'), primary_key=True)
+    month = database.Column(database.Date, primary_key=True)  # First day of the month
+    session_count = database.Column(database.Integer, nullable=False, default=0)
+    total_minutes = database.Column(database.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f"<BillingSummary(student_id={self.student_id}, month={self.month}, minutes={self.total_minutes})>"
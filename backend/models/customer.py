@@ -3,6 +3,10 @@ from models.database import database
 
 class Customer(database.Model):
     __tablename__ = 'customers'
+    __table_args__ = (
+        database.UniqueConstraint('email', name='uq_customers_email'),
+        database.UniqueConstraint('fastbill_customer_id', name='uq_customers_fastbill_customer_id'),
+    )
     
     id = database.Column(database.Integer, primary_key=True, autoincrement=True)
     first_name = database.Column(database.String(100), nullable=False)
@@ -0,0 +1,33 @@
+from datetime import datetime
+from models.database import database
+
+
+class Invoice(database.Model):
+    """FastBill invoice for one customer's uninvoiced sessions of a billing period"""
+    __tablename__ = 'invoices'
+    __table_args__ = (
+        database.UniqueConstraint('idempotency_key', name='uq_invoices_idempotency_key'),
+        database.Index('ix_invoices_period_status', 'period', 'status'),
+    )
+
+    # Lifecycle: reserved locally, then created in FastBill (or failed, retried on the next run)
+    STATUS_PENDING = 'pending'
+    STATUS_SUBMITTED = 'submitted'
+    STATUS_FAILED = 'failed'
+
+    id = database.Column(database.Integer, primary_key=True)
+    customer_id = database.Column(database.Integer, database.ForeignKey('customers.id'), nullable=False)
+    period = database.Column(database.Date, nullable=False)  # First day of the billed month
+    # SHA-256 of customer, period and session IDs; the same set of sessions is never invoiced twice
+    idempotency_key = database.Column(database.String(64), nullable=False)
+    status = database.Column(database.String(20), nullable=False, default=STATUS_PENDING)
+    session_count = database.Column(database.Integer, nullable=False)
+    total_minutes = database.Column(database.Integer, nullable=False)
+    fastbill_invoice_id = database.Column(database.String(100), nullable=True)
+    attempts = database.Column(database.Integer, nullable=False, default=0)
+    last_error = database.Column(database.Text, nullable=True)
+    created_at = database.Column(database.DateTime, nullable=False, default=datetime.utcnow)
+    submitted_at = database.Column(database.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<Invoice(id={self.id}, customer_id={self.customer_id}, period={self.period}, status={self.status})>"
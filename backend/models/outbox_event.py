@@ -0,0 +1,34 @@
+from datetime import datetime
+from models.database import database
+
+
+class OutboxEvent(database.Model):
+    """Side effect to deliver after commit, written in the same transaction as the change causing it"""
+    __tablename__ = 'outbox_events'
+    __table_args__ = (
+        # The dispatcher's claim query: due events in insertion order
+        database.Index('ix_outbox_events_status_available_at', 'status', 'available_at'),
+    )
+
+    STATUS_PENDING = 'pending'
+    STATUS_PROCESSING = 'processing'
+    STATUS_DONE = 'done'
+    STATUS_DEAD = 'dead'  # Gave up after the maximum number of attempts
+
+    id = database.Column(database.Integer, primary_key=True)
+    topic = database.Column(database.String(50), nullable=False)
+    payload = database.Column(database.JSON, nullable=False)
+    # Events with the same key are only queued once while undelivered
+    dedupe_key = database.Column(database.String(255), nullable=True, index=True)
+    status = database.Column(database.String(20), nullable=False, default=STATUS_PENDING)
+    attempts = database.Column(database.Integer, nullable=False, default=0)
+    available_at = database.Column(database.DateTime, nullable=False, default=datetime.utcnow)
+    # Set while a dispatcher works on the event; expired leases are claimed again
+    claim_token = database.Column(database.String(32), nullable=True)
+    locked_until = database.Column(database.DateTime, nullable=True)
+    last_error = database.Column(database.Text, nullable=True)
+    created_at = database.Column(database.DateTime, nullable=False, default=datetime.utcnow)
+    processed_at = database.Column(database.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<OutboxEvent(id={self.id}, topic={self.topic}, status={self.status})>"
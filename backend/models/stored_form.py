@@ -0,0 +1,20 @@
+from models.database import database
+
+
+class StoredForm(database.Model):
+    """Content-addressed index entry mapping a student's form for a date to its PDF hash"""
+    __tablename__ = 'stored_forms'
+    __table_args__ = (
+        database.UniqueConstraint('student_id', 'date', 'sequence', name='uq_stored_forms_student_date_sequence'),
+        database.UniqueConstraint('student_id', 'date', 'sha256', name='uq_stored_forms_student_date_sha256'),
+    )
+
+    id = database.Column(database.Integer, primary_key=True)
+    student_id = database.Column(database.Integer, database.ForeignKey('students.id'), nullable=False)
+    date = database.Column(database.String(10), nullable=False)
+    sequence = database.Column(database.Integer, nullable=False, default=0)
+    sha256 = database.Column(database.String(64), nullable=False, index=True)
+    size = database.Column(database.Integer, nullable=False)
+
+    def __repr__(self):
+        return f"<StoredForm(id={self.id}, student_id={self.student_id}, date={self.date}, sha256={self.sha256})>"
@@ -3,11 +3,15 @@ from models.database import database
 
 class Student(database.Model):
     __tablename__ = 'students'
+    __table_args__ = (
+        # Also serves lookups by customer_id (leading column)
+        database.UniqueConstraint('customer_id', 'first_name', 'last_name', name='uq_students_customer_id_name'),
+    )
     
     id = database.Column(database.Integer, primary_key=True, autoincrement=True)
     first_name = database.Column(database.String(100), nullable=False)
     last_name = database.Column(database.String(100), nullable=False)
-    customer_id = database.Column(database.Integer, database.ForeignKey('customers.id'), nullable=False)  # Added this
+    customer_id = database.Column(database.Integer, database.ForeignKey('customers.id'), nullable=False)
 
     @property
     def name(self):
@@ -5,14 +5,30 @@ from datetime import datetime
 
 class StudySession(database.Model):
     __tablename__ = 'study_sessions'
+    __table_args__ = (
+        # Serves per-student date range scans (history, billing) and student_id lookups
+        database.Index('ix_study_sessions_student_id_date', 'student_id', 'date'),
+        # Keyset pagination of the session listing (newest first)
+        database.Index('ix_study_sessions_date_id', 'date', 'id'),
+    )
+
+    # Where the PDF lives: waiting in the upload spool, in R2, or in local storage
+    STORAGE_PENDING = 'pending'
+    STORAGE_STORED = 'stored'
+    STORAGE_LOCAL = 'local'
     
     id = database.Column(database.Integer, primary_key=True)
     student_id = database.Column(database.Integer, database.ForeignKey('students.id'), nullable=False)
-    date = database.Column(database.String(10), nullable=False)
-    start_time = database.Column(database.String(5), nullable=False)
-    end_time = database.Column(database.String(5), nullable=False)
+    date = database.Column(database.Date, nullable=False)
+    start_time = database.Column(database.Time, nullable=False)
+    end_time = database.Column(database.Time, nullable=False)
     session_topic = database.Column(database.String(200), nullable=False)
     signature_present = database.Column(database.Boolean, nullable=False, default=False)
+    pdf_key = database.Column(database.String(255), nullable=True, index=True)
+    pdf_size = database.Column(database.Integer, nullable=True)
+    pdf_checksum = database.Column(database.String(64), nullable=True)  # SHA-256 hex digest
+    storage_state = database.Column(database.String(20), nullable=False, default=STORAGE_STORED, server_default=STORAGE_STORED)
+    invoice_id = database.Column(database.Integer, database.ForeignKey('invoices.id', name='fk_study_sessions_invoice_id'), nullable=True, index=True)
     
     def __repr__(self):
         return f"<StudySession(id={self.id}, student_id={self.student_id}, date={self.date})>"  
\ No newline at end of file
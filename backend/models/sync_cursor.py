@@ -0,0 +1,14 @@
+from datetime import datetime
+from models.database import database
+
+
+class SyncCursor(database.Model):
+    """High-water mark of an incremental sync with an external system"""
+    __tablename__ = 'sync_cursors'
+
+    name = database.Column(database.String(50), primary_key=True)
+    value = database.Column(database.String(255), nullable=True)
+    updated_at = database.Column(database.DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __repr__(self):
+        return f"<SyncCursor(name={self.name}, value={self.value})>"
@@ -0,0 +1,188 @@
+from collections import defaultdict
+from sqlalchemy import delete, event, func, insert, inspect
+from sqlalchemy.dialects import postgresql, sqlite
+from models.billing_summary import BillingSummary
+from models.customer import Customer
+from models.database import database
+from models.student import Student
+from models.study_session import StudySession
+import logging
+
+logger = logging.getLogger(__name__)
+
+REBUILD_BATCH_SIZE = 1000
+
+
+def session_minutes(start_time, end_time):
+    """Billable minutes of a session; sessions must end after they start, older rows that don't count 0"""
+    minutes = (end_time.hour * 60 + end_time.minute) - (start_time.hour * 60 + start_time.minute)
+    return max(minutes, 0)
+
+
+class BillingService:
+    """
+    Monthly billing aggregates per student, kept in billing_monthly_summaries
+
+    Every inserted, updated or deleted study session adjusts its (student,
+    month) rows in the same flush (see the mapper events below), so reports
+    read a few precomputed rows instead of scanning the session history.
+    Bulk UPDATE/DELETE statements bypass the events; run rebuild() after them.
+    """
+
+    def apply(self, connection, student_id, session_date, minutes, sign):
+        """
+        Add (sign=1) or remove (sign=-1) one session from its monthly aggregate
+
+        Args:
+            connection: Connection of the flush the session is written in
+            student_id: Student of the session
+            session_date: Date of the session
+            minutes: Billable minutes of the session
+            sign: 1 for an inserted session, -1 for a deleted one
+        """
+        table = BillingSummary.__table__
+        dialect_insert = postgresql.insert if connection.dialect.name == "postgresql" else sqlite.insert
+        statement = dialect_insert(table).values(
+            student_id=student_id,
+            month=session_date.replace(day=1),
+            session_count=sign,
+            total_minutes=sign * minutes,
+        )
+        statement = statement.on_conflict_do_update(
+            index_elements=[table.c.student_id, table.c.month],
+            set_={
+                "session_count": table.c.session_count + statement.excluded.session_count,
+                "total_minutes": table.c.total_minutes + statement.excluded.total_minutes,
+            },
+        )
+        connection.execute(statement)
+
+    def get_summary(self, month_from=None, month_to=None, customer_id=None, student_id=None, group_by="student"):
+        """
+        Read the monthly aggregates
+
+        Args:
+            month_from: First month to include (date, first of the month)
+            month_to: Last month to include (date, first of the month)
+            customer_id: Only this customer's students
+            student_id: Only this student
+            group_by: "student" for one row per student and month, "customer" to sum per customer
+
+        Returns:
+            List of dicts ordered by month
+        """
+        if group_by == "customer":
+            query = database.session.query(
+                BillingSummary.month,
+                Customer.id.label("customer_id"),
+                Customer.first_name,
+                Customer.last_name,
+                func.sum(BillingSummary.session_count).label("session_count"),
+                func.sum(BillingSummary.total_minutes).label("total_minutes"),
+            ).group_by(BillingSummary.month, Customer.id, Customer.first_name, Customer.last_name)
+        else:
+            query = database.session.query(
+                BillingSummary.month,
+                Customer.id.label("customer_id"),
+                Student.id.label("student_id"),
+                Student.first_name,
+                Student.last_name,
+                BillingSummary.session_count,
+                BillingSummary.total_minutes,
+            )
+        query = query.join(Student, Student.id == BillingSummary.student_id).join(
+            Customer, Customer.id == Student.customer_id
+        ).filter(BillingSummary.session_count > 0)
+
+        if month_from is not None:
+            query = query.filter(BillingSummary.month >= month_from)
+        if month_to is not None:
+            query = query.filter(BillingSummary.month <= month_to)
+        if customer_id is not None:
+            query = query.filter(Student.customer_id == customer_id)
+        if student_id is not None:
+            query = query.filter(BillingSummary.student_id == student_id)
+
+        order = [BillingSummary.month, Customer.id]
+        if group_by != "customer":
+            order.append(Student.id)
+
+        summary = []
+        for row in query.order_by(*order):
+            entry = {
+                "month": row.month.strftime("%Y-%m"),
+                "customer_id": row.customer_id,
+                "session_count": int(row.session_count),
+                "total_minutes": int(row.total_minutes),
+                "total_hours": round(int(row.total_minutes) / 60, 2),
+            }
+            if group_by == "customer":
+                entry["customer_name"] = f"{row.first_name} {row.last_name}"
+            else:
+                entry["student_id"] = row.student_id
+                entry["student_name"] = f"{row.first_name} {row.last_name}"
+            summary.append(entry)
+        return summary
+
+    def rebuild(self):
+        """
+        Recompute all aggregates from study_sessions (e.g. after bulk SQL changes)
+
+        Returns:
+            Number of summary rows written
+        """
+        totals = defaultdict(lambda: [0, 0])
+        rows = database.session.query(
+            StudySession.student_id, StudySession.date, StudySession.start_time, StudySession.end_time
+        ).yield_per(REBUILD_BATCH_SIZE)
+        for row in rows:
+            entry = totals[(row.student_id, row.date.replace(day=1))]
+            entry[0] += 1
+            entry[1] += session_minutes(row.start_time, row.end_time)
+
+        database.session.execute(delete(BillingSummary))
+        values = [
+            {"student_id": student_id, "month": month, "session_count": count, "total_minutes": minutes}
+            for (student_id, month), (count, minutes) in totals.items()
+        ]
+        if values:
+            database.session.execute(insert(BillingSummary), values)
+        database.session.commit()
+        logger.info(f"Rebuilt {len(values)} billing summary rows")
+        return len(values)
+
+
+# Global instance
+billing_service = BillingService()
+
+
+@event.listens_for(StudySession, "after_insert")
+def _session_inserted(mapper, connection, target):
+    billing_service.apply(
+        connection, target.student_id, target.date, session_minutes(target.start_time, target.end_time), 1
+    )
+
+
+@event.listens_for(StudySession, "after_delete")
+def _session_deleted(mapper, connection, target):
+    billing_service.apply(
+        connection, target.student_id, target.date, session_minutes(target.start_time, target.end_time), -1
+    )
+
+
+@event.listens_for(StudySession, "after_update")
+def _session_updated(mapper, connection, target):
+    # Move the contribution when the student, date or times changed
+    state = inspect(target)
+    old, new = [], []
+    for name in ("student_id", "date", "start_time", "end_time"):
+        history = state.attrs[name].history
+        current = getattr(target, name)
+        old.append(history.deleted[0] if history.deleted else current)
+        new.append(current)
+    if old == new:
+        return
+    student_id, session_date, start_time, end_time = old
+    billing_service.apply(connection, student_id, session_date, session_minutes(start_time, end_time), -1)
+    student_id, session_date, start_time, end_time = new
+    billing_service.apply(connection, student_id, session_date, session_minutes(start_time, end_time), 1)
@@ -1,5 +1,57 @@
-from utils.logger import logger
+import os
+from dataclasses import dataclass, fields
+from sqlalchemy import exists, literal_column, or_, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from models.customer import Customer
 from models.database import database
+from models.student import Student
+from utils.cache import VersionedCache
+from utils.logger import logger
+
+# With CACHE_REDIS_URL set, dropdown lists are rebuilt at most this often when nothing invalidates them
+DROPDOWN_CACHE_TTL = int(os.getenv("DROPDOWN_CACHE_TTL", "300"))
+
+# Rows fetched per round-trip when streaming list results
+READ_BATCH_SIZE = 500
+
+# Customer columns kept in sync with FastBill (besides fastbill_customer_id)
+FASTBILL_SYNCED_FIELDS = ("first_name", "last_name")
+
+dropdown_cache = VersionedCache("dropdowns", ttl=DROPDOWN_CACHE_TTL)
+
+
+@dataclass(frozen=True, slots=True)
+class CustomerRecord:
+    """Read-only projection of a customer, without ORM identity tracking"""
+    id: int
+    first_name: str
+    last_name: str
+    email: str | None
+    fastbill_customer_id: str | None
+
+    @property
+    def name(self):
+        return f"{self.first_name} {self.last_name}"
+
+
+@dataclass(frozen=True, slots=True)
+class StudentRecord:
+    """Read-only projection of a student, without ORM identity tracking"""
+    id: int
+    first_name: str
+    last_name: str
+    customer_id: int
+
+    @property
+    def name(self):
+        return f"{self.first_name} {self.last_name}"
+
+
+def _projection(model, record_type):
+    """select() of exactly the model columns the record type holds, in field order"""
+    return select(*(getattr(model, field.name) for field in fields(record_type)))
+
 
 class DatabaseService:
     def __init__(self):
@@ -17,145 +69,274 @@ class DatabaseService:
     def close_session(self):
         pass
 
+    def _upsert(self, model, record_type, values, conflict_columns):
+        """
+        INSERT a row unless it conflicts on conflict_columns; return the new or existing row
+
+        On PostgreSQL this is one INSERT ... ON CONFLICT DO UPDATE statement: the
+        no-op update locks and returns the existing row, so concurrent callers
+        can't both insert, and xmax = 0 tells whether the row is new. SQLite
+        (tests) uses ON CONFLICT DO NOTHING and reads the existing row back.
+
+        Returns:
+            Tuple of (record, created)
+        """
+        columns = [getattr(model, field.name) for field in fields(record_type)]
+        if self.session.get_bind().dialect.name == "postgresql":
+            statement = postgresql.insert(model).values(**values)
+            statement = statement.on_conflict_do_update(
+                index_elements=conflict_columns,
+                set_={conflict_columns[0]: statement.excluded[conflict_columns[0]]},
+            ).returning(*columns, literal_column("xmax = 0").label("created"))
+            row = self.session.execute(statement).one()
+            return record_type(*row[:-1]), row.created
+
+        statement = sqlite.insert(model).values(**values).on_conflict_do_nothing(
+            index_elements=conflict_columns
+        ).returning(*columns)
+        row = self.session.execute(statement).first()
+        if row is not None:
+            return record_type(*row), True
+        row = self.session.execute(_projection(model, record_type).where(
+            *(getattr(model, column) == values[column] for column in conflict_columns)
+        )).one()
+        return record_type(*row), False
+
+    def _stream(self, statement, record_type, batch_size=READ_BATCH_SIZE):
+        """Execute a projection and yield records, fetching batch_size rows at a time"""
+        result = self.session.execute(statement.execution_options(yield_per=batch_size))
+        for row in result:
+            yield record_type(*row)
+
     # Customer-related methods
+    def iter_customers(self):
+        """Stream all customers as CustomerRecord, ordered by ID"""
+        return self._stream(_projection(Customer, CustomerRecord).order_by(Customer.id), CustomerRecord)
+
     def get_all_customers(self):
-        """Get all customers from the database"""
+        """Get all customers from the database as CustomerRecord"""
         try:
-            from models.customer import Customer
-            customers = self.session.query(Customer).all()
-            logger.info(f"📊 Retrieved {len(customers)} customers from database")
+            customers = list(self.iter_customers())
+            logger.debug(f"📊 Retrieved {len(customers)} customers from database")
             return customers
         except Exception as e:
             logger.error(f"❌ Error fetching customers: {e}")
             raise
 
     def get_customer_by_id(self, customer_id):
-        """Get a specific customer by ID"""
+        """Get a specific customer by ID as CustomerRecord"""
         try:
-            from models.customer import Customer
-            customer = self.session.query(Customer).filter_by(id=customer_id).first()
-            return customer
+            row = self.session.execute(
+                _projection(Customer, CustomerRecord).where(Customer.id == customer_id)
+            ).first()
+            return CustomerRecord(*row) if row else None
         except Exception as e:
             logger.error(f"❌ Error fetching customer {customer_id}: {e}")
             raise
 
+    def upsert_customer(self, first_name, last_name, email=None, phone=None, address=None,
+                        fastbill_customer_id=None, conflict_on="email"):
+        """
+        Insert a customer unless one with the same email (or FastBill ID) exists
+
+        Runs in the current transaction; the caller commits.
+
+        Args:
+            conflict_on: "email" or "fastbill_customer_id"
+
+        Returns:
+            Tuple of (CustomerRecord of the new or existing customer, created)
+        """
+        values = {
+            "first_name": first_name,
+            "last_name": last_name,
+            # Empty form fields are stored as NULL so they don't collide on the unique constraints
+            "email": email or None,
+            "phone": phone or None,
+            "address": address or None,
+            "fastbill_customer_id": fastbill_customer_id or None,
+        }
+        return self._upsert(Customer, CustomerRecord, values, [conflict_on])
+
     def create_customer(self, first_name, last_name, email=None, phone=None, address=None, fastbill_customer_id=None):
         """Create a new customer"""
         try:
-            from models.customer import Customer
-            
-            # Check if customer already exists by email
-            if email:
-                existing_customer = self.session.query(Customer).filter_by(email=email).first()
-                if existing_customer:
-                    raise ValueError("Customer with this email already exists")
-
-            new_customer = Customer(
-                first_name=first_name,
-                last_name=last_name,
-                email=email,
-                phone=phone,
-                address=address,
-                fastbill_customer_id=fastbill_customer_id
-            )
-            
-            self.add_to_session(new_customer)
+            try:
+                customer, created = self.upsert_customer(
+                    first_name=first_name,
+                    last_name=last_name,
+                    email=email,
+                    phone=phone,
+                    address=address,
+                    fastbill_customer_id=fastbill_customer_id,
+                )
+            except IntegrityError:
+                # The upsert only resolves email conflicts; the FastBill ID is unique as well
+                raise ValueError("Customer with this FastBill ID already exists")
+            if not created:
+                raise ValueError("Customer with this email already exists")
+
             self.commit_session()
-            logger.info(f"✅ Created new customer: {new_customer.name}")
-            return new_customer
+            dropdown_cache.invalidate("customers")
+            logger.info(f"✅ Created new customer: {customer.name}")
+            return customer
         except Exception as e:
             self.rollback_session()
             logger.error(f"❌ Error creating customer: {e}")
             raise
 
+    def merge_fastbill_customers(self, customers):
+        """
+        Insert new and update changed FastBill customers in a handful of statements
+
+        Existing rows are read in one query to classify the incoming set; only
+        new and changed customers are written, with one multi-row
+        INSERT ... ON CONFLICT (fastbill_customer_id) DO UPDATE per batch. The
+        update's WHERE skips rows a concurrent sync already brought up to date.
+        Runs in the current transaction; the caller commits.
+
+        Args:
+            customers: Dicts with fastbill_customer_id and FASTBILL_SYNCED_FIELDS
+
+        Returns:
+            Dict of inserted, updated and unchanged counts
+        """
+        incoming = {str(c["fastbill_customer_id"]): c for c in customers}
+        counts = {"inserted": 0, "updated": 0, "unchanged": 0}
+        if not incoming:
+            return counts
+
+        synced = [getattr(Customer, field) for field in FASTBILL_SYNCED_FIELDS]
+        existing = {
+            row[0]: tuple(row[1:])
+            for row in self.session.execute(
+                select(Customer.fastbill_customer_id, *synced).where(Customer.fastbill_customer_id.in_(incoming))
+            )
+        }
+
+        rows = []
+        for fastbill_customer_id, customer in incoming.items():
+            values = tuple(customer[field] for field in FASTBILL_SYNCED_FIELDS)
+            current = existing.get(fastbill_customer_id)
+            if current == values:
+                counts["unchanged"] += 1
+                continue
+            counts["inserted" if current is None else "updated"] += 1
+            rows.append({"fastbill_customer_id": fastbill_customer_id, **dict(zip(FASTBILL_SYNCED_FIELDS, values))})
+
+        if rows:
+            dialect_insert = postgresql.insert if self.session.get_bind().dialect.name == "postgresql" else sqlite.insert
+            statement = dialect_insert(Customer)
+            statement = statement.on_conflict_do_update(
+                index_elements=[Customer.fastbill_customer_id],
+                set_={field: statement.excluded[field] for field in FASTBILL_SYNCED_FIELDS},
+                where=or_(*(column != statement.excluded[column.key] for column in synced)),
+            )
+            # executemany is batched into multi-row VALUES (insertmanyvalues)
+            self.session.execute(statement, rows)
+        return counts
+
+    def dropdown_version(self, name):
+        """Version of a cached dropdown ("customers" or "students") usable as an ETag, or None without a shared cache"""
+        return dropdown_cache.version(name)
+
     def get_customers_for_dropdown(self):
-        """Get all customers formatted for frontend dropdown"""
+        """
+        Get all customers formatted for frontend dropdown
+
+        Returns:
+            Tuple of (cache version, list of customer dicts)
+        """
         try:
-            customers = self.get_all_customers()
-            customers_data = []
-            for customer in customers:
-                customers_data.append({
-                    'id': customer.id,
-                    'name': customer.name,
-                })
-            
-            logger.info(f"✅ Formatted {len(customers_data)} customers for dropdown")
-            return customers_data
+            return dropdown_cache.get_or_load("customers", self._load_customers_for_dropdown)
         except Exception as e:
             logger.error(f"❌ Error formatting customers for dropdown: {e}")
             raise
 
+    def _load_customers_for_dropdown(self):
+        customers = [{'id': customer.id, 'name': customer.name} for customer in self.iter_customers()]
+        logger.debug(f"📊 Loaded {len(customers)} customers for dropdown")
+        return customers
+
     # Student-related methods
+    def iter_students(self, customer_id=None):
+        """Stream students as StudentRecord, ordered by ID, optionally of one customer"""
+        statement = _projection(Student, StudentRecord).order_by(Student.id)
+        if customer_id is not None:
+            statement = statement.where(Student.customer_id == customer_id)
+        return self._stream(statement, StudentRecord)
+
     def get_all_students(self):
-        """Get all students from the database"""
+        """Get all students from the database as StudentRecord"""
         try:
-            from models.student import Student
-            students = self.session.query(Student).all()
-            logger.info(f"📊 Retrieved {len(students)} students from database")
+            students = list(self.iter_students())
+            logger.debug(f"📊 Retrieved {len(students)} students from database")
             return students
         except Exception as e:
             logger.error(f"❌ Error fetching students: {e}")
             raise
 
     def get_student_by_id(self, student_id):
-        """Get a specific student by ID"""
+        """Get a specific student by ID as StudentRecord"""
         try:
-            from models.student import Student
-            student = self.session.query(Student).filter_by(id=student_id).first()
-            return student
+            row = self.session.execute(
+                _projection(Student, StudentRecord).where(Student.id == student_id)
+            ).first()
+            return StudentRecord(*row) if row else None
         except Exception as e:
             logger.error(f"❌ Error fetching student {student_id}: {e}")
             raise
 
+    def upsert_student(self, first_name, last_name, customer_id):
+        """
+        Insert a student unless the customer already has one with the same name
+
+        Runs in the current transaction; the caller commits.
+
+        Returns:
+            Tuple of (StudentRecord of the new or existing student, created)
+        """
+        values = {"first_name": first_name, "last_name": last_name, "customer_id": customer_id}
+        return self._upsert(Student, StudentRecord, values, ["customer_id", "first_name", "last_name"])
+
     def create_student(self, first_name, last_name, customer_id, email=None, phone=None, school=None, grade_level=None):
         """Create a new student"""
         try:
-            from models.student import Student
-            
-            customer = self.get_customer_by_id(customer_id)
-            if not customer:
+            if not self.session.scalar(select(exists().where(Customer.id == customer_id))):
                 raise ValueError("Customer not found")
-            
-            # Check if student already exists for this customer
-            existing_student = self.session.query(Student).filter_by(
-                first_name=first_name,
-                last_name=last_name,
-                customer_id=customer_id
-            ).first()
-            
-            if existing_student:
+
+            student, created = self.upsert_student(first_name, last_name, customer_id)
+            if not created:
                 raise ValueError("Student already exists for this customer")
 
-            new_student = Student(
-                first_name=first_name,
-                last_name=last_name,
-                customer_id=customer_id,
-            )
-            
-            self.add_to_session(new_student)
             self.commit_session()
-            logger.info(f"✅ Created new student: {new_student.name}")
-            return new_student
+            dropdown_cache.invalidate("students")
+            logger.info(f"✅ Created new student: {student.name}")
+            return student
         except Exception as e:
             self.rollback_session()
             logger.error(f"❌ Error creating student: {e}")
             raise
 
     def get_students_for_dropdown(self):
-        """Get all students formatted for frontend dropdown"""
+        """
+        Get all students formatted for frontend dropdown
+
+        Returns:
+            Tuple of (cache version, list of student dicts)
+        """
         try:
-            students = self.get_all_students()
-            students_data = []
-            for student in students:
-                students_data.append({
-                    "id": student.id,
-                    "first_name": student.first_name,
-                    "last_name": student.last_name,
-                    "full_name": student.name
-                })
-            
-            logger.info(f"✅ Formatted {len(students_data)} students for dropdown")
-            return students_data
+            return dropdown_cache.get_or_load("students", self._load_students_for_dropdown)
         except Exception as e:
             logger.error(f"❌ Error formatting students for dropdown: {e}")
             raise
+
+    def _load_students_for_dropdown(self):
+        students = [{
+            "id": student.id,
+            "first_name": student.first_name,
+            "last_name": student.last_name,
+            "full_name": student.name
+        } for student in self.iter_students()]
+        logger.debug(f"📊 Loaded {len(students)} students for dropdown")
+        return students
@@ -0,0 +1,151 @@
+import io
+import os
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from models.database import database
+from models.student import Student
+from models.study_session import StudySession
+from services.r2_storage import r2_storage
+from services.session_service import session_service
+from services.upload_spool import upload_spool
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Number of R2 objects fetched ahead of the archive writer (bounds memory use)
+EXPORT_PREFETCH = int(os.getenv("EXPORT_PREFETCH", "4"))
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+
+class _ZipStreamBuffer(io.RawIOBase):
+    """Write-only, non-seekable sink that collects zip output until it is drained"""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+class ExportService:
+    def get_export_rows(self, customer_id=None, month=None):
+        """
+        Load the sessions whose completed forms should be exported
+
+        Args:
+            customer_id: Only sessions of this customer's students
+            month: Only sessions in this month (YYYY-MM)
+
+        Returns:
+            List of rows with id, date, pdf_key, storage_state and student names
+        """
+        query = database.session.query(
+            StudySession.id,
+            StudySession.date,
+            StudySession.pdf_key,
+            StudySession.storage_state,
+            Student.first_name,
+            Student.last_name,
+        ).join(Student, Student.id == StudySession.student_id).filter(StudySession.pdf_key.isnot(None))
+
+        if customer_id is not None:
+            query = query.filter(Student.customer_id == customer_id)
+        if month:
+            month_start = datetime.strptime(month, "%Y-%m").date()
+            next_month = (month_start + timedelta(days=32)).replace(day=1)
+            query = query.filter(StudySession.date >= month_start, StudySession.date < next_month)
+
+        return query.order_by(StudySession.date, StudySession.id).all()
+
+    def entry_name(self, row):
+        """Readable archive path for a session's form"""
+        last_name = session_service._clean_filename(row.last_name)
+        first_name = session_service._clean_filename(row.first_name)
+        return f"{last_name}_{first_name}/{row.date.isoformat()}_{row.id}.pdf"
+
+    def _local_path(self, row):
+        if row.storage_state == StudySession.STORAGE_PENDING:
+            return upload_spool.spool_path(row.pdf_key)
+        return session_service.local_pdf_path(row.pdf_key)
+
+    def _fetch(self, row):
+        """Download an R2 object; local files are streamed from disk by the writer instead"""
+        if row.storage_state == StudySession.STORAGE_STORED:
+            return r2_storage.download_file(row.pdf_key)
+        return None
+
+    def iter_zip(self, rows):
+        """
+        Stream a ZIP archive of the given sessions' forms
+
+        Objects are fetched from R2 by a bounded thread pool at most
+        EXPORT_PREFETCH ahead of the writer, so only a few objects are held in
+        memory at any time. Missing objects are skipped and listed in
+        MISSING.txt at the end of the archive.
+
+        Args:
+            rows: Rows as returned by get_export_rows
+
+        Yields:
+            Chunks of the ZIP archive
+        """
+        buffer = _ZipStreamBuffer()
+        missing = []
+
+        with ThreadPoolExecutor(max_workers=EXPORT_PREFETCH, thread_name_prefix="zip-export") as executor, \
+                zipfile.ZipFile(buffer, mode="w", compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+            pending = []
+            row_iter = iter(rows)
+
+            def submit_next():
+                row = next(row_iter, None)
+                if row is not None:
+                    pending.append((row, executor.submit(self._fetch, row)))
+
+            for _ in range(EXPORT_PREFETCH):
+                submit_next()
+
+            while pending:
+                row, future = pending.pop(0)
+                submit_next()
+
+                name = self.entry_name(row)
+                try:
+                    data = future.result()
+                    if row.storage_state == StudySession.STORAGE_STORED:
+                        if data is None:
+                            missing.append(name)
+                            continue
+                        with archive.open(name, mode="w", force_zip64=True) as entry:
+                            entry.write(data)
+                        del data
+                    else:
+                        with open(self._local_path(row), "rb") as pdf_file, \
+                                archive.open(name, mode="w", force_zip64=True) as entry:
+                            for chunk in iter(lambda: pdf_file.read(EXPORT_CHUNK_SIZE), b""):
+                                entry.write(chunk)
+                                yield buffer.drain()
+                except OSError as e:
+                    logger.error(f"Failed to export {row.pdf_key}: {e}")
+                    missing.append(name)
+                    continue
+                yield buffer.drain()
+
+            if missing:
+                archive.writestr("MISSING.txt", "\n".join(missing) + "\n")
+
+        yield buffer.drain()
+
+
+# Global instance
+export_service = ExportService()
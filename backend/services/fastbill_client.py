@@ -0,0 +1,183 @@
+import base64
+import hashlib
+import json
+import os
+import random
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+from utils.cache import create_cache
+from utils.metrics import CallMetrics
+from utils.rate_limit import TokenBucket
+import logging
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_API_URL = "https://my.fastbill.com/api/1.0/api.php"
+
+CONNECT_TIMEOUT = float(os.getenv("FASTBILL_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.getenv("FASTBILL_TIMEOUT", "30"))
+
+# Total attempts including the first one; delays grow exponentially with full jitter
+MAX_ATTEMPTS = int(os.getenv("FASTBILL_MAX_ATTEMPTS", "4"))
+BACKOFF_BASE = float(os.getenv("FASTBILL_BACKOFF_BASE", "0.5"))
+BACKOFF_MAX = float(os.getenv("FASTBILL_BACKOFF_MAX", "10"))
+
+# FastBill allows a few calls per second per account; bursts up to the capacity.
+# The bucket is per process, so divide by the number of workers calling FastBill.
+RATE_LIMIT = float(os.getenv("FASTBILL_RATE_LIMIT", "2"))
+RATE_BURST = float(os.getenv("FASTBILL_RATE_BURST", "5"))
+
+# Read services (*.get) answers are reused for this many seconds; 0 disables the cache
+CACHE_TTL = float(os.getenv("FASTBILL_CACHE_TTL", "60"))
+
+RETRYABLE_STATUS = (429, 500, 502, 503, 504)
+
+
+class FastbillError(Exception):
+    """FastBill answered, but reported errors instead of a result"""
+
+
+# Shared by all clients of the process: the limits, cache and counters are per account
+fastbill_rate_limiter = TokenBucket(RATE_LIMIT, RATE_BURST)
+fastbill_metrics = CallMetrics()
+fastbill_response_cache = create_cache("fastbill", max_entries=512)
+
+
+def is_read_service(service):
+    """Read services can be cached and retried after any transient error"""
+    return service.endswith(".get")
+
+
+def backoff_delay(attempt):
+    """Full-jitter exponential backoff before retry number `attempt` (1-based)"""
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (attempt - 1)))
+
+
+def _retry_after(response):
+    """Seconds from a Retry-After header, if present and numeric"""
+    try:
+        return min(BACKOFF_MAX, max(0.0, float(response.headers.get("Retry-After"))))
+    except (TypeError, ValueError):
+        return None
+
+
+def never_sent(error):
+    """True if the request certainly didn't reach FastBill (safe to resend a write)"""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    if isinstance(error, requests.exceptions.ConnectionError) and error.args:
+        return isinstance(getattr(error.args[0], "reason", None), NewConnectionError)
+    return False
+
+
+class FastbillClient:
+    """
+    HTTP client for the FastBill API
+
+    Every call takes a token from the process-wide bucket before it is sent and
+    reuses keep-alive connections of one requests.Session. Throttled (429) and
+    failed calls are retried with exponential backoff and full jitter, honouring
+    Retry-After. Writes are only retried when FastBill can't have processed them
+    (connection refused, 429). Answers of read services are cached for
+    FASTBILL_CACHE_TTL seconds. Latency, retries, throttling and cache hits are
+    counted per service in fastbill_metrics.
+    """
+
+    def __init__(self, email, api_key, api_url=DEFAULT_API_URL, pool_size=4):
+        self.api_url = api_url
+        self.email = email
+        auth_header = base64.b64encode(f"{email}:{api_key}".encode()).decode()
+
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.http = requests.Session()
+        self.http.headers.update({
+            "Authorization": f"Basic {auth_header}",
+            "Content-Type": "application/json",
+        })
+        self.http.mount("https://", adapter)
+        self.http.mount("http://", adapter)
+
+    def _cache_key(self, payload):
+        material = json.dumps([self.api_url, self.email, payload], sort_keys=True, default=str)
+        return hashlib.sha256(material.encode()).hexdigest()
+
+    def call(self, payload, use_cache=True):
+        """
+        Send one API call
+
+        Args:
+            payload: Request body (SERVICE, FILTER, DATA, LIMIT, ...)
+            use_cache: Serve and store read services from the response cache
+
+        Returns:
+            The RESPONSE object
+
+        Raises:
+            FastbillError: FastBill reported errors
+            requests.exceptions.RequestException: The call failed after all retries
+        """
+        service = payload.get("SERVICE", "unknown")
+        read = is_read_service(service)
+        cacheable = read and use_cache and CACHE_TTL > 0
+
+        if cacheable:
+            cache_key = self._cache_key(payload)
+            cached = fastbill_response_cache.get(cache_key)
+            if cached is not None:
+                fastbill_metrics.increment(service, "cache_hits")
+                return cached
+
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            waited = fastbill_rate_limiter.acquire()
+            if waited:
+                fastbill_metrics.increment(service, "rate_limited")
+                fastbill_metrics.increment(service, "rate_limited_seconds", waited)
+
+            started = time.monotonic()
+            try:
+                response = self.http.post(self.api_url, json=payload, timeout=(CONNECT_TIMEOUT, READ_TIMEOUT))
+            except requests.exceptions.RequestException as e:
+                fastbill_metrics.record(service, time.monotonic() - started, error=True)
+                if attempt == MAX_ATTEMPTS or not (read or never_sent(e)):
+                    raise
+                delay = backoff_delay(attempt)
+                logger.warning(f"FastBill {service} failed ({e}), retrying in {delay:.2f}s")
+            else:
+                latency = time.monotonic() - started
+                if response.status_code == 429:
+                    fastbill_metrics.increment(service, "throttled")
+                if response.status_code in RETRYABLE_STATUS and (read or response.status_code == 429):
+                    fastbill_metrics.record(service, latency, error=True)
+                    if attempt == MAX_ATTEMPTS:
+                        response.raise_for_status()
+                    delay = _retry_after(response)
+                    delay = backoff_delay(attempt) if delay is None else delay
+                    logger.warning(f"FastBill {service} answered {response.status_code}, retrying in {delay:.2f}s")
+                else:
+                    fastbill_metrics.record(service, latency, error=not response.ok)
+                    response.raise_for_status()
+                    result = response.json().get("RESPONSE", {})
+                    if result.get("ERRORS"):
+                        fastbill_metrics.increment(service, "api_errors")
+                        raise FastbillError("; ".join(str(error) for error in result["ERRORS"]))
+                    if cacheable:
+                        fastbill_response_cache.set(cache_key, result, CACHE_TTL)
+                    return result
+
+            fastbill_metrics.increment(service, "retries")
+            time.sleep(delay)
+
+
+def fastbill_status():
+    """Rate limiter state and per-service counters for the status endpoint"""
+    services = fastbill_metrics.snapshot()
+    for stats in services.values():
+        if "rate_limited_seconds" in stats:
+            stats["rate_limited_seconds"] = round(stats["rate_limited_seconds"], 4)
+    return {
+        "rate_limiter": fastbill_rate_limiter.status(),
+        "cache_ttl_seconds": CACHE_TTL,
+        "services": services,
+    }
@@ -1,82 +1,195 @@
 import os
 import requests
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from dotenv import load_dotenv
-import base64
+import logging
 # --- Sync FastBill Customers to Local Database ---
-from backend.models.study_session import Customer
-from backend.models.database import database as db 
+from models.sync_cursor import SyncCursor
+from services.database_service import DatabaseService, dropdown_cache
+from services.fastbill_client import DEFAULT_API_URL, FastbillClient, FastbillError
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# customer.get returns at most this many customers per request
+PAGE_SIZE = 100
+
+# Name of the persisted high-water mark in sync_cursors
+CUSTOMER_CURSOR = "fastbill_customers"
+
+# FastBill reports LASTUPDATE in this format
+LASTUPDATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
 class FastbillService:
     def __init__(self):
         """Initialize FastBill API connection with authentication."""
-        self.api_url = os.getenv("FASTBILL_API_URL", "https://my.fastbill.com/api/1.0/api.php")
+        self.api_url = os.getenv("FASTBILL_API_URL", DEFAULT_API_URL)
         self.email = os.getenv("FASTBILL_EMAIL")
         self.api_key = os.getenv("FASTBILL_API_KEY")
+        # Pages fetched in parallel; also the size of the HTTP connection pool
+        self.concurrency = max(1, int(os.getenv("FASTBILL_SYNC_CONCURRENCY", "4")))
+        # customer.get filter that restricts results to customers changed since the
+        # cursor, e.g. a filter supported by your FastBill plan or a stub server.
+        # Without it every sync walks all pages.
+        self.changed_since_filter = os.getenv("FASTBILL_CHANGED_SINCE_FILTER") or None
 
         if not self.email or not self.api_key:
             raise ValueError("FastBill email or API key is missing!")
 
-        # Correct base64 encoding of email:api_key
-        auth_string = f"{self.email}:{self.api_key}"
-        auth_header = base64.b64encode(auth_string.encode()).decode()
+        # Timeouts, retries with backoff, rate limiting and caching (see services/fastbill_client.py)
+        self.client = FastbillClient(self.email, self.api_key, self.api_url, pool_size=self.concurrency)
 
-        self.headers = {
-            "Authorization": f"Basic {auth_header}",
-            "Content-Type": "application/json",
-        }
+    def create_invoice(self, data):
+        """
+        Create an invoice (invoice.create)
 
-    def get_customers(self):
-        """Fetch only customer IDs and names from FastBill API."""
-        limit = 100
-        offset = 0
-        customers = []
-        payload = {
+        Args:
+            data: invoice.create DATA object (CUSTOMER_ID, ITEMS, ...)
+
+        Returns:
+            FastBill INVOICE_ID as a string
+        """
+        result = self.client.call({"SERVICE": "invoice.create", "DATA": data})
+        if not result.get("INVOICE_ID"):
+            raise FastbillError(f"invoice.create returned no INVOICE_ID: {result}")
+        return str(result["INVOICE_ID"])
+
+    def _fetch_page(self, offset, filters, use_cache=True):
+        result = self.client.call({
             "SERVICE": "customer.get",
-            "FILTER": {},
-            "LIMIT_FIELDS": ["CUSTOMER_ID", "FIRST_NAME", "LAST_NAME"],
-            "LIMIT": limit,
-            "OFFSET": offset
-        }
+            "FILTER": filters,
+            "LIMIT_FIELDS": ["CUSTOMER_ID", "FIRST_NAME", "LAST_NAME", "LASTUPDATE"],
+            "LIMIT": PAGE_SIZE,
+            "OFFSET": offset,
+        }, use_cache=use_cache)
+        return result.get("CUSTOMERS", [])
+
+    def iter_customer_pages(self, filters=None, use_cache=True):
+        """
+        Walk all customer.get pages, keeping up to `concurrency` requests in flight
+
+        The total isn't known up front, so offsets are requested speculatively
+        and the first short page ends the walk.
+
+        Yields:
+            Lists of customer dicts (CUSTOMER_ID, FIRST_NAME, LAST_NAME, LASTUPDATE), in offset order
+        """
+        filters = filters or {}
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="fastbill") as pool:
+            pending = deque()
+            next_offset = 0
+            exhausted = False
+            try:
+                while True:
+                    while not exhausted and len(pending) < self.concurrency:
+                        pending.append(pool.submit(self._fetch_page, next_offset, filters, use_cache))
+                        next_offset += PAGE_SIZE
+                    if not pending:
+                        return
+                    page = pending.popleft().result()
+                    if len(page) < PAGE_SIZE:
+                        # Later offsets are past the end; their requests are discarded
+                        exhausted = True
+                        for future in pending:
+                            future.cancel()
+                        pending.clear()
+                    if page:
+                        yield page
+            finally:
+                for future in pending:
+                    future.cancel()
 
+    def get_customers(self):
+        """Fetch only customer IDs and names from FastBill API."""
         try:
-            response = requests.post(self.api_url, json=payload, headers=self.headers)
-            response.raise_for_status()
-            data = response.json()
+            return [
+                {"id": c["CUSTOMER_ID"], "first_name": c["FIRST_NAME"], "last_name": c["LAST_NAME"]}
+                for page in self.iter_customer_pages()
+                for c in page
+            ]
+
+        except (requests.exceptions.RequestException, FastbillError) as e:
+            logger.error(f"Error connecting to FastBill API: {e}")
+            return None
+
+    def sync_fastbill_customers(self, verbose=True, full=False):
+        """
+        Copy FastBill customers into the local customers table
+
+        All pages are collected first and then merged with one set-based upsert
+        (see DatabaseService.merge_fastbill_customers). The newest LASTUPDATE seen
+        is stored as the "fastbill_customers" cursor in the same transaction, so
+        with FASTBILL_CHANGED_SINCE_FILTER set a repeat run only pulls customers
+        changed since the last successful sync.
 
-            customers = data.get("RESPONSE", {}).get("CUSTOMERS", [])
+        Args:
+            verbose: Log the outcome
+            full: Ignore the cursor and walk all customers
 
-            return [{"id": c["CUSTOMER_ID"], "name": f"{c['FIRST_NAME']} {c['LAST_NAME']}"} for c in customers]
+        Returns:
+            Dict with fetched/inserted/updated/unchanged counts and the new cursor, or None on failure
+        """
+        database_service = DatabaseService()
+        session = database_service.session
+        report = {"fetched": 0, "inserted": 0, "updated": 0, "unchanged": 0, "cursor": None}
+        try:
+            cursor = session.get(SyncCursor, CUSTOMER_CURSOR)
+            since = cursor.value if cursor is not None else None
+            filters = {}
+            if self.changed_since_filter and since and not full:
+                filters[self.changed_since_filter] = since
+            high_water = since
+
+            customers = []
+            # A full sync bypasses the response cache
+            for page in self.iter_customer_pages(filters, use_cache=not full):
+                for c in page:
+                    customers.append({
+                        "fastbill_customer_id": str(c["CUSTOMER_ID"]),
+                        "first_name": c["FIRST_NAME"],
+                        "last_name": c["LAST_NAME"],
+                    })
+                    high_water = _later(high_water, c.get("LASTUPDATE"))
+            report["fetched"] = len(customers)
+            report.update(database_service.merge_fastbill_customers(customers))
 
-        except requests.exceptions.RequestException as e:
-            print(f"Error connecting to FastBill API: {e}")
+            if cursor is None:
+                cursor = SyncCursor(name=CUSTOMER_CURSOR)
+                session.add(cursor)
+            cursor.value = high_water
+            cursor.updated_at = datetime.utcnow()
+            database_service.commit_session()
+        except (requests.exceptions.RequestException, FastbillError) as e:
+            database_service.rollback_session()
+            logger.error(f"Error connecting to FastBill API: {e}")
+            return None
+        except Exception as e:
+            database_service.rollback_session()
+            logger.error(f"Failed to sync FastBill customers: {e}")
             return None
-        
-    def sync_fastbill_customers(self, verbose=True):
-        customers = self.get_customers()
-
-        if customers is None:
-            if verbose:
-                print("Failed to retrieve customers.")
-            return False
-        
-        inserted = 0
-        for c in customers:
-            # Avoid duplicates
-            existing = Customer.query.filter_by(fastbill_customer_id=c["id"]).first()
-            if existing:
-                continue
-
-            new_customer = Customer(
-                name=c["name"],
-                fastbill_customer_id=c["id"]
+
+        report["cursor"] = high_water
+        if report["inserted"] or report["updated"]:
+            dropdown_cache.invalidate("customers")
+        if verbose:
+            logger.info(
+                f"Synced FastBill customers: {report['fetched']} fetched, "
+                f"{report['inserted']} new, {report['updated']} updated, {report['unchanged']} unchanged."
             )
-            db.session.add(new_customer)
-            inserted += 1
+        return report
 
-        db.session.commit()
 
-        if verbose:
-            print(f'Synced {inserted} new FastBill customers.')
-        return
\ No newline at end of file
+def _later(current, lastupdate):
+    """The newer of two LASTUPDATE timestamps (either may be missing)"""
+    if not lastupdate:
+        return current
+    try:
+        datetime.strptime(lastupdate, LASTUPDATE_FORMAT)
+    except (TypeError, ValueError):
+        return current
+    # Same fixed-width format, so string order is time order
+    return lastupdate if current is None or lastupdate > current else current
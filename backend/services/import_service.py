@@ -0,0 +1,313 @@
+import csv
+import io
+import json
+import os
+from itertools import chain, islice
+from sqlalchemy import Integer, insert, select, tuple_
+from models.customer import Customer
+from models.database import database
+from models.student import Student
+from services.database_service import dropdown_cache
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Rows validated, checked and inserted per transaction
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "1000"))
+# Per-row errors listed in the report (all of them are counted)
+MAX_REPORTED_ERRORS = 1000
+
+IMPORT_FORMATS = ("csv", "json")
+
+CUSTOMER_COLUMNS = ("first_name", "last_name", "email", "phone", "address", "fastbill_customer_id")
+STUDENT_COLUMNS = ("first_name", "last_name", "customer_id")
+REQUIRED_COLUMNS = ("first_name", "last_name")
+
+
+class ImportReport:
+    """Counts of an import plus the errors of the rows that were not imported"""
+
+    def __init__(self):
+        self.rows = 0
+        self.inserted = 0
+        self.failed = 0
+        self.errors = []
+
+    def add_error(self, row_number, error):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"row": row_number, "error": error})
+
+    def as_dict(self):
+        errors = sorted(self.errors, key=lambda error: error["row"] or 0)
+        return {"rows": self.rows, "inserted": self.inserted, "failed": self.failed, "errors": errors}
+
+
+class ImportService:
+    """
+    Bulk import of customers and students from CSV or JSON
+
+    Input is read as a stream and processed in chunks of IMPORT_CHUNK_SIZE
+    rows. Per chunk, rows are validated, duplicates are found with one
+    set-based query, and the remaining rows are inserted in one transaction
+    (COPY on PostgreSQL, executemany elsewhere). Invalid and duplicate rows
+    are reported by row number and don't stop the import.
+    """
+
+    def iter_records(self, stream, file_format):
+        """
+        Yield (row number, record dict) from a binary stream
+
+        CSV needs a header row. JSON is either an array of objects (loaded at
+        once) or JSON Lines with one object per line (streamed).
+        """
+        text = io.TextIOWrapper(stream, encoding="utf-8-sig", newline="")
+        if file_format == "csv":
+            reader = csv.DictReader(text)
+            for record in reader:
+                yield reader.line_num, record
+            return
+
+        first_line = text.readline()
+        if first_line.lstrip().startswith("["):
+            records = json.loads(first_line + text.read())
+            if not isinstance(records, list):
+                raise ValueError("JSON import must be an array of objects")
+            yield from enumerate(records, start=1)
+            return
+
+        for row_number, line in enumerate(chain([first_line], text), start=1):
+            if line.strip():
+                yield row_number, self._parse_json_line(line)
+
+    @staticmethod
+    def _parse_json_line(line):
+        try:
+            return json.loads(line)
+        except ValueError as e:
+            # Reported against the row instead of aborting the import
+            return ValueError(f"invalid JSON: {e}")
+
+    def import_customers(self, records):
+        """
+        Import customers; emails and FastBill IDs must be unique
+
+        Args:
+            records: Iterable of (row number, record dict), see iter_records
+
+        Returns:
+            ImportReport
+        """
+        report = ImportReport()
+
+        for chunk in self._chunks(records, report):
+            rows = self._validate(chunk, CUSTOMER_COLUMNS, Customer.__table__, report)
+
+            emails = {values["email"] for _, values in rows if values["email"]}
+            fastbill_ids = {values["fastbill_customer_id"] for _, values in rows if values["fastbill_customer_id"]}
+            existing_emails = set(database.session.scalars(
+                select(Customer.email).where(Customer.email.in_(emails))
+            )) if emails else set()
+            existing_fastbill_ids = set(database.session.scalars(
+                select(Customer.fastbill_customer_id).where(Customer.fastbill_customer_id.in_(fastbill_ids))
+            )) if fastbill_ids else set()
+
+            new_rows = []
+            for row_number, values in rows:
+                if values["email"] and values["email"] in existing_emails:
+                    report.add_error(row_number, f"customer with email {values['email']} already exists")
+                elif values["fastbill_customer_id"] and values["fastbill_customer_id"] in existing_fastbill_ids:
+                    report.add_error(row_number, f"customer with FastBill ID {values['fastbill_customer_id']} already exists")
+                else:
+                    # Also catches duplicates within the chunk; earlier chunks are already committed
+                    existing_emails.add(values["email"])
+                    existing_fastbill_ids.add(values["fastbill_customer_id"])
+                    new_rows.append((row_number, values))
+
+            self._insert(Customer.__table__, CUSTOMER_COLUMNS, new_rows, report)
+
+        if report.inserted:
+            dropdown_cache.invalidate("customers")
+        logger.info(f"Imported {report.inserted} of {report.rows} customers")
+        return report
+
+    def import_students(self, records):
+        """
+        Import students; each row names its customer by customer_id or customer_email
+
+        Args:
+            records: Iterable of (row number, record dict), see iter_records
+
+        Returns:
+            ImportReport
+        """
+        report = ImportReport()
+
+        for chunk in self._chunks(records, report):
+            resolved = self._resolve_customers(chunk, report)
+            rows = self._validate(resolved, STUDENT_COLUMNS, Student.__table__, report)
+
+            identities = {(values["customer_id"], values["first_name"], values["last_name"]) for _, values in rows}
+            existing = set(database.session.execute(
+                select(Student.customer_id, Student.first_name, Student.last_name)
+                .where(tuple_(Student.customer_id, Student.first_name, Student.last_name).in_(identities))
+            ).tuples().all()) if identities else set()
+
+            new_rows = []
+            for row_number, values in rows:
+                identity = (values["customer_id"], values["first_name"], values["last_name"])
+                if identity in existing:
+                    report.add_error(row_number, "student already exists for this customer")
+                else:
+                    existing.add(identity)
+                    new_rows.append((row_number, values))
+
+            self._insert(Student.__table__, STUDENT_COLUMNS, new_rows, report)
+
+        if report.inserted:
+            dropdown_cache.invalidate("students")
+        logger.info(f"Imported {report.inserted} of {report.rows} students")
+        return report
+
+    def _resolve_customers(self, chunk, report):
+        """Turn customer_email references into customer_id and drop rows whose customer doesn't exist"""
+        emails = set()
+        ids = set()
+        for _, record in chunk:
+            if not isinstance(record, dict):
+                continue
+            if record.get("customer_id") not in (None, ""):
+                ids.add(self._as_int(record["customer_id"]))
+            elif record.get("customer_email"):
+                emails.add(str(record["customer_email"]).strip())
+        ids.discard(None)
+
+        ids_by_email = dict(database.session.execute(
+            select(Customer.email, Customer.id).where(Customer.email.in_(emails))
+        ).tuples().all()) if emails else {}
+        known_ids = set(database.session.scalars(select(Customer.id).where(Customer.id.in_(ids)))) if ids else set()
+
+        resolved = []
+        for row_number, record in chunk:
+            # Malformed rows and customer IDs are reported by _validate
+            if isinstance(record, dict):
+                if record.get("customer_id") in (None, "") and record.get("customer_email"):
+                    customer_id = ids_by_email.get(str(record["customer_email"]).strip())
+                    if customer_id is None:
+                        report.rows += 1
+                        report.add_error(row_number, f"customer with email {record['customer_email']} not found")
+                        continue
+                    record = {**record, "customer_id": customer_id}
+                else:
+                    customer_id = self._as_int(record.get("customer_id"))
+                    if customer_id is not None and customer_id not in known_ids:
+                        report.rows += 1
+                        report.add_error(row_number, f"customer {customer_id} not found")
+                        continue
+            resolved.append((row_number, record))
+        return resolved
+
+    @staticmethod
+    def _as_int(value):
+        try:
+            return int(value)
+        except (TypeError, ValueError):
+            return None
+
+    def _validate(self, chunk, columns, table, report):
+        """Normalise records to column dicts; invalid rows are reported and dropped"""
+        rows = []
+        for row_number, record in chunk:
+            report.rows += 1
+            if isinstance(record, Exception):
+                report.add_error(row_number, str(record))
+                continue
+            if not isinstance(record, dict):
+                report.add_error(row_number, "row must be an object")
+                continue
+
+            values = {}
+            error = None
+            for column in columns:
+                value = record.get(column)
+                if isinstance(value, str):
+                    value = value.strip() or None
+                column_type = table.c[column].type
+                if value is None:
+                    if column in REQUIRED_COLUMNS or not table.c[column].nullable:
+                        error = f"{column} is required"
+                        break
+                elif isinstance(column_type, Integer):
+                    value = self._as_int(value)
+                    if value is None:
+                        error = f"{column} must be an integer"
+                        break
+                else:
+                    value = str(value)
+                    if column_type.length and len(value) > column_type.length:
+                        error = f"{column} is longer than {column_type.length} characters"
+                        break
+                values[column] = value
+
+            if error is None and values.get("email") and "@" not in values["email"]:
+                error = "email is invalid"
+            if error:
+                report.add_error(row_number, error)
+            else:
+                rows.append((row_number, values))
+        return rows
+
+    def _insert(self, table, columns, rows, report):
+        """Insert one chunk in its own transaction; on failure all its rows are reported"""
+        if not rows:
+            return
+        try:
+            if database.session.get_bind().dialect.name == "postgresql":
+                self._copy(table, columns, [values for _, values in rows])
+            else:
+                database.session.execute(insert(table), [values for _, values in rows])
+            database.session.commit()
+        except Exception as e:
+            database.session.rollback()
+            logger.error(f"Import of {len(rows)} rows into {table.name} failed: {e}")
+            for row_number, _ in rows:
+                report.add_error(row_number, "insert failed (e.g. a concurrent duplicate); retry the row")
+            return
+        report.inserted += len(rows)
+
+    @staticmethod
+    def _copy(table, columns, rows):
+        """Stream rows into the table with COPY ... FROM STDIN (psycopg2)"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for values in rows:
+            # Empty unquoted CSV fields are read back as NULL
+            writer.writerow(["" if values[column] is None else values[column] for column in columns])
+        buffer.seek(0)
+
+        cursor = database.session.connection().connection.driver_connection.cursor()
+        try:
+            cursor.copy_expert(
+                f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer
+            )
+        finally:
+            cursor.close()
+
+    @staticmethod
+    def _chunks(records, report):
+        """Split the records into chunks; unreadable input ends the import after the rows read so far"""
+        records = iter(records)
+        while True:
+            chunk = []
+            try:
+                chunk.extend(islice(records, IMPORT_CHUNK_SIZE))
+            except (ValueError, csv.Error) as e:
+                report.add_error(None, f"input could not be read: {e}")
+                records = iter(())
+            if not chunk:
+                return
+            yield chunk
+
+
+# Global instance
+import_service = ImportService()
@@ -0,0 +1,425 @@
+import hashlib
+import os
+import requests
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+from models.customer import Customer
+from models.database import database
+from models.invoice import Invoice
+from models.student import Student
+from models.study_session import StudySession
+from services.billing_service import session_minutes
+from services.fastbill_client import FastbillError, never_sent
+from services.fastbill_service import FastbillService
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Net price per session hour and the VAT rate put on every invoice line
+INVOICE_HOURLY_RATE = os.getenv("INVOICE_HOURLY_RATE")
+INVOICE_VAT_PERCENT = os.getenv("INVOICE_VAT_PERCENT", "19")
+
+
+def month_start(value):
+    """First day of the month of a date"""
+    return value.replace(day=1)
+
+
+def next_month(period):
+    return date(period.year + (period.month == 12), period.month % 12 + 1, 1)
+
+
+def _created_nothing(error):
+    """True if a failed invoice.create certainly didn't create an invoice"""
+    if isinstance(error, FastbillError):
+        return True
+    if isinstance(error, requests.exceptions.HTTPError):
+        return error.response is not None and 400 <= error.response.status_code < 500
+    # Refused or unresolvable connections never reached FastBill; after read
+    # timeouts, dropped connections and 5xx answers the invoice may exist
+    return never_sent(error)
+
+
+def idempotency_key(customer_id, period, session_ids):
+    """Stable key of one invoice: the same sessions always map to the same key"""
+    material = f"{customer_id}:{period.isoformat()}:{','.join(str(i) for i in sorted(session_ids))}"
+    return hashlib.sha256(material.encode()).hexdigest()
+
+
+@dataclass
+class InvoiceDraft:
+    """One customer's sessions of a billing period, ready to become an invoice"""
+    customer_id: int
+    fastbill_customer_id: str
+    period: date
+    sessions: list = field(default_factory=list)
+    invoice_id: int | None = None
+    # Attempts of the invoice row when it was read; claim() only succeeds while unchanged
+    attempts: int = 0
+
+    @property
+    def session_ids(self):
+        return [session.id for session in self.sessions]
+
+    @property
+    def total_minutes(self):
+        return sum(session_minutes(s.start_time, s.end_time) for s in self.sessions)
+
+    @property
+    def idempotency_key(self):
+        return idempotency_key(self.customer_id, self.period, self.session_ids)
+
+
+@dataclass
+class InvoiceRunReport:
+    period: date
+    drafted: int = 0
+    submitted: int = 0
+    failed: int = 0
+    # Attempted before but the outcome was never recorded (e.g. crash mid-request);
+    # left alone so they can't be created twice, check FastBill and resolve by hand
+    unknown: list = field(default_factory=list)
+    # Customers with uninvoiced sessions but no FastBill customer ID
+    skipped_customers: list = field(default_factory=list)
+    errors: list = field(default_factory=list)
+    # Dry runs only: what would be invoiced
+    preview: list = field(default_factory=list)
+
+    def as_dict(self):
+        result = {
+            "period": self.period.strftime("%Y-%m"),
+            "drafted": self.drafted,
+            "submitted": self.submitted,
+            "failed": self.failed,
+            "unknown": self.unknown,
+            "skipped_customers": self.skipped_customers,
+            "errors": self.errors,
+        }
+        if self.preview:
+            result["preview"] = self.preview
+        return result
+
+
+class InvoiceService:
+    """
+    Month-end invoicing: uninvoiced study sessions -> one FastBill invoice per customer
+
+    A run works in three steps:
+
+    1. Draft: one query loads the period's uninvoiced sessions, grouped per
+       customer. Each group is reserved in its own transaction: an invoices row
+       (keyed by customer, period and session IDs) is inserted and its ID written
+       to the sessions, so a concurrent run can't claim them again.
+    2. Submit: all unsubmitted invoices of the period are claimed (see claim())
+       and sent to FastBill by a worker pool; the FastBill client paces them to
+       stay under the API rate limit.
+    3. Record: each result is stored in its own transaction as it arrives.
+
+    Failed invoices keep their sessions and idempotency key and are retried by
+    the next run. An invoice whose request was sent but whose result was never
+    recorded is not resent automatically.
+    """
+
+    def _hourly_rate(self):
+        try:
+            rate = Decimal(INVOICE_HOURLY_RATE or "")
+        except InvalidOperation:
+            raise ValueError("INVOICE_HOURLY_RATE must be set to the net price per session hour")
+        if rate <= 0:
+            raise ValueError("INVOICE_HOURLY_RATE must be positive")
+        return rate
+
+    def collect(self, period):
+        """
+        Group the period's uninvoiced sessions per customer
+
+        Returns:
+            Tuple of (list of InvoiceDraft, list of skipped customer dicts without a FastBill ID)
+        """
+        rows = database.session.execute(
+            select(
+                StudySession.id,
+                StudySession.date,
+                StudySession.start_time,
+                StudySession.end_time,
+                StudySession.session_topic,
+                Student.first_name.label("student_first_name"),
+                Student.last_name.label("student_last_name"),
+                Customer.id.label("customer_id"),
+                Customer.first_name.label("customer_first_name"),
+                Customer.last_name.label("customer_last_name"),
+                Customer.fastbill_customer_id,
+            )
+            .join(Student, Student.id == StudySession.student_id)
+            .join(Customer, Customer.id == Student.customer_id)
+            .where(
+                StudySession.invoice_id.is_(None),
+                StudySession.date >= period,
+                StudySession.date < next_month(period),
+            )
+            .order_by(Customer.id, StudySession.date, StudySession.start_time, StudySession.id)
+        )
+
+        drafts = {}
+        skipped = {}
+        for row in rows:
+            if not row.fastbill_customer_id:
+                skipped[row.customer_id] = {
+                    "customer_id": row.customer_id,
+                    "name": f"{row.customer_first_name} {row.customer_last_name}",
+                }
+                continue
+            draft = drafts.get(row.customer_id)
+            if draft is None:
+                draft = drafts[row.customer_id] = InvoiceDraft(row.customer_id, row.fastbill_customer_id, period)
+            draft.sessions.append(row)
+        return list(drafts.values()), list(skipped.values())
+
+    def build_payload(self, draft, hourly_rate):
+        """invoice.create DATA for a draft: one line per session, billed by the hour"""
+        items = []
+        for session in draft.sessions:
+            hours = (Decimal(session_minutes(session.start_time, session.end_time)) / 60).quantize(Decimal("0.01"))
+            items.append({
+                "DESCRIPTION": (
+                    f"{session.date.strftime('%d.%m.%Y')} {session.start_time.strftime('%H:%M')}-"
+                    f"{session.end_time.strftime('%H:%M')} {session.student_first_name} "
+                    f"{session.student_last_name}: {session.session_topic}"
+                ),
+                "QUANTITY": str(hours),
+                "UNIT_PRICE": str(hourly_rate),
+                "VAT_PERCENT": INVOICE_VAT_PERCENT,
+            })
+        return {
+            "CUSTOMER_ID": draft.fastbill_customer_id,
+            "INVOICE_DATE": datetime.utcnow().strftime("%Y-%m-%d"),
+            "INVOICE_TITLE": f"Nachhilfe {draft.period.strftime('%m/%Y')}",
+            "ITEMS": items,
+        }
+
+    def reserve(self, draft):
+        """
+        Insert the draft's invoice row and claim its sessions in one transaction
+
+        Returns:
+            Invoice ID, or None if another run claimed some of the sessions first
+        """
+        session = database.session
+        try:
+            invoice = Invoice(
+                customer_id=draft.customer_id,
+                period=draft.period,
+                idempotency_key=draft.idempotency_key,
+                status=Invoice.STATUS_PENDING,
+                session_count=len(draft.sessions),
+                total_minutes=draft.total_minutes,
+            )
+            session.add(invoice)
+            session.flush()
+            claimed = session.execute(
+                update(StudySession)
+                .where(StudySession.id.in_(draft.session_ids), StudySession.invoice_id.is_(None))
+                .values(invoice_id=invoice.id)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            if claimed != len(draft.sessions):
+                session.rollback()
+                logger.warning(f"Sessions of customer {draft.customer_id} were claimed concurrently, skipping")
+                return None
+            session.commit()
+            return invoice.id
+        except IntegrityError:
+            # Same idempotency key: these exact sessions already have an invoice
+            session.rollback()
+            logger.warning(f"Invoice for customer {draft.customer_id} already exists, skipping")
+            return None
+        except Exception:
+            session.rollback()
+            raise
+
+    def _open_invoices(self, period):
+        """Unsubmitted invoices of the period with their sessions, as drafts"""
+        invoices = database.session.execute(
+            select(Invoice.id, Invoice.customer_id, Invoice.attempts, Invoice.status, Customer.fastbill_customer_id)
+            .join(Customer, Customer.id == Invoice.customer_id)
+            .where(Invoice.period == period, Invoice.status != Invoice.STATUS_SUBMITTED)
+            .order_by(Invoice.id)
+        ).all()
+        if not invoices:
+            return [], []
+
+        sessions = defaultdict(list)
+        rows = database.session.execute(
+            select(
+                StudySession.id,
+                StudySession.invoice_id,
+                StudySession.date,
+                StudySession.start_time,
+                StudySession.end_time,
+                StudySession.session_topic,
+                Student.first_name.label("student_first_name"),
+                Student.last_name.label("student_last_name"),
+            )
+            .join(Student, Student.id == StudySession.student_id)
+            .where(StudySession.invoice_id.in_([invoice.id for invoice in invoices]))
+            .order_by(StudySession.date, StudySession.start_time, StudySession.id)
+        )
+        for row in rows:
+            sessions[row.invoice_id].append(row)
+
+        drafts, unknown = [], []
+        for invoice in invoices:
+            if invoice.status == Invoice.STATUS_PENDING and invoice.attempts > 0:
+                unknown.append(invoice.id)
+                continue
+            drafts.append(InvoiceDraft(
+                invoice.customer_id, invoice.fastbill_customer_id, period, sessions[invoice.id], invoice.id,
+                invoice.attempts,
+            ))
+        return drafts, unknown
+
+    def claim(self, drafts):
+        """
+        Mark the attempt on the drafts' invoices before sending them
+
+        Each UPDATE only matches while the invoice is unsubmitted and still has
+        the attempt count this run read, so when runs overlap exactly one of
+        them gets to send each invoice. The mark also means a crash mid-request
+        leaves a trace (see InvoiceRunReport.unknown).
+
+        Returns:
+            The drafts this run claimed
+        """
+        session = database.session
+        claimed = []
+        try:
+            for draft in drafts:
+                marked = session.execute(
+                    update(Invoice)
+                    .where(
+                        Invoice.id == draft.invoice_id,
+                        Invoice.status != Invoice.STATUS_SUBMITTED,
+                        Invoice.attempts == draft.attempts,
+                    )
+                    .values(status=Invoice.STATUS_PENDING, attempts=Invoice.attempts + 1)
+                    .execution_options(synchronize_session=False)
+                ).rowcount
+                if marked:
+                    claimed.append(draft)
+                else:
+                    logger.warning(f"Invoice {draft.invoice_id} was claimed by a concurrent run, skipping")
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        return claimed
+
+    def _record(self, invoice_id, fastbill_invoice_id=None, error=None, definite=True):
+        """Store one submission result in its own transaction"""
+        values = {"last_error": error}
+        if fastbill_invoice_id is not None:
+            values.update(
+                status=Invoice.STATUS_SUBMITTED,
+                fastbill_invoice_id=fastbill_invoice_id,
+                submitted_at=datetime.utcnow(),
+            )
+        elif definite:
+            values["status"] = Invoice.STATUS_FAILED
+        database.session.execute(update(Invoice).where(Invoice.id == invoice_id).values(**values))
+        database.session.commit()
+
+    def resolve(self, invoice_id, fastbill_invoice_id=None):
+        """
+        Settle an invoice whose outcome is unknown after checking FastBill by hand
+
+        Args:
+            invoice_id: Local invoice ID
+            fastbill_invoice_id: The invoice FastBill did create; None to have the next run resend it
+
+        Raises:
+            ValueError: Unknown or already submitted invoice
+        """
+        invoice = database.session.get(Invoice, invoice_id)
+        if invoice is None:
+            raise ValueError(f"Invoice {invoice_id} not found")
+        if invoice.status == Invoice.STATUS_SUBMITTED:
+            raise ValueError(f"Invoice {invoice_id} was already submitted as {invoice.fastbill_invoice_id}")
+        if fastbill_invoice_id:
+            self._record(invoice_id, fastbill_invoice_id=str(fastbill_invoice_id))
+        else:
+            self._record(invoice_id, error=invoice.last_error)
+
+    def run(self, period, dry_run=False, workers=None):
+        """
+        Invoice all uninvoiced sessions of a month
+
+        Args:
+            period: Any date in the month to invoice
+            dry_run: Only report what would be invoiced, without writing or calling FastBill
+            workers: Concurrent FastBill requests (defaults to FASTBILL_SYNC_CONCURRENCY)
+
+        Returns:
+            InvoiceRunReport
+
+        Raises:
+            ValueError: Missing configuration (hourly rate, FastBill credentials)
+        """
+        period = month_start(period)
+        hourly_rate = self._hourly_rate()
+        report = InvoiceRunReport(period)
+
+        drafts, report.skipped_customers = self.collect(period)
+        if dry_run:
+            database.session.rollback()
+            report.drafted = len(drafts)
+            for draft in drafts:
+                payload = self.build_payload(draft, hourly_rate)
+                report.preview.append({
+                    "customer_id": draft.customer_id,
+                    "fastbill_customer_id": draft.fastbill_customer_id,
+                    "sessions": len(draft.sessions),
+                    "hours": round(draft.total_minutes / 60, 2),
+                    "net": str(sum(Decimal(i["QUANTITY"]) * hourly_rate for i in payload["ITEMS"])),
+                })
+            return report
+
+        fastbill = FastbillService()
+        for draft in drafts:
+            if self.reserve(draft) is not None:
+                report.drafted += 1
+
+        open_drafts, report.unknown = self._open_invoices(period)
+        open_drafts = self.claim(open_drafts)
+        if not open_drafts:
+            return report
+        payloads = {draft.invoice_id: self.build_payload(draft, hourly_rate) for draft in open_drafts}
+
+        with ThreadPoolExecutor(max_workers=workers or fastbill.concurrency, thread_name_prefix="invoice") as pool:
+            futures = {
+                pool.submit(fastbill.create_invoice, payload): invoice_id
+                for invoice_id, payload in payloads.items()
+            }
+            for future in as_completed(futures):
+                invoice_id = futures[future]
+                try:
+                    self._record(invoice_id, fastbill_invoice_id=future.result())
+                    report.submitted += 1
+                except Exception as e:
+                    self._record(invoice_id, error=str(e), definite=_created_nothing(e))
+                    report.failed += 1
+                    report.errors.append({"invoice_id": invoice_id, "error": str(e)})
+
+        logger.info(
+            f"Invoicing {period:%Y-%m}: {report.drafted} drafted, {report.submitted} submitted, "
+            f"{report.failed} failed, {len(report.unknown)} unresolved"
+        )
+        return report
+
+
+# Global instance
+invoice_service = InvoiceService()
@@ -0,0 +1,321 @@
+import os
+import random
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy import and_, delete, event, func, or_, select, update
+from sqlalchemy.orm import Session
+from models.database import database
+from models.outbox_event import OutboxEvent
+import logging
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_WORKERS = int(os.getenv("OUTBOX_WORKERS", "2"))
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "20"))
+# Seconds between polls when not woken up by a commit in this process
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", "5"))
+# Attempts before an event is dead-lettered; retries back off exponentially with jitter
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8"))
+OUTBOX_RETRY_DELAY = float(os.getenv("OUTBOX_RETRY_DELAY", "2"))
+OUTBOX_MAX_RETRY_DELAY = float(os.getenv("OUTBOX_MAX_RETRY_DELAY", "600"))
+# A claimed event whose dispatcher died is claimed again after this many seconds
+OUTBOX_LEASE_SECONDS = float(os.getenv("OUTBOX_LEASE_SECONDS", "300"))
+
+# Session.info key of the dedupe keys added in the current transaction
+DEDUPE_KEYS_INFO = "outbox_dedupe_keys"
+
+
+@event.listens_for(Session, "after_commit")
+@event.listens_for(Session, "after_rollback")
+def _forget_dedupe_keys(session):
+    session.info.pop(DEDUPE_KEYS_INFO, None)
+
+
+class Outbox:
+    """
+    Transactional outbox for side effects of database changes
+
+    Writers call add() before committing, so an event exists exactly when the
+    change it belongs to was committed; the request itself never waits on a
+    remote service. A dispatcher thread per process (started lazily, like the
+    upload spool) claims due events in batches, runs the topic's handler on a
+    worker pool and records the outcome. Failed events are retried with
+    exponential backoff and dead-lettered after OUTBOX_MAX_ATTEMPTS.
+
+    Delivery is at least once: a dispatcher that dies mid-event leaves a lease
+    that expires, and the event runs again. Handlers must therefore be
+    idempotent.
+    """
+
+    def __init__(self):
+        self.app = None
+        self._handlers = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._pid = None
+        self._executor = None
+
+    def init_app(self, app):
+        """Remember the app so handlers can run inside an app context"""
+        self.app = app
+        app.extensions["outbox"] = self
+        # Pick up events left by a previous process once this one serves requests
+        app.before_request(self._ensure_started)
+
+    def register(self, topic, handler, on_dead=None):
+        """
+        Handle events of a topic
+
+        Args:
+            topic: Event topic, e.g. "storage.upload"
+            handler: Called with the event payload; raise to have the event retried
+            on_dead: Called with the payload once the event is dead-lettered
+        """
+        self._handlers[topic] = (handler, on_dead)
+
+    def add(self, topic, payload, dedupe_key=None):
+        """
+        Queue an event in the current transaction; the caller commits and then calls notify()
+
+        Events with a dedupe_key are skipped while an event with the same key is
+        still waiting to be claimed (in the database or earlier in this
+        transaction). A claimed event is not enough: its handler may already be
+        past the point where it would cover this transaction's changes.
+
+        Returns:
+            The new OutboxEvent, or None if it was deduplicated
+        """
+        session = database.session
+        if dedupe_key is not None:
+            queued = session.info.setdefault(DEDUPE_KEYS_INFO, set())
+            if dedupe_key in queued:
+                return None
+            waiting = session.scalar(select(func.count()).select_from(OutboxEvent).where(
+                OutboxEvent.dedupe_key == dedupe_key,
+                OutboxEvent.status == OutboxEvent.STATUS_PENDING,
+            ))
+            if waiting:
+                return None
+            queued.add(dedupe_key)
+        outbox_event = OutboxEvent(topic=topic, payload=payload, dedupe_key=dedupe_key)
+        session.add(outbox_event)
+        return outbox_event
+
+    def notify(self):
+        """Wake up this process's dispatcher after a commit that added events"""
+        self._ensure_started()
+        self._wakeup.set()
+
+    def _ensure_started(self):
+        """Start the dispatcher once per process (i.e. per gunicorn worker, after fork)"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._executor = ThreadPoolExecutor(max_workers=OUTBOX_WORKERS, thread_name_prefix="outbox")
+            self._wakeup = threading.Event()
+            self._pid = os.getpid()
+            threading.Thread(target=self._run, name="outbox-dispatcher", daemon=True).start()
+
+    def _run(self):
+        pid = os.getpid()
+        while self._pid == pid:
+            try:
+                processed = self.dispatch()
+            except Exception as e:
+                logger.error(f"Outbox dispatch failed: {e}")
+                processed = 0
+            if processed < OUTBOX_BATCH_SIZE:
+                # Drained (or failing): wait for the next commit or poll
+                self._wakeup.wait(OUTBOX_POLL_INTERVAL)
+                self._wakeup.clear()
+
+    def claim(self, limit=OUTBOX_BATCH_SIZE):
+        """
+        Lease up to `limit` due events to this dispatcher
+
+        The UPDATE only takes events that are still unclaimed (or whose lease
+        expired), and the claim token tells which ones this call got, so
+        concurrent dispatchers never share an event. On PostgreSQL the candidate
+        rows are locked with SKIP LOCKED so dispatchers don't wait on each other.
+
+        Returns:
+            List of (id, topic, payload, attempts) rows
+        """
+        session = database.session
+        now = datetime.utcnow()
+        due = or_(
+            and_(OutboxEvent.status == OutboxEvent.STATUS_PENDING, OutboxEvent.available_at <= now),
+            and_(OutboxEvent.status == OutboxEvent.STATUS_PROCESSING, OutboxEvent.locked_until < now),
+        )
+        candidates = select(OutboxEvent.id).where(due).order_by(OutboxEvent.id).limit(limit)
+        if session.get_bind().dialect.name == "postgresql":
+            candidates = candidates.with_for_update(skip_locked=True)
+
+        token = uuid.uuid4().hex
+        try:
+            ids = session.scalars(candidates).all()
+            if not ids:
+                session.rollback()
+                return []
+            session.execute(
+                update(OutboxEvent)
+                .where(OutboxEvent.id.in_(ids), due)
+                .values(
+                    status=OutboxEvent.STATUS_PROCESSING,
+                    claim_token=token,
+                    locked_until=now + timedelta(seconds=OUTBOX_LEASE_SECONDS),
+                    attempts=OutboxEvent.attempts + 1,
+                )
+                .execution_options(synchronize_session=False)
+            )
+            session.commit()
+        except Exception:
+            session.rollback()
+            raise
+        return session.execute(
+            select(OutboxEvent.id, OutboxEvent.topic, OutboxEvent.payload, OutboxEvent.attempts)
+            .where(OutboxEvent.claim_token == token)
+            .order_by(OutboxEvent.id)
+        ).all()
+
+    def dispatch(self, limit=OUTBOX_BATCH_SIZE):
+        """
+        Claim one batch and process it on the worker pool
+
+        Returns:
+            Number of events processed
+        """
+        with self.app.app_context():
+            events = self.claim(limit)
+        if not events:
+            return 0
+
+        executor = self._executor
+        if executor is None or self._pid != os.getpid():
+            # CLI: no dispatcher thread, process in a temporary pool
+            with ThreadPoolExecutor(max_workers=OUTBOX_WORKERS, thread_name_prefix="outbox") as pool:
+                list(pool.map(self._process, events))
+        else:
+            list(executor.map(self._process, events))
+        return len(events)
+
+    def drain(self, limit=OUTBOX_BATCH_SIZE):
+        """Process all due events (e.g. from a CLI command); returns the number processed"""
+        processed = 0
+        while True:
+            count = self.dispatch(limit)
+            processed += count
+            if count < limit:
+                return processed
+
+    def _process(self, event):
+        handler, on_dead = self._handlers.get(event.topic, (None, None))
+        with self.app.app_context():
+            try:
+                if handler is None:
+                    raise LookupError(f"No handler for outbox topic {event.topic}")
+                handler(event.payload)
+            except Exception as e:
+                database.session.rollback()
+                self._failed(event, on_dead, e)
+                return
+            self._finish(event.id, status=OutboxEvent.STATUS_DONE, processed_at=datetime.utcnow(), last_error=None)
+
+    def _failed(self, event, on_dead, error):
+        if event.attempts < OUTBOX_MAX_ATTEMPTS:
+            delay = random.uniform(0.5, 1.0) * min(
+                OUTBOX_MAX_RETRY_DELAY, OUTBOX_RETRY_DELAY * 2 ** (event.attempts - 1)
+            )
+            logger.warning(
+                f"Outbox event {event.id} ({event.topic}) failed, attempt {event.attempts}/{OUTBOX_MAX_ATTEMPTS}, "
+                f"retrying in {delay:.1f}s: {error}"
+            )
+            self._finish(
+                event.id,
+                status=OutboxEvent.STATUS_PENDING,
+                available_at=datetime.utcnow() + timedelta(seconds=delay),
+                last_error=str(error),
+            )
+            return
+
+        logger.error(f"Outbox event {event.id} ({event.topic}) dead-lettered after {event.attempts} attempts: {error}")
+        self._finish(event.id, status=OutboxEvent.STATUS_DEAD, processed_at=datetime.utcnow(), last_error=str(error))
+        if on_dead is not None:
+            try:
+                on_dead(event.payload)
+            except Exception as e:
+                logger.error(f"Dead-letter handler of outbox event {event.id} failed: {e}")
+
+    def _finish(self, event_id, **values):
+        try:
+            database.session.execute(
+                update(OutboxEvent)
+                .where(OutboxEvent.id == event_id)
+                .values(claim_token=None, locked_until=None, **values)
+            )
+            database.session.commit()
+        except Exception:
+            database.session.rollback()
+            raise
+
+    def purge(self, older_than_days):
+        """
+        Delete delivered events older than the given number of days
+
+        Returns:
+            Number of events deleted
+        """
+        cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+        try:
+            deleted = database.session.execute(
+                delete(OutboxEvent).where(OutboxEvent.status == OutboxEvent.STATUS_DONE, OutboxEvent.processed_at < cutoff)
+            ).rowcount
+            database.session.commit()
+        except Exception:
+            database.session.rollback()
+            raise
+        return deleted
+
+    def requeue_dead(self, topic=None):
+        """
+        Give dead-lettered events a fresh set of attempts
+
+        Returns:
+            Number of events requeued
+        """
+        statement = update(OutboxEvent).where(OutboxEvent.status == OutboxEvent.STATUS_DEAD)
+        if topic is not None:
+            statement = statement.where(OutboxEvent.topic == topic)
+        try:
+            requeued = database.session.execute(statement.values(
+                status=OutboxEvent.STATUS_PENDING, attempts=0, available_at=datetime.utcnow(), processed_at=None
+            )).rowcount
+            database.session.commit()
+        except Exception:
+            database.session.rollback()
+            raise
+        return requeued
+
+    def status(self):
+        """Event counts per status and the age of the oldest due event"""
+        counts = dict(database.session.execute(
+            select(OutboxEvent.status, func.count()).group_by(OutboxEvent.status)
+        ).tuples().all())
+        oldest = database.session.scalar(
+            select(func.min(OutboxEvent.created_at)).where(OutboxEvent.status == OutboxEvent.STATUS_PENDING)
+        )
+        return {
+            "pending": counts.get(OutboxEvent.STATUS_PENDING, 0),
+            "processing": counts.get(OutboxEvent.STATUS_PROCESSING, 0),
+            "done": counts.get(OutboxEvent.STATUS_DONE, 0),
+            "dead": counts.get(OutboxEvent.STATUS_DEAD, 0),
+            "oldest_pending_seconds": round((datetime.utcnow() - oldest).total_seconds(), 3) if oldest else 0,
+        }
+
+
+# Global instance
+outbox = Outbox()
@@ -1,13 +1,47 @@
 import boto3
 import os
+import threading
+import time
 import uuid
 import tempfile
-from botocore.exceptions import ClientError
-from typing import Optional, Tuple
+from boto3.exceptions import S3UploadFailedError
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config as BotoConfig
+from botocore.exceptions import BotoCoreError, ClientError
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+from utils.cache import create_cache
+from utils.circuit_breaker import CircuitBreaker, CircuitOpenError
+from utils.metrics import CallMetrics
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Uploads above the threshold are sent as multipart uploads in chunks of this size
+# (R2 and S3 require parts of at least 5MB, except for the last one)
+MULTIPART_THRESHOLD = int(os.getenv('R2_MULTIPART_THRESHOLD_MB', '8')) * 1024 * 1024
+MULTIPART_CHUNK_SIZE = int(os.getenv('R2_MULTIPART_CHUNK_MB', '8')) * 1024 * 1024
+MULTIPART_CONCURRENCY = int(os.getenv('R2_MULTIPART_CONCURRENCY', '2'))
+
+# Connection pool per process: every request thread and outbox worker may run a
+# multipart upload with MULTIPART_CONCURRENCY parts in flight
+MAX_POOL_CONNECTIONS = int(os.getenv(
+    'R2_MAX_POOL_CONNECTIONS',
+    str((int(os.getenv('THREADS', '8')) + int(os.getenv('OUTBOX_WORKERS', '2'))) * MULTIPART_CONCURRENCY)
+))
+CONNECT_TIMEOUT = float(os.getenv('R2_CONNECT_TIMEOUT', '5'))
+READ_TIMEOUT = float(os.getenv('R2_READ_TIMEOUT', '30'))
+# Total attempts including the first one; 'adaptive' mode also rate-limits client-side on throttling
+MAX_ATTEMPTS = int(os.getenv('R2_MAX_ATTEMPTS', '5'))
+
+# Maximum number of keys per delete_objects request
+DELETE_BATCH_SIZE = 1000
+
+# Cached presigned URLs are dropped at least this many seconds before they expire
+PRESIGNED_URL_SAFETY_MARGIN = int(os.getenv('R2_PRESIGNED_URL_SAFETY_MARGIN', '60'))
+
+# Errors that mean an R2 call did not succeed
+R2_ERRORS = (ClientError, BotoCoreError, S3UploadFailedError, CircuitOpenError)
+
 class R2StorageService:
     def __init__(self):
         """Initialize R2 storage service with credentials from environment"""
@@ -16,27 +50,134 @@ class R2StorageService:
         self.secret_access_key = os.getenv('R2_SECRET_ACCESS_KEY')
         self.bucket_name = os.getenv('R2_BUCKET_NAME')
         
-        if not all([self.endpoint_url, self.access_key_id, self.secret_access_key, self.bucket_name]):
+        # Bounded concurrency keeps at most MULTIPART_CONCURRENCY chunks in memory per upload
+        self.transfer_config = TransferConfig(
+            multipart_threshold=MULTIPART_THRESHOLD,
+            multipart_chunksize=MULTIPART_CHUNK_SIZE,
+            max_concurrency=MULTIPART_CONCURRENCY,
+        )
+
+        # Fail fast to the local fallback while R2 is unreachable or too slow
+        self.circuit_breaker = CircuitBreaker(
+            'r2',
+            failure_threshold=int(os.getenv('R2_CIRCUIT_FAILURES', '3')),
+            reset_timeout=float(os.getenv('R2_CIRCUIT_RESET_SECONDS', '30')),
+            slow_call_seconds=float(os.getenv('R2_CIRCUIT_SLOW_CALL_SECONDS', '10')),
+        )
+
+        self.presigned_url_cache = create_cache(
+            'r2:presigned', max_entries=int(os.getenv('R2_PRESIGNED_URL_CACHE_SIZE', '4096'))
+        )
+
+        self.metrics = CallMetrics()
+        self._client = None
+        self._client_pid = None
+        self._client_lock = threading.Lock()
+
+        self.configured = all([self.endpoint_url, self.access_key_id, self.secret_access_key, self.bucket_name])
+        if not self.configured:
             logger.warning("R2 credentials not found, falling back to local storage")
-            self.s3_client = None
-            return
-        
+
+    @property
+    def s3_client(self):
+        """
+        boto3 client for R2, created lazily once per process
+
+        Building the client at import time would create it in the gunicorn master
+        under --preload and share its connection pool across forked workers, so
+        it is (re)built on first use in every process. The client itself is
+        thread-safe and shared by all request and background threads.
+        """
+        if not self.configured:
+            return None
+        if self._client_pid == os.getpid():
+            return self._client
+
+        with self._client_lock:
+            if self._client_pid != os.getpid():
+                self._client = self._create_client()
+                self._client_pid = os.getpid()
+        return self._client
+
+    def _create_client(self):
         try:
-            self.s3_client = boto3.client(
+            client = boto3.client(
                 's3',
                 endpoint_url=self.endpoint_url,
                 aws_access_key_id=self.access_key_id,
                 aws_secret_access_key=self.secret_access_key,
-                region_name='auto'  # R2 uses 'auto' for region
+                region_name='auto',  # R2 uses 'auto' for region
+                config=BotoConfig(
+                    max_pool_connections=MAX_POOL_CONNECTIONS,
+                    connect_timeout=CONNECT_TIMEOUT,
+                    read_timeout=READ_TIMEOUT,
+                    retries={'mode': 'adaptive', 'max_attempts': MAX_ATTEMPTS},
+                ),
             )
-            logger.info("R2 storage service initialized successfully")
         except Exception as e:
             logger.error(f"Failed to initialize R2 storage: {e}")
-            self.s3_client = None
-    
+            return None
+
+        # Count retries of every API call, including the parts of multipart uploads
+        client.meta.events.register('after-call.s3', self._record_retries)
+        logger.info(f"R2 storage client initialized (pid {os.getpid()}, pool {MAX_POOL_CONNECTIONS})")
+        return client
+
+    def _record_retries(self, http_response=None, parsed=None, model=None, **kwargs):
+        retries = (parsed or {}).get('ResponseMetadata', {}).get('RetryAttempts', 0)
+        if model is not None:
+            self.metrics.increment(model.name, 'retries', retries)
+
     def is_available(self) -> bool:
-        """Check if R2 storage is available"""
+        """Check if R2 storage is configured"""
         return self.s3_client is not None
+
+    def is_healthy(self) -> bool:
+        """Check if R2 storage is configured and its circuit breaker is not open"""
+        return self.is_available() and not self.circuit_breaker.is_open()
+
+    def _call(self, method: str, **kwargs):
+        """
+        Invoke an S3 client method through the circuit breaker
+
+        Raises CircuitOpenError without touching the network while the circuit
+        is open. Client errors (e.g. a missing key) do not count as outages.
+        """
+        if not self.circuit_breaker.allow_request():
+            raise CircuitOpenError("R2 circuit is open")
+
+        started = time.monotonic()
+        try:
+            result = getattr(self.s3_client, method)(**kwargs)
+        except ClientError as e:
+            latency = time.monotonic() - started
+            self.metrics.record(method, latency, error=True)
+            status = e.response.get('ResponseMetadata', {}).get('HTTPStatusCode') or 500
+            if status >= 500:
+                self.circuit_breaker.record_failure(latency)
+            else:
+                self.circuit_breaker.record_success(latency)
+            raise
+        except (BotoCoreError, S3UploadFailedError):
+            latency = time.monotonic() - started
+            self.metrics.record(method, latency, error=True)
+            self.circuit_breaker.record_failure(latency)
+            raise
+        else:
+            latency = time.monotonic() - started
+            self.metrics.record(method, latency)
+            self.circuit_breaker.record_success(latency)
+            return result
+        finally:
+            self.circuit_breaker.release_probe()
+
+    def status(self) -> dict:
+        """Circuit breaker state and per-operation latency/retry counters"""
+        return {
+            "configured": self.configured,
+            "circuit": self.circuit_breaker.status(),
+            "operations": self.metrics.snapshot(),
+        }
     
     def upload_file(self, file_data: bytes, file_name: str, content_type: str = 'application/octet-stream') -> Optional[str]:
         """
@@ -55,7 +196,8 @@ class R2StorageService:
             return None
         
         try:
-            self.s3_client.put_object(
+            self._call(
+                'put_object',
                 Bucket=self.bucket_name,
                 Key=file_name,
                 Body=file_data,
@@ -68,10 +210,47 @@ class R2StorageService:
             logger.info(f"File uploaded successfully: {file_name}")
             return file_url
             
-        except ClientError as e:
+        except R2_ERRORS as e:
             logger.error(f"Failed to upload file to R2: {e}")
             return None
     
+    def upload_fileobj(self, file_obj: BinaryIO, file_name: str, content_type: str = 'application/octet-stream') -> Optional[str]:
+        """
+        Stream a file-like object to R2 storage without reading it into memory
+
+        Small files are sent with a single PUT, larger ones as a multipart upload
+        in MULTIPART_CHUNK_SIZE chunks.
+
+        Args:
+            file_obj: Readable binary file object, positioned at the start of the data
+            file_name: Name for the file in storage
+            content_type: MIME type of the file
+
+        Returns:
+            File URL if successful, None if failed
+        """
+        if not self.is_available():
+            logger.warning("R2 storage not available")
+            return None
+
+        try:
+            self._call(
+                'upload_fileobj',
+                Fileobj=file_obj,
+                Bucket=self.bucket_name,
+                Key=file_name,
+                ExtraArgs={'ContentType': content_type, 'ACL': 'private'},
+                Config=self.transfer_config,
+            )
+
+            file_url = f"{self.endpoint_url}/{self.bucket_name}/{file_name}"
+            logger.info(f"File streamed successfully: {file_name}")
+            return file_url
+
+        except R2_ERRORS as e:
+            logger.error(f"Failed to stream file to R2: {e}")
+            return None
+
     def download_file(self, file_name: str) -> Optional[bytes]:
         """
         Download file from R2 storage
@@ -86,12 +265,32 @@ class R2StorageService:
             return None
         
         try:
-            response = self.s3_client.get_object(Bucket=self.bucket_name, Key=file_name)
+            response = self._call('get_object', Bucket=self.bucket_name, Key=file_name)
             return response['Body'].read()
-        except ClientError as e:
+        except R2_ERRORS as e:
             logger.error(f"Failed to download file from R2: {e}")
             return None
     
+    def open_file(self, file_name: str) -> Optional[BinaryIO]:
+        """
+        Open a file in R2 storage for streaming reads
+
+        Args:
+            file_name: Name of the file in storage
+
+        Returns:
+            Readable body (close it when done) if successful, None if failed
+        """
+        if not self.is_available():
+            return None
+
+        try:
+            response = self._call('get_object', Bucket=self.bucket_name, Key=file_name)
+            return response['Body']
+        except R2_ERRORS as e:
+            logger.error(f"Failed to open file in R2: {e}")
+            return None
+
     def delete_file(self, file_name: str) -> bool:
         """
         Delete file from R2 storage
@@ -106,16 +305,100 @@ class R2StorageService:
             return False
         
         try:
-            self.s3_client.delete_object(Bucket=self.bucket_name, Key=file_name)
+            self._call('delete_object', Bucket=self.bucket_name, Key=file_name)
             logger.info(f"File deleted successfully: {file_name}")
             return True
-        except ClientError as e:
+        except R2_ERRORS as e:
             logger.error(f"Failed to delete file from R2: {e}")
             return False
     
+    def _presigned_url_ttl(self, expiration: int) -> float:
+        """How long a presigned URL may be served from cache before it gets too close to expiry"""
+        return expiration - max(PRESIGNED_URL_SAFETY_MARGIN, expiration * 0.1)
+
+    def _sign_url(self, file_name: str, expiration: int) -> Optional[str]:
+        try:
+            return self.s3_client.generate_presigned_url(
+                'get_object',
+                Params={'Bucket': self.bucket_name, 'Key': file_name},
+                ExpiresIn=expiration
+            )
+        except R2_ERRORS as e:
+            logger.error(f"Failed to generate presigned URL: {e}")
+            return None
+
+    def list_objects(self, prefix: str = '', page_size: int = 1000) -> Iterator[dict]:
+        """
+        Iterate over all objects below a prefix, one list_objects_v2 page at a time
+
+        Objects are yielded in key order. Errors are raised to the caller, since
+        a silently truncated listing would look like missing objects.
+
+        Args:
+            prefix: Key prefix to list
+            page_size: Keys per request (at most 1000)
+
+        Yields:
+            Dicts with Key, Size, ETag and LastModified
+        """
+        if not self.is_available():
+            return
+
+        kwargs = {'Bucket': self.bucket_name, 'Prefix': prefix, 'MaxKeys': page_size}
+        while True:
+            response = self._call('list_objects_v2', **kwargs)
+            for obj in response.get('Contents', []):
+                yield obj
+            if not response.get('IsTruncated'):
+                return
+            kwargs['ContinuationToken'] = response['NextContinuationToken']
+
+    def delete_files(self, file_names: Iterable[str]) -> Tuple[int, List[str]]:
+        """
+        Delete many files with batched delete_objects calls of up to 1000 keys
+
+        Args:
+            file_names: Names of the files to delete
+
+        Returns:
+            Tuple of (number of deleted files, names that failed to delete)
+        """
+        file_names = list(dict.fromkeys(file_names))
+        if not self.is_available():
+            return 0, file_names
+
+        deleted = 0
+        failed = []
+        for start in range(0, len(file_names), DELETE_BATCH_SIZE):
+            batch = file_names[start:start + DELETE_BATCH_SIZE]
+            try:
+                response = self._call(
+                    'delete_objects',
+                    Bucket=self.bucket_name,
+                    Delete={'Objects': [{'Key': name} for name in batch], 'Quiet': True},
+                )
+            except R2_ERRORS as e:
+                logger.error(f"Failed to delete {len(batch)} files from R2: {e}")
+                failed.extend(batch)
+                continue
+
+            # Quiet mode only reports the keys that failed
+            errors = response.get('Errors', [])
+            for error in errors:
+                logger.error(f"Failed to delete {error.get('Key')} from R2: {error.get('Message')}")
+            failed.extend(error['Key'] for error in errors)
+            deleted += len(batch) - len(errors)
+
+        logger.info(f"Deleted {deleted} files from R2 in batches")
+        return deleted, failed
+
     def generate_presigned_url(self, file_name: str, expiration: int = 3600) -> Optional[str]:
         """
         Generate a presigned URL for file access
+
+        URLs are cached per key and expiration and evicted a safety margin
+        before they expire, so callers always get a URL that is still valid
+        for most of its lifetime.
         
         Args:
             file_name: Name of the file
@@ -124,19 +407,36 @@ class R2StorageService:
         Returns:
             Presigned URL if successful, None if failed
         """
+        return self.generate_presigned_urls([file_name], expiration).get(file_name)
+
+    def generate_presigned_urls(self, file_names: Iterable[str], expiration: int = 3600) -> Dict[str, str]:
+        """
+        Generate presigned URLs for many files at once, e.g. for listing pages
+
+        Args:
+            file_names: Names of the files
+            expiration: URL expiration time in seconds (default 1 hour)
+
+        Returns:
+            Dict mapping file name to presigned URL; files that failed are omitted
+        """
         if not self.is_available():
-            return None
-        
-        try:
-            url = self.s3_client.generate_presigned_url(
-                'get_object',
-                Params={'Bucket': self.bucket_name, 'Key': file_name},
-                ExpiresIn=expiration
-            )
-            return url
-        except ClientError as e:
-            logger.error(f"Failed to generate presigned URL: {e}")
-            return None
+            return {}
+
+        ttl = self._presigned_url_ttl(expiration)
+        urls = {}
+        for file_name in file_names:
+            if file_name in urls:
+                continue
+            cache_key = f"{expiration}:{file_name}"
+            url = self.presigned_url_cache.get(cache_key)
+            if url is None:
+                url = self._sign_url(file_name, expiration)
+                if url is None:
+                    continue
+                self.presigned_url_cache.set(cache_key, url, ttl)
+            urls[file_name] = url
+        return urls
 
     def file_exists(self, file_name: str) -> bool:
         """
@@ -152,9 +452,9 @@ class R2StorageService:
             return False
         
         try:
-            self.s3_client.head_object(Bucket=self.bucket_name, Key=file_name)
+            self._call('head_object', Bucket=self.bucket_name, Key=file_name)
             return True
-        except ClientError:
+        except R2_ERRORS:
             return False
 
 # Global instance
@@ -1,22 +1,45 @@
+import base64
+import hashlib
+import json
 import os
 import uuid
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
 from models.study_session import StudySession
 from models.student import Student
+from models.stored_form import StoredForm
 from models.database import database
-from datetime import datetime
+from datetime import date as date_type, datetime, time
 from services.r2_storage import r2_storage
+from services.upload_spool import PDF_KEY_PREFIX, upload_spool
+from utils.file_utils import write_stream_atomically
 import tempfile
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Chunk size used when hashing upload streams
+HASH_CHUNK_SIZE = 64 * 1024
+
+# Threads hashing and writing the PDFs of a batch submission
+BATCH_PDF_WORKERS = int(os.getenv("BATCH_PDF_WORKERS", "4"))
+
+# Inserts of a form index entry before giving up on concurrent submits
+INDEX_ATTEMPTS = 5
+
+# Page size limits of the session listing
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+
 class SessionService:
     def __init__(self):
         # Always keep a local fallback directory in case R2 is unavailable
         self.pdf_dir = "data/completed_forms"
         os.makedirs(self.pdf_dir, exist_ok=True)
 
-        if r2_storage.is_available():
+        if r2_storage.configured:
             logger.info("Using R2 storage for file uploads")
         else:
             logger.warning("R2 storage unavailable; using local storage fallback")
@@ -51,137 +74,379 @@ class SessionService:
         
         return f"{first_name}_{last_name}_{formatted_date}.pdf"
 
+    def hash_pdf(self, pdf_stream):
+        """
+        Compute the SHA-256 digest and size of an upload stream in chunks
+
+        Args:
+            pdf_stream: Seekable binary stream of the uploaded PDF
+
+        Returns:
+            Tuple of (hex digest, size in bytes)
+        """
+        digest = hashlib.sha256()
+        size = 0
+        pdf_stream.seek(0)
+        for chunk in iter(lambda: pdf_stream.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+            size += len(chunk)
+        pdf_stream.seek(0)
+        return digest.hexdigest(), size
+
+    def content_key(self, sha256):
+        """Storage key of a content-addressed PDF"""
+        return f"{PDF_KEY_PREFIX}{sha256}.pdf"
+
+    def content_checksum(self, pdf_key):
+        """SHA-256 of a content-addressed storage key, None for other (legacy) keys"""
+        if pdf_key and pdf_key.startswith(PDF_KEY_PREFIX) and pdf_key.endswith(".pdf"):
+            sha256 = pdf_key[len(PDF_KEY_PREFIX):-len(".pdf")]
+            if len(sha256) == 64:
+                return sha256
+        return None
+
     def save_pdf(self, pdf_file, student_id, date):
         """
-        Save PDF to R2 or local storage with meaningful filename
-        
+        Save PDF under its content hash, spooled for R2 or in local storage
+
+        When R2 is configured the PDF is written to the upload spool and the
+        session is created as pending; the caller enqueues the upload after
+        committing (see UploadSpool).
+
+        Identical uploads are stored once: if a study session already references
+        the hash the upload is skipped and only the (student, date) mapping is
+        recorded. The index row is inserted in the current transaction and
+        committed together with the study session.
+
         Args:
             pdf_file: File object from form upload
             student_id: ID of the student
             date: Date string in YYYY-MM-DD format
-            
+
         Returns:
-            bool: True if successful
+            Tuple of (storage key, size in bytes, SHA-256 hex digest, storage state)
+            if successful, None if failed
         """
-        pdf_filename = self.generate_pdf_filename(student_id, date)
+        # Stream the upload instead of reading it into memory; Werkzeug already
+        # spools larger request bodies to a temporary file
+        pdf_stream = getattr(pdf_file, "stream", pdf_file)
+        sha256, size = self.hash_pdf(pdf_stream)
+        file_key = self.content_key(sha256)
 
-        # Read PDF data
-        pdf_file.seek(0)  # Reset file pointer to beginning
-        pdf_data = pdf_file.read()
+        self._index_pdf(student_id, date, sha256, size)
 
-        if r2_storage.is_available():
-            # Upload to R2
-            file_key = f"completed_forms/{pdf_filename}"
-            
-            # Handle duplicates by adding timestamp if needed
-            counter = 1
-            original_filename = pdf_filename
-            while True:
-                try:
-                    file_url = r2_storage.upload_file(
-                        file_data=pdf_data,
-                        file_name=file_key,
-                        content_type='application/pdf'
-                    )
-                    if file_url:
-                        logger.info(f"PDF uploaded to R2: {file_key}")
-                        return file_key
-                    else:
-                        # If upload failed, try with incremented name
-                        name_without_ext = original_filename.replace('.pdf', '')
-                        pdf_filename = f"{name_without_ext}_{counter}.pdf"
-                        file_key = f"completed_forms/{pdf_filename}"
-                        counter += 1
-                        
-                        if counter > 10:  # Prevent infinite loop
-                            logger.error("Failed to upload PDF after multiple attempts")
-                            break
-                except Exception as e:
-                    logger.error(f"R2 upload failed: {e}")
-                    break
-        
-        # Fallback to local storage
+        # Only a session referencing the key tells where the object is; without
+        # one (e.g. its upload was rolled back) the PDF is written again
+        storage_state = database.session.scalar(
+            select(StudySession.storage_state).where(StudySession.pdf_key == file_key).limit(1)
+        )
+        if storage_state is not None:
+            logger.info(f"PDF already stored, skipping upload: {file_key}")
+            return file_key, size, sha256, storage_state
+
+        storage_state = self._write_pdf(pdf_stream, file_key)
+        if storage_state is None:
+            return None
+        return file_key, size, sha256, storage_state
+
+    def _write_pdf(self, pdf_stream, file_key):
+        """
+        Write a new PDF to the upload spool, or to local storage while R2 is unavailable
+
+        Touches only the filesystem, so it is safe to call from worker threads.
+
+        Returns:
+            Storage state of the written file, None if it could not be written
+        """
+        if r2_storage.is_healthy():
+            # Write-behind: the spool uploads to R2 once the session is committed
+            try:
+                pdf_stream.seek(0)
+                upload_spool.spool(pdf_stream, file_key)
+                return StudySession.STORAGE_PENDING
+            except Exception as e:
+                logger.error(f"Failed to spool PDF: {e}")
+
+        # Fallback to local storage (R2 not configured or its circuit is open)
         logger.info("Falling back to local storage")
-        pdf_path = os.path.join(self.pdf_dir, pdf_filename)
-        
-        # Handle duplicate filenames locally
-        counter = 1
-        original_filename = pdf_filename
-        while os.path.exists(pdf_path):
-            name_without_ext = original_filename.replace('.pdf', '')
-            pdf_filename = f"{name_without_ext}_{counter}.pdf"
-            pdf_path = os.path.join(self.pdf_dir, pdf_filename)
-            counter += 1
-        
-        # Save to local storage
+        pdf_path = self.local_pdf_path(file_key)
+        if os.path.exists(pdf_path):
+            return StudySession.STORAGE_LOCAL
+
         try:
-            with open(pdf_path, 'wb') as f:
-                f.write(pdf_data)
+            pdf_stream.seek(0)
+            write_stream_atomically(pdf_stream, pdf_path)
             logger.info(f"PDF saved locally: {pdf_path}")
-            return pdf_path
+            return StudySession.STORAGE_LOCAL
         except Exception as e:
             logger.error(f"Failed to save PDF locally: {e}")
             return None
 
-    def get_pdf_url(self, student_id, date, expiration=3600):
+    def _index_pdf(self, student_id, date, sha256, size):
         """
-        Get a downloadable URL for a PDF based on student and date
-        
+        Map (student, date) to the PDF hash, reusing the entry for resubmitted forms
+
+        The entry is inserted right away with ON CONFLICT DO NOTHING, so
+        concurrent resubmits of the same form end up with one row. If a
+        concurrent submit of another form took the next sequence, the insert is
+        skipped as well and retried with a fresh sequence.
+        """
+        dialect_insert = postgresql.insert if database.session.get_bind().dialect.name == "postgresql" else sqlite.insert
+        for _ in range(INDEX_ATTEMPTS):
+            existing = database.session.scalar(select(StoredForm.id).where(
+                StoredForm.student_id == student_id, StoredForm.date == date, StoredForm.sha256 == sha256
+            ))
+            if existing is not None:
+                return existing
+
+            last_sequence = database.session.scalar(select(func.max(StoredForm.sequence)).where(
+                StoredForm.student_id == student_id, StoredForm.date == date
+            ))
+            inserted = database.session.scalar(
+                dialect_insert(StoredForm).values(
+                    student_id=student_id,
+                    date=date,
+                    sequence=0 if last_sequence is None else last_sequence + 1,
+                    sha256=sha256,
+                    size=size,
+                ).on_conflict_do_nothing().returning(StoredForm.id)
+            )
+            if inserted is not None:
+                return inserted
+        raise RuntimeError(f"Could not index PDF {sha256} of student {student_id} on {date}")
+
+    def local_pdf_path(self, pdf_key):
+        """Local fallback path of a stored PDF key"""
+        return os.path.join(self.pdf_dir, pdf_key[len(PDF_KEY_PREFIX):])
+
+    def get_pdf_url(self, session_id, expiration=3600):
+        """
+        Get a downloadable URL for the PDF of a study session
+
         Args:
-            student_id: ID of the student
-            date: Date string in YYYY-MM-DD format
+            session_id: ID of the study session
             expiration: URL expiration in seconds (default 1 hour)
-            
+
         Returns:
             Downloadable URL or None if file doesn't exist
         """
-        pdf_filename = self.generate_pdf_filename(student_id, date)
-        
-        if r2_storage.is_available():
-            file_key = f"completed_forms/{pdf_filename}"
-            # Check if file exists and generate presigned URL
-            presigned_url = r2_storage.generate_presigned_url(file_key, expiration)
-            if presigned_url:
-                return presigned_url
-        
-        # For local storage, check if file exists
-        pdf_path = os.path.join(self.pdf_dir, pdf_filename)
-        if os.path.exists(pdf_path):
-            return f"/api/files/{pdf_filename}"
-        
-        return None
+        return self.get_pdf_urls([session_id], expiration).get(session_id)
 
-    def delete_pdf(self, student_id, date):
+    def get_pdf_urls(self, session_ids, expiration=3600):
         """
-        Delete PDF from storage based on student and date
-        
+        Get downloadable URLs for the PDFs of many study sessions with one query
+
         Args:
-            student_id: ID of the student
-            date: Date string in YYYY-MM-DD format
-            
+            session_ids: IDs of the study sessions
+            expiration: URL expiration in seconds (default 1 hour)
+
+        Returns:
+            Dict mapping session ID to URL; sessions without a URL are omitted
+        """
+        rows = database.session.query(
+            StudySession.id, StudySession.pdf_key, StudySession.storage_state
+        ).filter(StudySession.id.in_(list(session_ids))).all()
+        return self.pdf_urls_for_rows(rows, expiration)
+
+    def pdf_urls_for_rows(self, rows, expiration=3600):
+        """
+        Build download URLs for already loaded (id, pdf_key, storage_state) rows
+
+        R2 URLs are signed in one batch and served from the presigned URL cache.
+        PDFs still waiting in the upload spool get no URL yet.
+        """
+        urls = {}
+        r2_rows = []
+        for row in rows:
+            if not row.pdf_key:
+                continue
+            if row.storage_state == StudySession.STORAGE_LOCAL:
+                urls[row.id] = f"/api/files/{os.path.basename(self.local_pdf_path(row.pdf_key))}"
+            elif row.storage_state == StudySession.STORAGE_STORED:
+                r2_rows.append(row)
+
+        if r2_rows and r2_storage.is_available():
+            signed = r2_storage.generate_presigned_urls([row.pdf_key for row in r2_rows], expiration)
+            for row in r2_rows:
+                if row.pdf_key in signed:
+                    urls[row.id] = signed[row.pdf_key]
+        return urls
+
+    def delete_pdf(self, session_id):
+        """
+        Delete the PDF of a study session from storage
+
+        The object is kept while other sessions still reference the same content.
+
+        Args:
+            session_id: ID of the study session
+
         Returns:
             bool: True if successful
         """
-        pdf_filename = self.generate_pdf_filename(student_id, date)
-        success = False
-        
-        if r2_storage.is_available():
-            file_key = f"completed_forms/{pdf_filename}"
-            success = r2_storage.delete_file(file_key)
-            if success:
-                logger.info(f"PDF deleted from R2: {file_key}")
-        
-        # Also try local storage cleanup
+        result = self.delete_pdfs([session_id])
+        return not result["failed"] and result["deleted"] + result["kept"] > 0
+
+    def delete_pdfs(self, session_ids):
+        """
+        Delete the PDFs of many study sessions with a bounded number of requests
+
+        Uses two queries and one R2 delete_objects call per 1000 keys. Objects
+        still referenced by sessions outside the given set are kept. The
+        stored_forms entries of deleted objects are removed from the database
+        session; the caller commits.
+
+        Args:
+            session_ids: IDs of the study sessions
+
+        Returns:
+            Dict with the number of deleted and kept objects, the keys that were
+            already gone (local storage only) and the keys that failed
+        """
+        session_ids = list(session_ids)
+        rows = database.session.query(StudySession.pdf_key, StudySession.pdf_checksum).filter(
+            StudySession.id.in_(session_ids), StudySession.pdf_key.isnot(None)
+        ).distinct().all()
+        checksums = {row.pdf_key: row.pdf_checksum for row in rows}
+        if not checksums:
+            return {"deleted": 0, "kept": 0, "missing": [], "failed": []}
+
+        shared_keys = {
+            row.pdf_key for row in database.session.query(StudySession.pdf_key).filter(
+                StudySession.pdf_key.in_(list(checksums)), StudySession.id.notin_(session_ids)
+            ).distinct()
+        }
+        for pdf_key in shared_keys:
+            logger.info(f"PDF still referenced, keeping object: {pdf_key}")
+        pdf_keys = [pdf_key for pdf_key in checksums if pdf_key not in shared_keys]
+
+        failed = set()
+        deleted_in_r2 = bool(pdf_keys) and r2_storage.is_available()
+        if deleted_in_r2:
+            _, failed_keys = r2_storage.delete_files(pdf_keys)
+            failed.update(failed_keys)
+
+        # Also clean up local storage and the upload spool; a local copy counts as deleted
+        deleted = 0
+        missing = []
+        for pdf_key in pdf_keys:
+            removed_locally = False
+            local_error = False
+            for pdf_path in (self.local_pdf_path(pdf_key), upload_spool.spool_path(pdf_key)):
+                try:
+                    os.remove(pdf_path)
+                    logger.info(f"PDF deleted locally: {pdf_path}")
+                    removed_locally = True
+                except FileNotFoundError:
+                    continue
+                except OSError as e:
+                    logger.error(f"Failed to delete local PDF: {e}")
+                    local_error = True
+            if removed_locally:
+                failed.discard(pdf_key)
+            elif not deleted_in_r2:
+                # Nothing was deleted anywhere
+                if local_error:
+                    failed.add(pdf_key)
+                else:
+                    logger.warning(f"PDF to delete not found in local storage: {pdf_key}")
+                    missing.append(pdf_key)
+                    continue
+            if pdf_key not in failed:
+                deleted += 1
+
+        # Forget deleted content so an identical re-upload is stored again
+        # Rows stored before checksums were recorded still have content-addressed keys
+        deleted_checksums = [
+            checksums[key] or self.content_checksum(key) for key in pdf_keys if key not in failed
+        ]
+        deleted_checksums = [checksum for checksum in deleted_checksums if checksum]
+        if deleted_checksums:
+            StoredForm.query.filter(StoredForm.sha256.in_(deleted_checksums)).delete(synchronize_session=False)
+
+        return {"deleted": deleted, "kept": len(shared_keys), "missing": sorted(missing), "failed": sorted(failed)}
+
+    def encode_cursor(self, session_date, session_id):
+        """Opaque cursor pointing just after the given (date, id) position"""
+        payload = json.dumps([session_date.isoformat(), session_id]).encode()
+        return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+    def decode_cursor(self, cursor):
+        """Inverse of encode_cursor; raises ValueError for malformed cursors"""
         try:
-            pdf_path = os.path.join(self.pdf_dir, pdf_filename)
-            if os.path.exists(pdf_path):
-                os.remove(pdf_path)
-                logger.info(f"PDF deleted locally: {pdf_path}")
-                success = True
-        except Exception as e:
-            logger.error(f"Failed to delete local PDF: {e}")
-        
-        return success
+            padded = cursor + "=" * (-len(cursor) % 4)
+            session_date, session_id = json.loads(base64.urlsafe_b64decode(padded))
+            return date_type.fromisoformat(session_date), int(session_id)
+        except (TypeError, ValueError):
+            raise ValueError("Invalid cursor")
+
+    def list_sessions(self, student_id=None, customer_id=None, date_from=None, date_to=None,
+                      cursor=None, limit=DEFAULT_PAGE_SIZE):
+        """
+        List study sessions, newest first, with keyset pagination on (date, id)
+
+        Only the listed columns are read and student names are joined in the
+        same query. Pages continue from the cursor position instead of an
+        OFFSET, so every page costs the same no matter how deep it is.
+
+        Args:
+            student_id: Only sessions of this student
+            customer_id: Only sessions of this customer's students
+            date_from: First date to include
+            date_to: Last date to include
+            cursor: Cursor returned with the previous page
+            limit: Page size (capped at MAX_PAGE_SIZE)
+
+        Returns:
+            Tuple of (list of session dicts, cursor of the next page or None)
+        """
+        limit = max(1, min(limit, MAX_PAGE_SIZE))
+        query = database.session.query(
+            StudySession.id,
+            StudySession.student_id,
+            StudySession.date,
+            StudySession.start_time,
+            StudySession.end_time,
+            StudySession.session_topic,
+            StudySession.signature_present,
+            StudySession.pdf_key,
+            StudySession.storage_state,
+            Student.first_name,
+            Student.last_name,
+        ).join(Student, Student.id == StudySession.student_id)
+
+        if student_id is not None:
+            query = query.filter(StudySession.student_id == student_id)
+        if customer_id is not None:
+            query = query.filter(Student.customer_id == customer_id)
+        if date_from is not None:
+            query = query.filter(StudySession.date >= date_from)
+        if date_to is not None:
+            query = query.filter(StudySession.date <= date_to)
+        if cursor:
+            query = query.filter(tuple_(StudySession.date, StudySession.id) < self.decode_cursor(cursor))
+
+        # Fetch one extra row to know whether another page follows
+        rows = query.order_by(StudySession.date.desc(), StudySession.id.desc()).limit(limit + 1).all()
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = self.encode_cursor(rows[-1].date, rows[-1].id)
+
+        urls = self.pdf_urls_for_rows(rows)
+        sessions = [{
+            "id": row.id,
+            "student_id": row.student_id,
+            "student_name": f"{row.first_name} {row.last_name}",
+            "date": row.date.isoformat(),
+            "start_time": row.start_time.strftime("%H:%M"),
+            "end_time": row.end_time.strftime("%H:%M"),
+            "session_topic": row.session_topic,
+            "signature_present": row.signature_present,
+            "storage_state": row.storage_state,
+            "pdf_url": urls.get(row.id),
+        } for row in rows]
+        return sessions, next_cursor
 
     def _clean_filename(self, name):
         """Clean name for use in filename by removing special characters"""
@@ -199,30 +464,153 @@ class SessionService:
         
         return cleaned or "Unknown"
 
-    def create_study_session(self, data, files):
+    def parse_session_data(self, data):
         """
-        Create a new study session with PDF storage
+        Validate submitted session fields
+
+        Args:
+            data: Form fields or a JSON object of one session
+
+        Returns:
+            Dict of StudySession column values (without the PDF columns)
+
+        Raises:
+            ValueError: If a field is missing or malformed
         """
-        student_id = data.get("student_id")
+        try:
+            student_id = int(data.get("student_id") or 0)
+        except (TypeError, ValueError):
+            student_id = 0
         if not student_id:
             raise ValueError("student_id is required")
-        
-        date = data.get("date", "").strip()
-        
-        # Save PDF (we don't need to store the path anymore)
-        pdf_path = self.save_pdf(files["pdf"], int(student_id), date)
 
-        if not pdf_path:
+        try:
+            session_date = datetime.strptime(str(data.get("date", "")).strip(), '%Y-%m-%d').date()
+            start_time = time.fromisoformat(str(data.get("start_time", "")).strip())
+            end_time = time.fromisoformat(str(data.get("end_time", "")).strip())
+        except ValueError:
+            raise ValueError("date must be YYYY-MM-DD and times HH:MM")
+        if end_time <= start_time:
+            raise ValueError("end_time must be after start_time")
+
+        return {
+            "student_id": student_id,
+            "date": session_date,
+            "start_time": start_time,
+            "end_time": end_time,
+            "session_topic": str(data.get("session_topic", "")).strip(),
+            "signature_present": str(data.get("signature_present", "false")).lower() == "true",
+        }
+
+    def create_study_session(self, data, files):
+        """
+        Create a new study session with PDF storage
+        """
+        # Validate before anything is stored
+        values = self.parse_session_data(data)
+
+        stored_pdf = self.save_pdf(files["pdf"], values["student_id"], values["date"].isoformat())
+
+        if not stored_pdf:
             raise Exception("Failed to save PDF")
 
+        pdf_key, pdf_size, pdf_checksum, storage_state = stored_pdf
         return StudySession(
-            student_id=int(student_id),
-            date=date,
-            start_time=data.get("start_time", "").strip(),
-            end_time=data.get("end_time", "").strip(),
-            session_topic=data.get("session_topic", "").strip(),
-            signature_present=data.get("signature_present", "false").lower() == "true"
+            **values,
+            pdf_key=pdf_key,
+            pdf_size=pdf_size,
+            pdf_checksum=pdf_checksum,
+            storage_state=storage_state,
         )
 
+    def create_study_sessions(self, items, files):
+        """
+        Create many study sessions, storing their PDFs concurrently
+
+        Every item is validated (fields, student, PDF) before anything is
+        written. The PDFs of the valid items are hashed and written to the
+        upload spool (or local storage) by a thread pool, identical PDFs only
+        once. The sessions are added to the database session; the caller
+        commits them in one transaction and then enqueues the pending uploads.
+
+        Args:
+            items: List of session dicts; "pdf" names the file field (default pdf_<index>)
+            files: Uploaded files by field name
+
+        Returns:
+            Tuple of (list of (index, StudySession), list of {"index", "error"})
+        """
+        errors = []
+        valid = []
+        for index, item in enumerate(items):
+            try:
+                if not isinstance(item, dict):
+                    raise ValueError("session must be an object")
+                values = self.parse_session_data(item)
+                pdf_file = files.get(item.get("pdf") or f"pdf_{index}")
+                if pdf_file is None:
+                    raise ValueError("PDF is missing")
+                valid.append((index, values, getattr(pdf_file, "stream", pdf_file)))
+            except ValueError as e:
+                errors.append({"index": index, "error": str(e)})
+
+        # One query for all referenced students
+        student_ids = {values["student_id"] for _, values, _ in valid}
+        known_students = set(database.session.scalars(
+            select(Student.id).where(Student.id.in_(student_ids))
+        )) if student_ids else set()
+        for index, values, _ in valid:
+            if values["student_id"] not in known_students:
+                errors.append({"index": index, "error": "Student not found"})
+        valid = [item for item in valid if item[1]["student_id"] in known_students]
+        if not valid:
+            return [], sorted(errors, key=lambda error: error["index"])
+
+        with ThreadPoolExecutor(max_workers=BATCH_PDF_WORKERS, thread_name_prefix="session-batch") as executor:
+            # Items may share a file field; hash each stream once so no two threads read it
+            streams = {id(pdf_stream): pdf_stream for _, _, pdf_stream in valid}
+            digest_by_stream = dict(zip(streams, executor.map(self.hash_pdf, streams.values())))
+            digests = [digest_by_stream[id(pdf_stream)] for _, _, pdf_stream in valid]
+
+            # PDFs referenced by a session keep its storage state; others are written once per hash
+            keys = {self.content_key(sha256) for sha256, _ in digests}
+            stored_states = dict(database.session.execute(
+                select(StudySession.pdf_key, func.max(StudySession.storage_state))
+                .where(StudySession.pdf_key.in_(keys))
+                .group_by(StudySession.pdf_key)
+            ).tuples().all())
+
+            streams_by_hash = {}
+            for (_, _, pdf_stream), (sha256, _) in zip(valid, digests):
+                if self.content_key(sha256) not in stored_states:
+                    streams_by_hash.setdefault(sha256, pdf_stream)
+            written = dict(zip(streams_by_hash, executor.map(
+                lambda entry: self._write_pdf(entry[1], self.content_key(entry[0])), streams_by_hash.items()
+            )))
+
+        created = []
+        for (index, values, _), (sha256, size) in zip(valid, digests):
+            file_key = self.content_key(sha256)
+            if file_key in stored_states:
+                storage_state = stored_states[file_key]
+            else:
+                storage_state = written[sha256]
+            if storage_state is None:
+                errors.append({"index": index, "error": "Failed to save PDF"})
+                continue
+
+            self._index_pdf(values["student_id"], values["date"].isoformat(), sha256, size)
+            study_session = StudySession(
+                **values,
+                pdf_key=file_key,
+                pdf_size=size,
+                pdf_checksum=sha256,
+                storage_state=storage_state,
+            )
+            database.session.add(study_session)
+            created.append((index, study_session))
+
+        return created, sorted(errors, key=lambda error: error["index"])
+
 # Global instance
 session_service = SessionService()
@@ -0,0 +1,315 @@
+import hashlib
+import os
+import time
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import bindparam, func
+from models.database import database
+from models.stored_form import StoredForm
+from models.study_session import StudySession
+from services.r2_storage import DELETE_BATCH_SIZE, r2_storage
+from services.session_service import session_service
+from services.upload_spool import PDF_KEY_PREFIX
+import logging
+
+logger = logging.getLogger(__name__)
+
+HASH_CHUNK_SIZE = 64 * 1024
+
+# Flush repairs to the database in batches of this size
+REPAIR_BATCH_SIZE = 500
+
+StoredObject = namedtuple("StoredObject", "key size modified_at")
+
+
+class AuditReport:
+    """Counters plus a bounded sample of affected keys per category"""
+
+    CATEGORIES = (
+        "ok", "orphaned", "missing", "size_mismatch", "checksum_mismatch",
+        "orphans_deleted", "rows_repointed", "metadata_backfilled",
+    )
+
+    def __init__(self, location, sample_size=20):
+        self.location = location
+        self.sample_size = sample_size
+        self.objects_scanned = 0
+        self.rows_scanned = 0
+        self.counts = {category: 0 for category in self.CATEGORIES}
+        self.samples = {category: [] for category in self.CATEGORIES}
+
+    def add(self, category, key):
+        self.counts[category] += 1
+        if category != "ok" and len(self.samples[category]) < self.sample_size:
+            self.samples[category].append(key)
+
+    def as_dict(self):
+        return {
+            "location": self.location,
+            "objects_scanned": self.objects_scanned,
+            "rows_scanned": self.rows_scanned,
+            "counts": self.counts,
+            "samples": {category: keys for category, keys in self.samples.items() if keys},
+        }
+
+
+class StorageAuditService:
+    """
+    Reconcile study_sessions rows with the objects in R2 and local storage
+
+    The object listing and the rows (grouped by pdf_key) are both streamed in
+    byte-wise key order and merged in a single pass, so memory stays bounded
+    regardless of bucket size. Checksums are verified by a bounded thread pool
+    that streams each object through SHA-256.
+    """
+
+    def __init__(self):
+        self.workers = int(os.getenv("AUDIT_WORKERS", "8"))
+        # Objects younger than this may belong to a request that has not committed yet
+        self.orphan_grace_seconds = int(os.getenv("AUDIT_ORPHAN_GRACE_SECONDS", "3600"))
+
+    def audit(self, location="r2", verify_checksums=False, repair=False):
+        """
+        Compare stored objects with database rows and optionally repair differences
+
+        Repairs delete orphaned objects older than the grace period together
+        with their stored_forms index entries, repoint rows whose PDF only
+        exists in the other location, and backfill missing sizes and checksums
+        (legacy uploads). Checksum mismatches are only reported.
+
+        Args:
+            location: "r2" or "local"
+            verify_checksums: Download and hash every matched object
+            repair: Apply repairs instead of only reporting
+
+        Returns:
+            AuditReport
+        """
+        report = AuditReport(location)
+        objects = self._counted(self._list_objects(location), report, "objects_scanned")
+        rows = self._counted(self._iter_rows(), report, "rows_scanned")
+
+        orphans = []
+        updates = []
+        in_flight = deque()
+        max_in_flight = self.workers * 2
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="storage-audit") as executor:
+            for key, stored_object, row in self._merge(objects, rows):
+                if row is None:
+                    self._handle_orphan(stored_object, report, repair, orphans)
+                elif stored_object is None:
+                    self._handle_missing(row, location, report, repair, updates)
+                elif self._expected_in(row.storage_state, location):
+                    size_ok = self._check_size(stored_object, row, report, repair, updates)
+                    if verify_checksums and size_ok:
+                        in_flight.append((row, executor.submit(self._hash, location, key)))
+                        while len(in_flight) >= max_in_flight:
+                            self._collect(in_flight.popleft(), report, repair, updates)
+                    elif size_ok:
+                        report.add("ok", key)
+
+                if len(orphans) >= DELETE_BATCH_SIZE:
+                    self._delete_orphans(location, orphans, report)
+                if len(updates) >= REPAIR_BATCH_SIZE:
+                    self._apply_updates(updates)
+
+            while in_flight:
+                self._collect(in_flight.popleft(), report, repair, updates)
+
+        self._delete_orphans(location, orphans, report)
+        self._apply_updates(updates)
+        return report
+
+    @staticmethod
+    def _counted(iterator, report, attribute):
+        for item in iterator:
+            setattr(report, attribute, getattr(report, attribute) + 1)
+            yield item
+
+    @staticmethod
+    def _expected_in(storage_state, location):
+        if location == "r2":
+            return storage_state == StudySession.STORAGE_STORED
+        return storage_state == StudySession.STORAGE_LOCAL
+
+    def _list_objects(self, location):
+        if location == "r2":
+            for obj in r2_storage.list_objects(PDF_KEY_PREFIX):
+                yield StoredObject(obj["Key"], obj["Size"], obj["LastModified"].timestamp())
+            return
+
+        # The local fallback directory is small enough to sort in memory
+        names = sorted(
+            entry.name for entry in os.scandir(session_service.pdf_dir)
+            if entry.is_file() and entry.name.endswith(".pdf")
+        )
+        for name in names:
+            try:
+                stat = os.stat(os.path.join(session_service.pdf_dir, name))
+            except FileNotFoundError:
+                continue
+            yield StoredObject(f"{PDF_KEY_PREFIX}{name}", stat.st_size, stat.st_mtime)
+
+    def _iter_rows(self):
+        """Stream one row per pdf_key in byte-wise order, matching the S3 listing order"""
+        dialect = database.session.get_bind().dialect.name
+        order_key = StudySession.pdf_key
+        if dialect == "postgresql":
+            order_key = StudySession.pdf_key.collate("C")
+        elif dialect == "sqlite":
+            order_key = StudySession.pdf_key.collate("BINARY")
+
+        query = (
+            database.session.query(
+                StudySession.pdf_key,
+                func.max(StudySession.storage_state).label("storage_state"),
+                func.max(StudySession.pdf_size).label("pdf_size"),
+                func.max(StudySession.pdf_checksum).label("pdf_checksum"),
+                func.count().label("row_count"),
+                func.count(StudySession.pdf_size).label("sized_count"),
+                func.count(StudySession.pdf_checksum).label("checksummed_count"),
+            )
+            .filter(StudySession.pdf_key.isnot(None))
+            .group_by(StudySession.pdf_key)
+            .order_by(order_key)
+            .yield_per(1000)
+        )
+        return iter(query)
+
+    @staticmethod
+    def _merge(objects, rows):
+        """Merge-join two key-ordered streams into (key, object, row) triples"""
+        stored_object = next(objects, None)
+        row = next(rows, None)
+        while stored_object is not None or row is not None:
+            if row is None or (stored_object is not None and stored_object.key < row.pdf_key):
+                yield stored_object.key, stored_object, None
+                stored_object = next(objects, None)
+            elif stored_object is None or row.pdf_key < stored_object.key:
+                yield row.pdf_key, None, row
+                row = next(rows, None)
+            else:
+                yield row.pdf_key, stored_object, row
+                stored_object = next(objects, None)
+                row = next(rows, None)
+
+    def _handle_orphan(self, stored_object, report, repair, orphans):
+        report.add("orphaned", stored_object.key)
+        if repair and time.time() - stored_object.modified_at > self.orphan_grace_seconds:
+            orphans.append(stored_object.key)
+
+    def _handle_missing(self, row, location, report, repair, updates):
+        if not self._expected_in(row.storage_state, location):
+            return
+        report.add("missing", row.pdf_key)
+        if not repair:
+            return
+
+        # Repoint rows whose PDF only exists in the other location
+        if location == "r2" and os.path.exists(session_service.local_pdf_path(row.pdf_key)):
+            updates.append({"b_key": row.pdf_key, "b_state": StudySession.STORAGE_LOCAL})
+            report.add("rows_repointed", row.pdf_key)
+        elif location == "local" and r2_storage.file_exists(row.pdf_key):
+            updates.append({"b_key": row.pdf_key, "b_state": StudySession.STORAGE_STORED})
+            report.add("rows_repointed", row.pdf_key)
+
+    def _check_size(self, stored_object, row, report, repair, updates):
+        if row.sized_count < row.row_count and repair:
+            updates.append({"b_key": row.pdf_key, "b_size": stored_object.size})
+            report.add("metadata_backfilled", row.pdf_key)
+        if row.pdf_size is not None and row.pdf_size != stored_object.size:
+            report.add("size_mismatch", row.pdf_key)
+            return False
+        return True
+
+    def _hash(self, location, key):
+        """Stream an object through SHA-256 (runs on the thread pool)"""
+        if location == "r2":
+            body = r2_storage.open_file(key)
+            if body is None:
+                return None
+        else:
+            body = open(session_service.local_pdf_path(key), "rb")
+
+        digest = hashlib.sha256()
+        with body:
+            for chunk in iter(lambda: body.read(HASH_CHUNK_SIZE), b""):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _collect(self, item, report, repair, updates):
+        row, future = item
+        try:
+            checksum = future.result()
+        except Exception as e:
+            logger.error(f"Failed to verify {row.pdf_key}: {e}")
+            checksum = None
+        if checksum is None:
+            report.add("missing", row.pdf_key)
+            return
+        if row.checksummed_count < row.row_count and repair:
+            updates.append({"b_key": row.pdf_key, "b_checksum": checksum})
+            report.add("metadata_backfilled", row.pdf_key)
+        if row.pdf_checksum is not None and row.pdf_checksum != checksum:
+            report.add("checksum_mismatch", row.pdf_key)
+        else:
+            report.add("ok", row.pdf_key)
+
+    def _delete_orphans(self, location, orphans, report):
+        if not orphans:
+            return
+        if location == "r2":
+            _, failed = r2_storage.delete_files(orphans)
+            failed = set(failed)
+        else:
+            failed = set()
+            for key in orphans:
+                try:
+                    os.remove(session_service.local_pdf_path(key))
+                except OSError as e:
+                    logger.error(f"Failed to delete orphaned local PDF {key}: {e}")
+                    failed.add(key)
+        deleted = [key for key in orphans if key not in failed]
+        for key in deleted:
+            report.add("orphans_deleted", key)
+        self._forget_contents(deleted)
+        orphans.clear()
+
+    @staticmethod
+    def _forget_contents(pdf_keys):
+        """Drop the stored_forms entries of deleted objects so identical re-uploads are stored again"""
+        checksums = [checksum for checksum in map(session_service.content_checksum, pdf_keys) if checksum]
+        if not checksums:
+            return
+        table = StoredForm.__table__
+        # Separate connection, like _apply_updates, so the streaming row cursor stays open
+        with database.engine.begin() as connection:
+            connection.execute(table.delete().where(table.c.sha256.in_(checksums)))
+
+    def _apply_updates(self, updates):
+        """Write repairs on a separate connection so the streaming row cursor stays open"""
+        if not updates:
+            return
+        table = StudySession.__table__
+        statements = {
+            "b_state": table.update().where(table.c.pdf_key == bindparam("b_key")).values(
+                storage_state=bindparam("b_state")
+            ),
+            "b_size": table.update().where(
+                table.c.pdf_key == bindparam("b_key"), table.c.pdf_size.is_(None)
+            ).values(pdf_size=bindparam("b_size")),
+            "b_checksum": table.update().where(
+                table.c.pdf_key == bindparam("b_key"), table.c.pdf_checksum.is_(None)
+            ).values(pdf_checksum=bindparam("b_checksum")),
+        }
+        with database.engine.begin() as connection:
+            for field, statement in statements.items():
+                params = [update for update in updates if field in update]
+                if params:
+                    connection.execute(statement, params)
+        updates.clear()
+
+
+# Global instance
+storage_audit_service = StorageAuditService()
@@ -0,0 +1,295 @@
+import os
+import threading
+import time
+from sqlalchemy import exists, select, update
+from models.database import database
+from models.study_session import StudySession
+from services.outbox import outbox
+from services.r2_storage import r2_storage
+from utils.file_utils import fsync_directory, write_stream_atomically
+import logging
+
+logger = logging.getLogger(__name__)
+
+PDF_KEY_PREFIX = "completed_forms/"
+
+UPLOAD_TOPIC = "storage.upload"
+
+
+class UploadSpool:
+    """
+    Durable write-behind spool for PDF uploads to R2
+
+    Requests write the PDF to a local spool directory (fsynced) and commit the
+    study session as pending together with a "storage.upload" outbox event
+    (queue_upload). The outbox dispatcher then moves the spooled file to R2,
+    retrying with backoff, and marks the sessions as stored. Uploads survive
+    restarts because the event is in the database, not in process memory.
+
+    While the R2 circuit breaker is open, files go to local storage right away,
+    as they do when the outbox gives up (dead letter). When the circuit closes
+    again, reconcile_local() moves locally stored PDFs back through the spool
+    to R2.
+    """
+
+    def __init__(self):
+        self.spool_dir = os.getenv("UPLOAD_SPOOL_DIR", "data/spool")
+        self.local_dir = "data/completed_forms"
+        os.makedirs(self.spool_dir, exist_ok=True)
+
+        self.reconcile_batch_size = int(os.getenv("UPLOAD_RECONCILE_BATCH", "500"))
+
+        self.app = None
+        self._lock = threading.Lock()
+        self._stats = {"uploaded": 0, "failed": 0, "last_upload_lag": None}
+
+    def init_app(self, app):
+        """Remember the app so background uploads can run inside an app context"""
+        self.app = app
+        app.extensions["upload_spool"] = self
+        r2_storage.circuit_breaker.on_close = self._on_r2_recovered
+        outbox.register(UPLOAD_TOPIC, self.upload, on_dead=self.keep_local)
+
+    def spool_path(self, pdf_key):
+        """Spool file path of a storage key"""
+        return os.path.join(self.spool_dir, pdf_key[len(PDF_KEY_PREFIX):])
+
+    def spool(self, pdf_stream, pdf_key):
+        """
+        Durably write an upload stream to the spool directory
+
+        Args:
+            pdf_stream: Readable binary stream, positioned at the start of the data
+            pdf_key: Storage key the file will be uploaded to
+
+        Returns:
+            Path of the spooled file
+        """
+        spool_path = self.spool_path(pdf_key)
+        if not os.path.exists(spool_path):
+            write_stream_atomically(pdf_stream, spool_path)
+            logger.info(f"PDF spooled for upload: {spool_path}")
+        return spool_path
+
+    def queue_upload(self, pdf_key):
+        """Add the upload of a spooled file to the current transaction's outbox"""
+        outbox.add(UPLOAD_TOPIC, {"pdf_key": pdf_key}, dedupe_key=f"{UPLOAD_TOPIC}:{pdf_key}")
+
+    def discard(self, pdf_keys):
+        """
+        Remove spooled files whose session was rolled back instead of committed
+
+        Without a committed outbox event nothing would ever upload or remove
+        them. Files that a pending session still refers to (the same form
+        committed by another request) are kept for that session's upload.
+        """
+        pdf_keys = set(pdf_keys)
+        if not pdf_keys:
+            return
+        try:
+            referenced = set(database.session.scalars(
+                select(StudySession.pdf_key).where(
+                    StudySession.pdf_key.in_(pdf_keys),
+                    StudySession.storage_state == StudySession.STORAGE_PENDING,
+                ).distinct()
+            ))
+        except Exception as e:
+            logger.error(f"Failed to check spooled PDFs, keeping them: {e}")
+            return
+        for pdf_key in pdf_keys - referenced:
+            try:
+                os.remove(self.spool_path(pdf_key))
+                logger.info(f"Discarded spooled PDF of a rolled back session: {pdf_key}")
+            except FileNotFoundError:
+                continue
+            except OSError as e:
+                logger.error(f"Failed to discard spooled PDF {pdf_key}: {e}")
+
+    def _spooled_files(self):
+        return [
+            entry.name for entry in os.scandir(self.spool_dir)
+            if entry.is_file() and entry.name.endswith(".pdf")
+        ]
+
+    def upload(self, payload):
+        """
+        Outbox handler: move one spooled file to R2
+
+        Idempotent: a file that is no longer spooled was already handled, and
+        only sessions committed as pending since then are updated (see
+        _settle). Raises when the upload fails so the outbox retries it.
+        """
+        pdf_key = payload["pdf_key"]
+        spool_path = self.spool_path(pdf_key)
+        try:
+            spooled_at = os.path.getmtime(spool_path)
+        except FileNotFoundError:
+            self._settle(pdf_key)
+            return
+
+        if not r2_storage.is_healthy():
+            # R2 is down: don't hold the file back, serve it locally until reconciled
+            self.keep_local(payload)
+            return
+
+        with open(spool_path, "rb") as pdf_stream:
+            file_url = r2_storage.upload_fileobj(
+                file_obj=pdf_stream,
+                file_name=pdf_key,
+                content_type="application/pdf"
+            )
+        if not file_url:
+            raise RuntimeError(f"Upload of {pdf_key} to R2 failed")
+
+        self._mark(pdf_key, StudySession.STORAGE_STORED)
+        try:
+            os.remove(spool_path)
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            self._stats["uploaded"] += 1
+            self._stats["last_upload_lag"] = round(time.time() - spooled_at, 3)
+        logger.info(f"Spooled PDF uploaded to R2: {pdf_key}")
+
+    def _settle(self, pdf_key):
+        """
+        Point pending sessions of an already handled file at where it ended up
+
+        An identical form committed while the file was being uploaded is still
+        pending after the upload marked the other sessions, so the row state is
+        checked again instead of assuming there is nothing left to do.
+        """
+        pending = database.session.scalar(select(exists().where(
+            StudySession.pdf_key == pdf_key, StudySession.storage_state == StudySession.STORAGE_PENDING
+        )))
+        if not pending:
+            logger.info(f"Spooled PDF already handled: {pdf_key}")
+            return
+        if r2_storage.file_exists(pdf_key):
+            self._mark(pdf_key, StudySession.STORAGE_STORED)
+        elif os.path.exists(os.path.join(self.local_dir, os.path.basename(self.spool_path(pdf_key)))):
+            self._mark(pdf_key, StudySession.STORAGE_LOCAL)
+        else:
+            # Possibly R2 being unreachable; let the outbox retry
+            raise RuntimeError(f"Spooled PDF {pdf_key} was handled but is not stored anywhere")
+        logger.info(f"Settled pending sessions of an already handled PDF: {pdf_key}")
+
+    def keep_local(self, payload):
+        """Keep a spooled file available from local storage (R2 down or the upload dead-lettered)"""
+        pdf_key = payload["pdf_key"]
+        spool_path = self.spool_path(pdf_key)
+        local_path = os.path.join(self.local_dir, os.path.basename(spool_path))
+        try:
+            os.replace(spool_path, local_path)
+        except FileNotFoundError:
+            return
+        fsync_directory(self.local_dir)
+        self._mark(pdf_key, StudySession.STORAGE_LOCAL)
+        with self._lock:
+            self._stats["failed"] += 1
+        logger.error(f"Upload of {pdf_key} to R2 not possible, kept in local storage")
+
+    def _on_r2_recovered(self):
+        """Circuit breaker callback: upload what was stored locally during the outage"""
+        threading.Thread(target=self._reconcile_in_background, name="upload-reconcile", daemon=True).start()
+
+    def _reconcile_in_background(self):
+        try:
+            self.reconcile_local()
+        except Exception as e:
+            logger.error(f"Reconciliation of local PDFs failed: {e}")
+
+    def reconcile_local(self):
+        """
+        Move PDFs kept in local storage back through the spool to R2
+
+        Works through all locally stored PDFs in batches of
+        UPLOAD_RECONCILE_BATCH keys, stopping early if R2 fails again.
+
+        Returns:
+            Number of PDFs queued for upload
+        """
+        queued = 0
+        last_key = None
+        while r2_storage.is_healthy():
+            with self.app.app_context():
+                query = (
+                    database.session.query(StudySession.pdf_key)
+                    .filter(StudySession.storage_state == StudySession.STORAGE_LOCAL, StudySession.pdf_key.isnot(None))
+                )
+                if last_key is not None:
+                    # Keyset pagination: keys whose file is missing stay local and are not selected again
+                    query = query.filter(StudySession.pdf_key > last_key)
+                pdf_keys = [
+                    row.pdf_key for row in query.distinct().order_by(StudySession.pdf_key).limit(self.reconcile_batch_size)
+                ]
+            if not pdf_keys:
+                break
+            last_key = pdf_keys[-1]
+
+            batch_queued = 0
+            for pdf_key in pdf_keys:
+                local_path = os.path.join(self.local_dir, os.path.basename(self.spool_path(pdf_key)))
+                try:
+                    os.replace(local_path, self.spool_path(pdf_key))
+                except FileNotFoundError:
+                    logger.warning(f"Local PDF missing, cannot reconcile: {local_path}")
+                    continue
+                # The state change and its upload event commit together
+                self._mark(pdf_key, StudySession.STORAGE_PENDING, queue_upload=True)
+                batch_queued += 1
+
+            if batch_queued:
+                # Start uploading while the next batch is queued
+                outbox.notify()
+                queued += batch_queued
+            if len(pdf_keys) < self.reconcile_batch_size:
+                break
+
+        if queued:
+            logger.info(f"Queued {queued} locally stored PDFs for upload to R2")
+        return queued
+
+    def _mark(self, pdf_key, storage_state, queue_upload=False):
+        # Moving forward only: local -> pending -> stored, pending -> local
+        from_states = {
+            StudySession.STORAGE_STORED: (StudySession.STORAGE_PENDING, StudySession.STORAGE_LOCAL),
+            StudySession.STORAGE_PENDING: (StudySession.STORAGE_LOCAL,),
+            StudySession.STORAGE_LOCAL: (StudySession.STORAGE_PENDING,),
+        }[storage_state]
+        with self.app.app_context():
+            try:
+                database.session.execute(
+                    update(StudySession)
+                    .where(StudySession.pdf_key == pdf_key, StudySession.storage_state.in_(from_states))
+                    .values(storage_state=storage_state)
+                )
+                if queue_upload:
+                    self.queue_upload(pdf_key)
+                database.session.commit()
+            except Exception:
+                database.session.rollback()
+                raise
+
+    def status(self):
+        """Spool depth and upload lag for the status endpoint"""
+        now = time.time()
+        mtimes = []
+        for name in self._spooled_files():
+            try:
+                mtimes.append(os.path.getmtime(os.path.join(self.spool_dir, name)))
+            except FileNotFoundError:
+                continue
+
+        with self._lock:
+            return {
+                "spool_depth": len(mtimes),
+                "oldest_pending_seconds": round(now - min(mtimes), 3) if mtimes else 0,
+                "uploaded": self._stats["uploaded"],
+                "failed": self._stats["failed"],
+                "last_upload_lag_seconds": self._stats["last_upload_lag"],
+            }
+
+
+# Global instance
+upload_spool = UploadSpool()
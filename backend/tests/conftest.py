@@ -0,0 +1,126 @@
+"""
+Shared fixtures: the app on a throwaway SQLite database, a local S3 stand-in
+(moto) as R2 and the FastBill stub
+
+Services read their configuration when they are imported, so the environment
+and working directory are set up before the app is imported.
+"""
+import os
+import socket
+import sys
+import tempfile
+import threading
+import time
+import boto3
+import pytest
+from moto.server import ThreadedMotoServer
+from werkzeug.serving import make_server
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+R2_BUCKET = "test-forms"
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+S3_PORT = _free_port()
+WORKDIR = tempfile.mkdtemp(prefix="backend-tests-")
+
+# Before any test module imports a service
+os.chdir(WORKDIR)
+os.environ.pop("CACHE_REDIS_URL", None)
+os.environ.update(
+    DATABASE_URL=f"sqlite:///{WORKDIR}/test.db",
+    SECRET_KEY="test",
+    FORCE_HTTPS="false",
+    USE_SECURE_COOKIES="false",
+    R2_ENDPOINT_URL=f"http://127.0.0.1:{S3_PORT}",
+    R2_ACCESS_KEY_ID="test",
+    R2_SECRET_ACCESS_KEY="test",
+    R2_BUCKET_NAME=R2_BUCKET,
+)
+
+
+@pytest.fixture(scope="session")
+def s3_server():
+    server = ThreadedMotoServer(ip_address="127.0.0.1", port=S3_PORT, verbose=False)
+    server.start()
+    # start() returns before the server accepts connections
+    deadline = time.monotonic() + 10
+    while True:
+        try:
+            socket.create_connection(("127.0.0.1", S3_PORT), timeout=1).close()
+            break
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+    boto3.client(
+        "s3", endpoint_url=os.environ["R2_ENDPOINT_URL"], region_name="us-east-1",
+        aws_access_key_id="test", aws_secret_access_key="test",
+    ).create_bucket(Bucket=R2_BUCKET)
+    yield server
+    server.stop()
+
+
+@pytest.fixture(scope="session")
+def app(s3_server):
+    from app import app as flask_app
+    from flask_migrate import upgrade
+
+    flask_app.config["TESTING"] = True
+    with flask_app.app_context():
+        upgrade(directory=os.path.join(BACKEND_DIR, "migrations"))
+    return flask_app
+
+
+@pytest.fixture
+def db(app):
+    """App context with an empty database; all rows are deleted afterwards"""
+    from models.database import database
+
+    with app.app_context():
+        yield database
+        database.session.rollback()
+        for table in reversed(database.metadata.sorted_tables):
+            database.session.execute(table.delete())
+        database.session.commit()
+
+
+@pytest.fixture
+def bucket(app):
+    """The R2 bucket, emptied after the test"""
+    from services.r2_storage import r2_storage
+
+    yield r2_storage.s3_client
+    for obj in r2_storage.s3_client.list_objects_v2(Bucket=R2_BUCKET).get("Contents", []):
+        r2_storage.s3_client.delete_object(Bucket=R2_BUCKET, Key=obj["Key"])
+
+
+@pytest.fixture
+def fastbill_stub(monkeypatch):
+    """A FastbillStub served over HTTP, with FastbillService pointed at it"""
+    import services.fastbill_client as fastbill_client
+    from fastbill_stub import FastbillStub
+    from utils.metrics import CallMetrics
+    from utils.rate_limit import TokenBucket
+
+    stub = FastbillStub()
+    server = make_server("127.0.0.1", 0, stub.create_app(), threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    monkeypatch.setenv("FASTBILL_EMAIL", "test@example.com")
+    monkeypatch.setenv("FASTBILL_API_KEY", "test")
+    monkeypatch.setenv("FASTBILL_API_URL", f"http://127.0.0.1:{server.server_port}/api/1.0/api.php")
+    monkeypatch.delenv("FASTBILL_CHANGED_SINCE_FILTER", raising=False)
+    # Fresh limiter, counters and cache per test; the limit only paces, it is covered separately
+    monkeypatch.setattr(fastbill_client, "fastbill_rate_limiter", TokenBucket(1000, 1000))
+    monkeypatch.setattr(fastbill_client, "fastbill_metrics", CallMetrics())
+    fastbill_client.fastbill_response_cache.clear()
+    yield stub
+    server.shutdown()
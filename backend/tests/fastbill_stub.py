@@ -0,0 +1,107 @@
+"""
+Minimal stand-in for the FastBill API, for the tests and for exercising the sync and invoicing locally
+
+Serves customer.get with LIMIT/OFFSET paging, LIMIT_FIELDS and a
+CHANGED_SINCE filter on LASTUPDATE, and records invoice.create calls. fail_next
+simulates throttling and outages. The tests serve it through the fastbill_stub
+fixture; to run it by hand, start `python tests/fastbill_stub.py [CUSTOMERS]
+[PORT]` and point FASTBILL_API_URL at
+http://127.0.0.1:PORT/api/1.0/api.php (plus
+FASTBILL_CHANGED_SINCE_FILTER=CHANGED_SINCE to try incremental syncs).
+"""
+import sys
+import threading
+from datetime import datetime, timedelta
+from flask import Flask, jsonify, request
+
+LASTUPDATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+MAX_LIMIT = 100
+
+
+class FastbillStub:
+    """In-memory customer list behind a customer.get endpoint"""
+
+    def __init__(self, customers=0):
+        self._lock = threading.Lock()
+        self._clock = datetime(2024, 1, 1)
+        self.customers = {}
+        self.invoices = {}
+        self.requests = 0
+        # HTTP status codes to answer the next requests with (e.g. 429, 503)
+        self.fail_next = []
+        for _ in range(customers):
+            self.add_customer()
+
+    def _tick(self):
+        self._clock += timedelta(seconds=1)
+        return self._clock.strftime(LASTUPDATE_FORMAT)
+
+    def add_customer(self, first_name=None, last_name=None):
+        with self._lock:
+            customer_id = str(len(self.customers) + 1)
+            self.customers[customer_id] = {
+                "CUSTOMER_ID": customer_id,
+                "FIRST_NAME": first_name or f"First{customer_id}",
+                "LAST_NAME": last_name or f"Last{customer_id}",
+                "EMAIL": f"customer{customer_id}@example.com",
+                "LASTUPDATE": self._tick(),
+            }
+            return customer_id
+
+    def rename_customer(self, customer_id, first_name, last_name):
+        with self._lock:
+            self.customers[customer_id].update(FIRST_NAME=first_name, LAST_NAME=last_name, LASTUPDATE=self._tick())
+
+    def customer_get(self, payload):
+        filters = payload.get("FILTER") or {}
+        limit = min(int(payload.get("LIMIT", MAX_LIMIT)), MAX_LIMIT)
+        offset = int(payload.get("OFFSET", 0))
+        fields = payload.get("LIMIT_FIELDS")
+        with self._lock:
+            self.requests += 1
+            customers = list(self.customers.values())
+        if filters.get("CUSTOMER_ID"):
+            customers = [c for c in customers if c["CUSTOMER_ID"] == str(filters["CUSTOMER_ID"])]
+        if filters.get("CHANGED_SINCE"):
+            customers = [c for c in customers if c["LASTUPDATE"] > filters["CHANGED_SINCE"]]
+        page = customers[offset:offset + limit]
+        if fields:
+            page = [{field: c[field] for field in fields if field in c} for c in page]
+        return {"CUSTOMERS": page}
+
+    def invoice_create(self, data):
+        if str(data.get("CUSTOMER_ID")) not in self.customers:
+            return {"ERRORS": ["Customer not found"]}
+        if not data.get("ITEMS"):
+            return {"ERRORS": ["No items"]}
+        with self._lock:
+            self.requests += 1
+            invoice_id = str(len(self.invoices) + 1)
+            self.invoices[invoice_id] = data
+        return {"STATUS": "success", "INVOICE_ID": invoice_id}
+
+    def create_app(self):
+        app = Flask(__name__)
+
+        @app.post("/api/1.0/api.php")
+        def api():
+            payload = request.get_json(silent=True) or {}
+            with self._lock:
+                status = self.fail_next.pop(0) if self.fail_next else None
+            if status is not None:
+                return jsonify({"error": "simulated failure"}), status, {"Retry-After": "0"}
+            if payload.get("SERVICE") == "customer.get":
+                return jsonify({"REQUEST": payload, "RESPONSE": self.customer_get(payload)})
+            if payload.get("SERVICE") == "invoice.create":
+                return jsonify({"REQUEST": payload, "RESPONSE": self.invoice_create(payload.get("DATA") or {})})
+            return jsonify({"REQUEST": payload, "RESPONSE": {"ERRORS": ["Unknown SERVICE"]}})
+
+        return app
+
+
+if __name__ == "__main__":
+    from werkzeug.serving import run_simple
+
+    customers = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else 8085
+    run_simple("127.0.0.1", port, FastbillStub(customers).create_app(), threaded=True)
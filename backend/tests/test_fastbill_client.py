@@ -0,0 +1,124 @@
+import os
+import socket
+import pytest
+import requests
+import services.fastbill_client as fastbill_client
+from services.fastbill_client import FastbillClient, FastbillError, fastbill_status
+from utils.rate_limit import RateLimitTimeout, TokenBucket
+
+CUSTOMER_GET = {"SERVICE": "customer.get", "LIMIT": 10, "OFFSET": 0}
+INVOICE_CREATE = {"SERVICE": "invoice.create", "DATA": {"CUSTOMER_ID": "1", "ITEMS": [{"QUANTITY": "1"}]}}
+
+
+@pytest.fixture
+def client(fastbill_stub, monkeypatch):
+    monkeypatch.setattr(fastbill_client, "BACKOFF_BASE", 0.001)
+    fastbill_stub.add_customer()
+    return FastbillClient("test@example.com", "test", os.environ["FASTBILL_API_URL"])
+
+
+def _stats(service):
+    return fastbill_client.fastbill_metrics.snapshot()[service]
+
+
+@pytest.mark.parametrize("status", [429, 500, 503])
+def test_reads_are_retried(client, fastbill_stub, status):
+    fastbill_stub.fail_next = [status, status]
+
+    result = client.call(CUSTOMER_GET)
+
+    assert len(result["CUSTOMERS"]) == 1
+    assert _stats("customer.get")["retries"] == 2
+
+
+def test_reads_give_up_after_max_attempts(client, fastbill_stub):
+    fastbill_stub.fail_next = [503] * fastbill_client.MAX_ATTEMPTS
+
+    with pytest.raises(requests.exceptions.HTTPError):
+        client.call(CUSTOMER_GET)
+    assert _stats("customer.get")["retries"] == fastbill_client.MAX_ATTEMPTS - 1
+
+
+def test_throttled_writes_are_retried(client, fastbill_stub):
+    fastbill_stub.fail_next = [429]
+
+    result = client.call(INVOICE_CREATE)
+
+    assert result["INVOICE_ID"] == "1"
+    assert _stats("invoice.create")["throttled"] == 1
+    assert len(fastbill_stub.invoices) == 1
+
+
+def test_writes_are_not_retried_after_server_errors(client, fastbill_stub):
+    # FastBill may have created the invoice before failing
+    fastbill_stub.fail_next = [503]
+
+    with pytest.raises(requests.exceptions.HTTPError):
+        client.call(INVOICE_CREATE)
+    assert _stats("invoice.create")["retries"] == 0
+    assert fastbill_stub.fail_next == []
+
+
+def test_writes_are_retried_when_never_sent(monkeypatch):
+    monkeypatch.setattr(fastbill_client, "BACKOFF_BASE", 0.001)
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    # Nothing listens on the port: the connection is refused
+    client = FastbillClient("test@example.com", "test", f"http://127.0.0.1:{port}/api/1.0/api.php")
+
+    with pytest.raises(requests.exceptions.ConnectionError) as error:
+        client.call(INVOICE_CREATE)
+    assert fastbill_client.never_sent(error.value)
+    assert _stats("invoice.create")["retries"] == fastbill_client.MAX_ATTEMPTS - 1
+
+
+def test_api_errors_raise_fastbill_error(client):
+    with pytest.raises(FastbillError, match="Customer not found"):
+        client.call({"SERVICE": "invoice.create", "DATA": {"CUSTOMER_ID": "404", "ITEMS": [{}]}})
+    assert _stats("invoice.create")["api_errors"] == 1
+
+
+def test_reads_are_cached(client, fastbill_stub):
+    first = client.call(CUSTOMER_GET)
+    fastbill_stub.rename_customer("1", "Re", "Named")
+
+    assert client.call(CUSTOMER_GET) == first
+    assert fastbill_stub.requests == 1
+    assert _stats("customer.get")["cache_hits"] == 1
+
+    fresh = client.call(CUSTOMER_GET, use_cache=False)
+    assert fresh["CUSTOMERS"][0]["FIRST_NAME"] == "Re"
+
+
+def test_writes_are_never_cached(client, fastbill_stub):
+    client.call(INVOICE_CREATE)
+    client.call(INVOICE_CREATE)
+
+    assert len(fastbill_stub.invoices) == 2
+
+
+def test_status_reports_counters(client, fastbill_stub):
+    fastbill_stub.fail_next = [429]
+    client.call(CUSTOMER_GET)
+
+    status = fastbill_status()
+
+    assert status["services"]["customer.get"]["throttled"] == 1
+    assert status["services"]["customer.get"]["calls"] == 2
+    assert "available" in status["rate_limiter"]
+
+
+def test_token_bucket_allows_bursts_then_paces():
+    bucket = TokenBucket(rate=1000, capacity=3)
+
+    assert [bucket.try_acquire() for _ in range(4)] == [True, True, True, False]
+    assert bucket.acquire() > 0
+
+
+def test_token_bucket_timeout():
+    bucket = TokenBucket(rate=0.1, capacity=1)
+    bucket.acquire()
+
+    with pytest.raises(RateLimitTimeout):
+        bucket.acquire(timeout=0.01)
@@ -0,0 +1,83 @@
+import pytest
+from sqlalchemy import event
+from models.customer import Customer
+from services.database_service import DatabaseService
+from services.fastbill_service import FastbillService
+
+
+def _incoming(*customers):
+    return [
+        {"fastbill_customer_id": customer_id, "first_name": first_name, "last_name": last_name}
+        for customer_id, first_name, last_name in customers
+    ]
+
+
+@pytest.fixture
+def statements(db):
+    """SQL statements executed while the test runs"""
+    executed = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    event.listen(db.engine, "before_cursor_execute", record)
+    yield executed
+    event.remove(db.engine, "before_cursor_execute", record)
+
+
+def test_merge_classifies_new_changed_and_unchanged_customers(db):
+    db.session.add_all([
+        Customer(first_name="Same", last_name="Name", fastbill_customer_id="1"),
+        Customer(first_name="Old", last_name="Name", fastbill_customer_id="2"),
+        Customer(first_name="Local", last_name="Only", email="local@example.com"),
+    ])
+    db.session.commit()
+
+    counts = DatabaseService().merge_fastbill_customers(_incoming(
+        ("1", "Same", "Name"), ("2", "New", "Name"), ("3", "Brand", "New"),
+    ))
+    db.session.commit()
+
+    assert counts == {"inserted": 1, "updated": 1, "unchanged": 1}
+    customers = {c.fastbill_customer_id: (c.first_name, c.last_name) for c in Customer.query.all()}
+    assert customers == {"1": ("Same", "Name"), "2": ("New", "Name"), "3": ("Brand", "New"), None: ("Local", "Only")}
+
+
+def test_merge_keeps_local_fields_of_updated_customers(db):
+    db.session.add(Customer(first_name="Old", last_name="Name", email="kept@example.com", fastbill_customer_id="9"))
+    db.session.commit()
+
+    DatabaseService().merge_fastbill_customers(_incoming(("9", "New", "Name")))
+    db.session.commit()
+
+    customer = Customer.query.filter_by(fastbill_customer_id="9").one()
+    assert (customer.first_name, customer.email) == ("New", "kept@example.com")
+
+
+def test_merge_of_nothing_runs_no_statements(db, statements):
+    assert DatabaseService().merge_fastbill_customers([]) == {"inserted": 0, "updated": 0, "unchanged": 0}
+    assert statements == []
+
+
+def test_merge_of_unchanged_customers_only_reads(db, statements):
+    db.session.add_all([Customer(first_name="F", last_name=str(i), fastbill_customer_id=str(i)) for i in range(50)])
+    db.session.commit()
+    statements.clear()
+
+    counts = DatabaseService().merge_fastbill_customers(_incoming(*((str(i), "F", str(i)) for i in range(50))))
+
+    assert counts["unchanged"] == 50
+    assert len(statements) == 1
+    assert statements[0].lstrip().upper().startswith("SELECT")
+
+
+def test_sync_uses_a_constant_number_of_statements(db, fastbill_stub, statements):
+    for _ in range(1234):
+        fastbill_stub.add_customer()
+
+    report = FastbillService().sync_fastbill_customers()
+
+    assert report["inserted"] == 1234
+    assert Customer.query.count() == 1234
+    # Cursor read, existing-row read, batched upsert and cursor write, not one per customer
+    assert len(statements) < 20
@@ -0,0 +1,109 @@
+import pytest
+import services.fastbill_client as fastbill_client
+from models.customer import Customer
+from models.sync_cursor import SyncCursor
+from services.fastbill_service import CUSTOMER_CURSOR, PAGE_SIZE, FastbillService
+
+
+@pytest.fixture
+def incremental(monkeypatch):
+    monkeypatch.setenv("FASTBILL_CHANGED_SINCE_FILTER", "CHANGED_SINCE")
+
+
+def _local_customers():
+    return {c.fastbill_customer_id: (c.first_name, c.last_name) for c in Customer.query.all()}
+
+
+@pytest.mark.parametrize("count", [0, 99, PAGE_SIZE, 2 * PAGE_SIZE + 50])
+def test_full_sync_walks_every_page(db, fastbill_stub, count):
+    for _ in range(count):
+        fastbill_stub.add_customer()
+
+    report = FastbillService().sync_fastbill_customers()
+
+    assert report["fetched"] == count
+    assert report["inserted"] == count
+    assert len(_local_customers()) == count
+
+
+def test_pages_are_yielded_in_offset_order(db, fastbill_stub, monkeypatch):
+    monkeypatch.setenv("FASTBILL_SYNC_CONCURRENCY", "4")
+    for _ in range(5 * PAGE_SIZE + 7):
+        fastbill_stub.add_customer()
+
+    customers = FastbillService().get_customers()
+
+    assert [int(c["id"]) for c in customers] == list(range(1, 5 * PAGE_SIZE + 8))
+
+
+def test_cursor_stores_the_newest_lastupdate(db, fastbill_stub):
+    for _ in range(150):
+        fastbill_stub.add_customer()
+    newest = max(c["LASTUPDATE"] for c in fastbill_stub.customers.values())
+
+    report = FastbillService().sync_fastbill_customers()
+
+    assert report["cursor"] == newest
+    assert db.session.get(SyncCursor, CUSTOMER_CURSOR).value == newest
+
+
+def test_incremental_sync_only_pulls_changed_customers(db, fastbill_stub, incremental, monkeypatch):
+    # One request at a time, so the request count shows how many pages were walked
+    monkeypatch.setenv("FASTBILL_SYNC_CONCURRENCY", "1")
+    for _ in range(250):
+        fastbill_stub.add_customer()
+    service = FastbillService()
+    service.sync_fastbill_customers()
+
+    fastbill_stub.rename_customer("7", "New", "Name")
+    fastbill_stub.add_customer("Late", "Comer")
+    fastbill_stub.requests = 0
+    report = service.sync_fastbill_customers()
+
+    assert (report["fetched"], report["inserted"], report["updated"]) == (2, 1, 1)
+    assert fastbill_stub.requests == 1
+    local = _local_customers()
+    assert len(local) == 251
+    assert local["7"] == ("New", "Name")
+
+    report = service.sync_fastbill_customers()
+    assert report["fetched"] == 0
+    assert report["cursor"] == db.session.get(SyncCursor, CUSTOMER_CURSOR).value
+
+
+def test_full_sync_ignores_the_cursor(db, fastbill_stub, incremental):
+    for _ in range(120):
+        fastbill_stub.add_customer()
+    service = FastbillService()
+    service.sync_fastbill_customers()
+
+    report = service.sync_fastbill_customers(full=True)
+
+    assert (report["fetched"], report["unchanged"]) == (120, 120)
+
+
+def test_failure_mid_walk_changes_nothing(db, fastbill_stub, incremental, monkeypatch):
+    monkeypatch.setenv("FASTBILL_SYNC_CONCURRENCY", "1")
+    monkeypatch.setattr(fastbill_client, "MAX_ATTEMPTS", 1)
+    for _ in range(3 * PAGE_SIZE):
+        fastbill_stub.add_customer()
+    service = FastbillService()
+    # First page answered, second one fails
+    fastbill_stub.fail_next = [None, 503]
+
+    assert service.sync_fastbill_customers() is None
+    assert Customer.query.count() == 0
+    assert db.session.get(SyncCursor, CUSTOMER_CURSOR) is None
+
+    report = service.sync_fastbill_customers()
+    assert report["inserted"] == 3 * PAGE_SIZE
+
+
+def test_sync_command(app, db, fastbill_stub):
+    for _ in range(3):
+        fastbill_stub.add_customer()
+
+    result = app.test_cli_runner().invoke(args=["fastbill", "sync"])
+
+    assert result.exit_code == 0, result.output
+    assert '"inserted": 3' in result.output
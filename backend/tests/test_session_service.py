@@ -0,0 +1,75 @@
+import hashlib
+import io
+import os
+from datetime import date, time
+import pytest
+from models.customer import Customer
+from models.stored_form import StoredForm
+from models.student import Student
+from models.study_session import StudySession
+from services.session_service import session_service
+from services.upload_spool import upload_spool
+
+
+@pytest.fixture
+def student(db):
+    customer = Customer(first_name="Cu", last_name="Stomer")
+    db.session.add(customer)
+    db.session.flush()
+    student = Student(first_name="Stu", last_name="Dent", customer_id=customer.id)
+    db.session.add(student)
+    db.session.commit()
+    return student
+
+
+@pytest.fixture
+def spooled():
+    """Keys written to the upload spool, removed after the test"""
+    keys = []
+    yield keys
+    for key in keys:
+        if os.path.exists(upload_spool.spool_path(key)):
+            os.remove(upload_spool.spool_path(key))
+
+
+def test_index_pdf_reuses_entry_of_resubmitted_form(db, student):
+    first = session_service._index_pdf(student.id, "2026-09-01", "a" * 64, 10)
+    again = session_service._index_pdf(student.id, "2026-09-01", "a" * 64, 10)
+    other = session_service._index_pdf(student.id, "2026-09-01", "b" * 64, 12)
+    db.session.commit()
+
+    assert first == again
+    assert [(form.sha256[0], form.sequence) for form in StoredForm.query.order_by(StoredForm.sequence)] == [
+        ("a", 0), ("b", 1),
+    ]
+    assert other != first
+
+
+def test_save_pdf_writes_content_no_session_references(db, student, spooled):
+    body = b"%PDF rolled back"
+    sha256 = hashlib.sha256(body).hexdigest()
+    # Index entry left by a submit whose upload never completed
+    db.session.add(StoredForm(student_id=student.id, date="2026-08-01", sha256=sha256, size=len(body)))
+    db.session.commit()
+
+    key, size, checksum, state = session_service.save_pdf(io.BytesIO(body), student.id, "2026-09-01")
+    spooled.append(key)
+
+    assert (checksum, size, state) == (sha256, len(body), StudySession.STORAGE_PENDING)
+    assert os.path.exists(upload_spool.spool_path(key))
+
+
+def test_save_pdf_reuses_state_of_referencing_session(db, student, spooled):
+    body = b"%PDF local"
+    key = session_service.content_key(hashlib.sha256(body).hexdigest())
+    db.session.add(StudySession(
+        student_id=student.id, date=date(2026, 9, 1), start_time=time(10), end_time=time(11),
+        session_topic="Math", pdf_key=key, pdf_size=len(body), storage_state=StudySession.STORAGE_LOCAL,
+    ))
+    db.session.commit()
+
+    _, _, _, state = session_service.save_pdf(io.BytesIO(body), student.id, "2026-09-02")
+    spooled.append(key)
+
+    assert state == StudySession.STORAGE_LOCAL
+    assert not os.path.exists(upload_spool.spool_path(key))
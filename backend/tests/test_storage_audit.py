@@ -0,0 +1,135 @@
+import hashlib
+import os
+from datetime import date, time
+import pytest
+from models.customer import Customer
+from models.stored_form import StoredForm
+from models.student import Student
+from models.study_session import StudySession
+from services.r2_storage import r2_storage
+from services.session_service import session_service
+from services.storage_audit import storage_audit_service
+
+
+def _key(body):
+    return session_service.content_key(hashlib.sha256(body).hexdigest())
+
+
+@pytest.fixture
+def student(db):
+    customer = Customer(first_name="Cu", last_name="Stomer")
+    db.session.add(customer)
+    db.session.flush()
+    student = Student(first_name="Stu", last_name="Dent", customer_id=customer.id)
+    db.session.add(student)
+    db.session.commit()
+    return student
+
+
+def _store(db, bucket, student, body, checksum=None, upload=True, state=StudySession.STORAGE_STORED):
+    """A session row (and stored_forms entry) for body, optionally with its object in R2"""
+    key = _key(body)
+    sha256 = hashlib.sha256(body).hexdigest()
+    if upload:
+        bucket.put_object(Bucket=r2_storage.bucket_name, Key=key, Body=body)
+    db.session.add(StoredForm(student_id=student.id, date="2026-09-01", sequence=len(StoredForm.query.all()),
+                              sha256=sha256, size=len(body)))
+    db.session.add(StudySession(
+        student_id=student.id, date=date(2026, 9, 1), start_time=time(10), end_time=time(11),
+        session_topic="Math", pdf_key=key, pdf_size=len(body), pdf_checksum=checksum or sha256,
+        storage_state=state,
+    ))
+    db.session.commit()
+    return key
+
+
+@pytest.fixture
+def stored(db, bucket, student, monkeypatch):
+    """One object of each kind: intact, missing, corrupted and orphaned"""
+    keys = {
+        "ok": _store(db, bucket, student, b"%PDF intact"),
+        "missing": _store(db, bucket, student, b"%PDF missing", upload=False),
+        # Same size as the recorded content, different bytes
+        "corrupt": _store(db, bucket, student, b"%PDF corrupt", checksum=hashlib.sha256(b"%PDF CORRUPT").hexdigest()),
+    }
+    orphan = b"%PDF orphan"
+    keys["orphan"] = _key(orphan)
+    bucket.put_object(Bucket=r2_storage.bucket_name, Key=keys["orphan"], Body=orphan)
+    # Index entry left behind by a deleted session
+    db.session.add(StoredForm(student_id=student.id, date="2026-08-01", sha256=hashlib.sha256(orphan).hexdigest(),
+                              size=len(orphan)))
+    db.session.commit()
+    monkeypatch.setattr(storage_audit_service, "orphan_grace_seconds", 0)
+    return keys
+
+
+def test_audit_reports_orphaned_missing_and_corrupt_objects(stored):
+    report = storage_audit_service.audit("r2", verify_checksums=True).as_dict()
+
+    assert report["objects_scanned"] == 3
+    assert report["rows_scanned"] == 3
+    assert report["counts"]["ok"] == 1
+    assert report["samples"]["orphaned"] == [stored["orphan"]]
+    assert report["samples"]["missing"] == [stored["missing"]]
+    assert report["samples"]["checksum_mismatch"] == [stored["corrupt"]]
+    assert report["counts"]["orphans_deleted"] == 0
+
+
+def test_audit_without_repair_changes_nothing(db, bucket, stored):
+    storage_audit_service.audit("r2", verify_checksums=True)
+
+    keys = {obj["Key"] for obj in bucket.list_objects_v2(Bucket=r2_storage.bucket_name)["Contents"]}
+    assert stored["orphan"] in keys
+    assert StoredForm.query.count() == 4
+
+
+def test_repair_deletes_orphans_with_their_index_entries(db, bucket, stored):
+    report = storage_audit_service.audit("r2", repair=True).as_dict()
+
+    assert report["samples"]["orphans_deleted"] == [stored["orphan"]]
+    keys = {obj["Key"] for obj in bucket.list_objects_v2(Bucket=r2_storage.bucket_name)["Contents"]}
+    assert keys == {stored["ok"], stored["corrupt"]}
+    orphan_sha256 = hashlib.sha256(b"%PDF orphan").hexdigest()
+    assert StoredForm.query.filter_by(sha256=orphan_sha256).count() == 0
+    assert StoredForm.query.count() == 3
+
+
+def test_repair_respects_the_orphan_grace_period(db, bucket, stored, monkeypatch):
+    monkeypatch.setattr(storage_audit_service, "orphan_grace_seconds", 3600)
+
+    report = storage_audit_service.audit("r2", repair=True).as_dict()
+
+    assert report["counts"]["orphaned"] == 1
+    assert report["counts"]["orphans_deleted"] == 0
+    assert StoredForm.query.count() == 4
+
+
+def test_repair_repoints_rows_to_a_local_copy(db, stored):
+    local_path = session_service.local_pdf_path(stored["missing"])
+    with open(local_path, "wb") as local_file:
+        local_file.write(b"%PDF missing")
+    try:
+        report = storage_audit_service.audit("r2", repair=True).as_dict()
+    finally:
+        os.remove(local_path)
+
+    assert report["samples"]["rows_repointed"] == [stored["missing"]]
+    row = StudySession.query.filter_by(pdf_key=stored["missing"]).one()
+    assert row.storage_state == StudySession.STORAGE_LOCAL
+
+
+def test_repair_backfills_missing_checksums(db, stored):
+    StudySession.query.filter_by(pdf_key=stored["ok"]).update({"pdf_checksum": None, "pdf_size": None})
+    db.session.commit()
+
+    report = storage_audit_service.audit("r2", verify_checksums=True, repair=True).as_dict()
+    db.session.expire_all()
+
+    assert stored["ok"] in report["samples"]["metadata_backfilled"]
+    row = StudySession.query.filter_by(pdf_key=stored["ok"]).one()
+    assert row.pdf_checksum == hashlib.sha256(b"%PDF intact").hexdigest()
+    assert row.pdf_size == len(b"%PDF intact")
+
+    report = storage_audit_service.audit("r2", verify_checksums=True).as_dict()
+    assert report["samples"]["checksum_mismatch"] == [stored["corrupt"]]
+    assert "orphaned" not in report["samples"]
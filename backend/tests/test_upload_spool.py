@@ -0,0 +1,56 @@
+import hashlib
+import os
+from datetime import date, time
+import pytest
+from models.customer import Customer
+from models.outbox_event import OutboxEvent
+from models.student import Student
+from models.study_session import StudySession
+from services.session_service import session_service
+from services.upload_spool import upload_spool
+
+
+@pytest.fixture
+def local_sessions(db, monkeypatch):
+    """Five sessions kept in local storage, one of them without its file"""
+    customer = Customer(first_name="Cu", last_name="Stomer")
+    db.session.add(customer)
+    db.session.flush()
+    student = Student(first_name="Stu", last_name="Dent", customer_id=customer.id)
+    db.session.add(student)
+    db.session.flush()
+
+    keys = []
+    for number in range(5):
+        body = f"%PDF local {number}".encode()
+        key = session_service.content_key(hashlib.sha256(body).hexdigest())
+        if number != 2:
+            with open(session_service.local_pdf_path(key), "wb") as f:
+                f.write(body)
+        db.session.add(StudySession(
+            student_id=student.id, date=date(2026, 9, 1 + number), start_time=time(10), end_time=time(11),
+            session_topic="Math", pdf_key=key, pdf_size=len(body), storage_state=StudySession.STORAGE_LOCAL,
+        ))
+        keys.append(key)
+    db.session.commit()
+    monkeypatch.setattr(upload_spool, "reconcile_batch_size", 2)
+    # Leave the queued uploads to the test
+    monkeypatch.setattr("services.upload_spool.outbox.notify", lambda: None)
+
+    yield keys
+    for key in keys:
+        for path in (session_service.local_pdf_path(key), upload_spool.spool_path(key)):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def test_reconcile_local_queues_all_batches(db, bucket, local_sessions):
+    assert upload_spool.reconcile_local() == 4
+
+    states = dict(db.session.query(StudySession.pdf_key, StudySession.storage_state))
+    assert states == {
+        key: StudySession.STORAGE_LOCAL if number == 2 else StudySession.STORAGE_PENDING
+        for number, key in enumerate(local_sessions)
+    }
+    assert OutboxEvent.query.count() == 4
+    assert all(os.path.exists(upload_spool.spool_path(key)) for number, key in enumerate(local_sessions) if number != 2)
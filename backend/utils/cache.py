@@ -0,0 +1,220 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class ExpiringLRUCache:
+    """Thread-safe in-process LRU cache whose entries expire after a per-entry TTL"""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class RedisCache:
+    """Cache backend shared by all worker processes; values are stored as JSON"""
+
+    def __init__(self, redis_client, namespace):
+        self.redis = redis_client
+        self.namespace = namespace
+
+    def _key(self, key):
+        return f"{self.namespace}:{key}"
+
+    def get(self, key):
+        return self.get_with_ttl(key)[0]
+
+    def get_with_ttl(self, key):
+        """Return (value, remaining TTL in seconds) in one round-trip"""
+        pipeline = self.redis.pipeline()
+        pipeline.get(self._key(key))
+        pipeline.pttl(self._key(key))
+        raw, ttl_ms = pipeline.execute()
+        if raw is None or ttl_ms is None or ttl_ms <= 0:
+            return None, None
+        return json.loads(raw), ttl_ms / 1000
+
+    def set(self, key, value, ttl):
+        # Redis expiry has millisecond resolution
+        ttl_ms = int(ttl * 1000)
+        if ttl_ms <= 0:
+            return
+        self.redis.set(self._key(key), json.dumps(value), px=ttl_ms)
+
+    def delete(self, key):
+        self.redis.delete(self._key(key))
+
+
+class LayeredCache:
+    """
+    In-process cache in front of a shared backend
+
+    Reads hit the local LRU first and fall back to the shared backend. Errors of
+    the shared backend are logged and treated as misses so a Redis outage only
+    costs the cache, never the request.
+    """
+
+    def __init__(self, local, shared):
+        self.local = local
+        self.shared = shared
+
+    def get(self, key):
+        value = self.local.get(key)
+        if value is not None:
+            return value
+        try:
+            value, ttl = self.shared.get_with_ttl(key)
+        except Exception as e:
+            logger.warning(f"Shared cache read failed: {e}")
+            return None
+        if value is not None:
+            self.local.set(key, value, ttl)
+        return value
+
+    def set(self, key, value, ttl):
+        self.local.set(key, value, ttl)
+        try:
+            self.shared.set(key, value, ttl)
+        except Exception as e:
+            logger.warning(f"Shared cache write failed: {e}")
+
+    def delete(self, key):
+        self.local.delete(key)
+        try:
+            self.shared.delete(key)
+        except Exception as e:
+            logger.warning(f"Shared cache delete failed: {e}")
+
+
+def shared_redis_client():
+    """Redis client for CACHE_REDIS_URL, or None when no shared cache is configured"""
+    redis_url = os.getenv("CACHE_REDIS_URL")
+    if not redis_url:
+        return None
+    import redis
+
+    return redis.from_url(redis_url)
+
+
+def create_cache(namespace, max_entries=1024):
+    """
+    Create an in-process LRU cache, layered over Redis when CACHE_REDIS_URL is set
+
+    Args:
+        namespace: Key prefix in the shared backend
+        max_entries: Capacity of the in-process LRU
+
+    Returns:
+        Cache object with get/set/delete
+    """
+    local = ExpiringLRUCache(max_entries)
+    redis_client = shared_redis_client()
+    if redis_client is None:
+        return local
+    return LayeredCache(local, RedisCache(redis_client, namespace))
+
+
+class VersionedCache:
+    """
+    Cache of whole datasets keyed by a version that writers bump
+
+    Readers can compare the version (e.g. as an ETag) without loading the
+    dataset. Datasets are only cached across requests when CACHE_REDIS_URL is
+    set: the versions then live in Redis, so a write in one worker invalidates
+    the dataset in all of them. Without a shared backend a per-process version
+    would leave the other workers serving stale data, so every read loads the
+    dataset and its version is a hash of the content.
+    """
+
+    def __init__(self, namespace, ttl, max_entries=64):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.redis = shared_redis_client()
+        self.cache = create_cache(namespace, max_entries) if self.redis is not None else None
+
+    def _version_key(self, name):
+        return f"{self.namespace}:version:{name}"
+
+    def version(self, name):
+        """Current version of a dataset as a string, or None if it is only known after loading"""
+        if self.redis is None:
+            return None
+        try:
+            raw = self.redis.get(self._version_key(name))
+            if raw is None:
+                # Start from the clock so a flushed Redis never repeats an old version
+                self.redis.set(self._version_key(name), int(time.time() * 1000), nx=True)
+                raw = self.redis.get(self._version_key(name))
+            return raw.decode() if isinstance(raw, bytes) else str(raw)
+        except Exception as e:
+            logger.warning(f"Shared cache version read failed: {e}")
+            return None
+
+    def get_or_load(self, name, loader):
+        """
+        Return the cached dataset, calling loader() on a miss
+
+        Returns:
+            Tuple of (version, value)
+        """
+        version = self.version(name)
+        if version is None:
+            value = loader()
+            return content_version(value), value
+        key = f"{name}:{version}"
+        value = self.cache.get(key)
+        if value is None:
+            value = loader()
+            self.cache.set(key, value, self.ttl)
+        return version, value
+
+    def invalidate(self, name):
+        """Bump the version of a dataset after it was written to"""
+        if self.redis is None:
+            return
+        try:
+            self.redis.incr(self._version_key(name))
+        except Exception as e:
+            logger.warning(f"Shared cache version bump failed: {e}")
+
+
+def content_version(value):
+    """Short hash of a JSON-serialisable value, usable as an ETag"""
+    material = json.dumps(value, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(material.encode()).hexdigest()[:16]
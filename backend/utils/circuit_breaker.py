@@ -0,0 +1,128 @@
+import threading
+import time
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected because the circuit is open"""
+
+
+class CircuitBreaker:
+    """
+    Thread-safe circuit breaker for calls to a remote service
+
+    After failure_threshold consecutive failures (errors or calls slower than
+    slow_call_seconds) the circuit opens and calls are rejected immediately.
+    Once reset_timeout has passed a single probe call is let through
+    (half-open); its outcome closes or re-opens the circuit.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0, slow_call_seconds=10.0, on_close=None):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.slow_call_seconds = slow_call_seconds
+        self.on_close = on_close
+
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._probe_thread = None
+        self._avg_latency = None
+        self._rejected = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state
+
+    def is_open(self):
+        """True while calls would be rejected, without reserving a probe"""
+        with self._lock:
+            if self._state == self.OPEN:
+                return time.monotonic() - self._opened_at < self.reset_timeout
+            return self._state == self.HALF_OPEN and self._probe_in_flight
+
+    def allow_request(self):
+        """Return True if a call may proceed; in half-open state only one probe is allowed"""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._state = self.HALF_OPEN
+                self._probe_in_flight = False
+                logger.info(f"Circuit {self.name} half-open, probing")
+            if self._state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                self._probe_thread = threading.get_ident()
+                return True
+            self._rejected += 1
+            return False
+
+    def release_probe(self):
+        """
+        End the calling thread's probe if its outcome wasn't recorded
+
+        Call in a finally block around every call: a probe that raised an
+        exception the caller doesn't count as success or failure would
+        otherwise keep the circuit half-open and reject all calls.
+        """
+        with self._lock:
+            if self._probe_in_flight and self._probe_thread == threading.get_ident():
+                self._probe_in_flight = False
+
+    def record_success(self, latency):
+        """Record a completed call; slow calls count as failures"""
+        if latency > self.slow_call_seconds:
+            self.record_failure(latency)
+            return
+
+        closed = False
+        with self._lock:
+            self._track_latency(latency)
+            self._failures = 0
+            if self._state != self.CLOSED:
+                self._state = self.CLOSED
+                self._probe_in_flight = False
+                closed = True
+
+        if closed:
+            logger.info(f"Circuit {self.name} closed")
+            if self.on_close:
+                self.on_close()
+
+    def record_failure(self, latency=None):
+        with self._lock:
+            if latency is not None:
+                self._track_latency(latency)
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    logger.warning(f"Circuit {self.name} opened after {self._failures} failures")
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+    def _track_latency(self, latency):
+        # Exponentially weighted moving average
+        if self._avg_latency is None:
+            self._avg_latency = latency
+        else:
+            self._avg_latency = 0.8 * self._avg_latency + 0.2 * latency
+
+    def status(self):
+        with self._lock:
+            return {
+                "state": self._state,
+                "consecutive_failures": self._failures,
+                "rejected_calls": self._rejected,
+                "avg_latency_seconds": round(self._avg_latency, 4) if self._avg_latency is not None else None,
+            }
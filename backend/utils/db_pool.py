@@ -0,0 +1,124 @@
+import os
+import threading
+import time
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+from utils.env import env_flag
+from utils.metrics import CallMetrics
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Checkouts slower than this are counted as "slow" (waited for a free connection)
+SLOW_CHECKOUT_SECONDS = float(os.getenv("DB_POOL_SLOW_CHECKOUT", "0.1"))
+# Connections opened beyond the pool size when all pooled ones are in use
+MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "4"))
+
+
+class PoolStats:
+    """Checkout latency, timeouts and the peak number of connections in use"""
+
+    def __init__(self):
+        self.metrics = CallMetrics()
+        self._lock = threading.Lock()
+        self._peak_checked_out = 0
+
+    def record_checkout(self, wait, checked_out, timed_out=False):
+        self.metrics.record("checkout", wait, error=timed_out)
+        if wait > SLOW_CHECKOUT_SECONDS:
+            self.metrics.increment("checkout", "slow")
+        with self._lock:
+            self._peak_checked_out = max(self._peak_checked_out, checked_out)
+
+    def reset(self):
+        """Start from scratch in a freshly forked worker (locks may have been held at fork time)"""
+        self.metrics = CallMetrics()
+        self._lock = threading.Lock()
+        self._peak_checked_out = 0
+
+    def status(self, pool):
+        capacity = pool.size() + max(MAX_OVERFLOW, 0)
+        checked_out = pool.checkedout()
+        with self._lock:
+            peak = self._peak_checked_out
+        return {
+            "pool_size": pool.size(),
+            "max_overflow": MAX_OVERFLOW,
+            "checked_out": checked_out,
+            "idle": pool.checkedin(),
+            "saturation": round(checked_out / capacity, 3) if capacity > 0 else None,
+            "peak_checked_out": peak,
+            "peak_saturation": round(peak / capacity, 3) if capacity > 0 else None,
+            "checkout": self.metrics.snapshot().get("checkout"),
+        }
+
+
+pool_stats = PoolStats()
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long each checkout waited for a connection"""
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except PoolTimeoutError:
+            pool_stats.record_checkout(time.perf_counter() - started, self.checkedout(), timed_out=True)
+            logger.warning(f"Database pool exhausted ({self.status()})")
+            raise
+        pool_stats.record_checkout(time.perf_counter() - started, self.checkedout())
+        return connection
+
+
+def engine_options(database_uri):
+    """
+    SQLALCHEMY_ENGINE_OPTIONS from the environment
+
+    The pool is per process. By default it holds one connection per request
+    thread (THREADS, as passed to gunicorn) plus DB_MAX_OVERFLOW for the
+    background uploader and audit threads, so the database must accept
+    WORKERS x (DB_POOL_SIZE + DB_MAX_OVERFLOW) connections.
+    """
+    options = {
+        "pool_pre_ping": env_flag("DB_POOL_PRE_PING", "true"),
+        "pool_recycle": int(os.getenv("DB_POOL_RECYCLE", "1800")),
+    }
+    if database_uri.startswith("sqlite"):
+        # SQLite keeps SQLAlchemy's default pool for its file/memory mode
+        return options
+
+    options.update(
+        poolclass=InstrumentedQueuePool,
+        pool_size=int(os.getenv("DB_POOL_SIZE", os.getenv("THREADS", "8"))),
+        max_overflow=MAX_OVERFLOW,
+        pool_timeout=float(os.getenv("DB_POOL_TIMEOUT", "10")),
+        pool_use_lifo=True,
+    )
+    return options
+
+
+def init_pool(app, database):
+    """Discard pooled connections inherited through fork (gunicorn --preload)"""
+    with app.app_context():
+        engines = {bind_key or "default": engine for bind_key, engine in database.engines.items()}
+
+    def _after_fork_in_child():
+        for engine in engines.values():
+            # close=False: the sockets belong to the parent, only forget them here
+            engine.dispose(close=False)
+        pool_stats.reset()
+
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+    app.extensions["db_pool"] = engines
+
+
+def pool_status(app):
+    """Pool usage of the app's engines for the status endpoint"""
+    status = {}
+    for name, engine in app.extensions.get("db_pool", {}).items():
+        if isinstance(engine.pool, QueuePool):
+            status[name] = pool_stats.status(engine.pool)
+        else:
+            status[name] = {"pool": type(engine.pool).__name__}
+    return status
@@ -0,0 +1,8 @@
+import os
+
+
+def env_flag(name: str, default: str = "true") -> bool:
+    raw = os.getenv(name)
+    if raw is None:
+        raw = default
+    return raw.strip().lower() in {"1", "true", "yes", "on"}
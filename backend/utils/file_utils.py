@@ -0,0 +1,55 @@
+import os
+import shutil
+import uuid
+
+# Chunk size used when copying upload streams to disk
+COPY_CHUNK_SIZE = 64 * 1024
+
+
+def write_stream_atomically(stream, path, fsync=True):
+    """
+    Copy a binary stream to path so that readers never see a partial file
+
+    The data is written to a temporary file next to the target and renamed into
+    place. With fsync the file and its directory entry are flushed to disk
+    before returning, so the file survives a crash of the process or host.
+
+    Args:
+        stream: Readable binary stream, positioned at the start of the data
+        path: Final file path
+        fsync: Flush file contents and directory entry to disk
+
+    Returns:
+        Number of bytes written
+    """
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            shutil.copyfileobj(stream, f, COPY_CHUNK_SIZE)
+            size = f.tell()
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    if fsync:
+        fsync_directory(os.path.dirname(path) or '.')
+    return size
+
+
+def fsync_directory(directory):
+    """Flush a directory entry (e.g. after a rename) to disk where the platform supports it"""
+    try:
+        dir_fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(dir_fd)
+    except OSError:
+        pass
+    finally:
+        os.close(dir_fd)
@@ -0,0 +1,18 @@
+from flask import Response, request
+
+
+def is_not_modified(etag):
+    """True if the client already holds the representation with this ETag"""
+    return request.if_none_match.contains(etag)
+
+
+def not_modified(etag):
+    """Empty 304 response for a matching If-None-Match"""
+    return with_etag(Response(status=304), etag)
+
+
+def with_etag(response, etag):
+    """Attach the ETag and make browsers revalidate it on every use"""
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "private, no-cache"
+    return response
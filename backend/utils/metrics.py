@@ -0,0 +1,46 @@
+import threading
+
+
+class CallMetrics:
+    """Thread-safe per-operation call counters and latency statistics"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._operations = {}
+
+    def _entry(self, operation):
+        entry = self._operations.get(operation)
+        if entry is None:
+            entry = {"calls": 0, "errors": 0, "retries": 0, "total_seconds": 0.0, "max_seconds": 0.0}
+            self._operations[operation] = entry
+        return entry
+
+    def record(self, operation, latency, error=False):
+        """Record one completed call and its latency in seconds"""
+        with self._lock:
+            entry = self._entry(operation)
+            entry["calls"] += 1
+            entry["total_seconds"] += latency
+            entry["max_seconds"] = max(entry["max_seconds"], latency)
+            if error:
+                entry["errors"] += 1
+
+    def increment(self, operation, counter, amount=1):
+        """Add to a named counter of an operation (e.g. retries, throttled)"""
+        if not amount:
+            return
+        with self._lock:
+            entry = self._entry(operation)
+            entry[counter] = entry.get(counter, 0) + amount
+
+    def snapshot(self):
+        """Copy of all counters with the average latency per operation"""
+        with self._lock:
+            result = {}
+            for operation, entry in self._operations.items():
+                stats = dict(entry)
+                stats["avg_seconds"] = round(entry["total_seconds"] / entry["calls"], 4) if entry["calls"] else None
+                stats["total_seconds"] = round(entry["total_seconds"], 4)
+                stats["max_seconds"] = round(entry["max_seconds"], 4)
+                result[operation] = stats
+            return result
@@ -0,0 +1,78 @@
+import threading
+import time
+
+
+class RateLimitTimeout(Exception):
+    """Raised when no token became available within the timeout"""
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket for outgoing calls to a rate-limited API
+
+    Tokens refill continuously at `rate` per second up to `capacity`, so short
+    bursts of `capacity` calls go through immediately and the long-run rate
+    stays at `rate`. Callers that find the bucket empty sleep until their token
+    is due rather than polling.
+    """
+
+    def __init__(self, rate, capacity=None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(1.0, rate))
+        self._lock = threading.Lock()
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._waited = 0.0
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, tokens=1, timeout=None):
+        """
+        Take tokens, waiting until they are available
+
+        Args:
+            tokens: Tokens to take (1 per call)
+            timeout: Maximum seconds to wait; None waits as long as needed
+
+        Returns:
+            Seconds spent waiting
+
+        Raises:
+            RateLimitTimeout: The tokens would not be available within timeout
+        """
+        if tokens > self.capacity:
+            raise ValueError("cannot acquire more tokens than the bucket holds")
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            wait = max(0.0, (tokens - self._tokens) / self.rate)
+            if timeout is not None and wait > timeout:
+                raise RateLimitTimeout(f"rate limited for another {wait:.2f}s")
+            # Reserve now (the balance may go negative) so waiters queue up in order
+            self._tokens -= tokens
+            self._waited += wait
+        if wait:
+            time.sleep(wait)
+        return wait
+
+    def try_acquire(self, tokens=1):
+        """Take tokens only if available right now; returns True on success"""
+        try:
+            self.acquire(tokens, timeout=0)
+            return True
+        except RateLimitTimeout:
+            return False
+
+    def status(self):
+        with self._lock:
+            self._refill(time.monotonic())
+            return {
+                "rate": self.rate,
+                "capacity": self.capacity,
+                "available": round(max(self._tokens, 0.0), 3),
+                "waited_seconds": round(self._waited, 4),
+            }